@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+
+"""
+End to end benchmark of solar-roi.py and solar-forecast.py against the
+local stand-in APIs.
+
+Each scenario runs in its own process so that its peak memory is not
+affected by earlier scenarios or by the stand-in server, which runs in
+this process. The wall time, number of requests made to each end point
+and peak RSS of each scenario are reported.
+"""
+
+import argparse
+import contextlib
+import datetime
+import json
+import os
+import pathlib
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from typing import Dict, List
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1] / "src"))
+sys.path.append(str(pathlib.Path(__file__).resolve().parent))
+
+from standin import configure_modules, write_config, StandIn  # noqa
+
+# last day of every ROI scenario, so that runs can be compared
+END_DATE = datetime.date(2023, 12, 31)
+SCENARIOS = {
+    "1-day": 1,
+    "1-month": 31,
+    "1-year": 365,
+    "forecast": 0
+}
+
+
+def run_scenario(scenario: str, url: str, config_path: str, extra_args: List[str]) -> Dict:
+    """
+    Run the given scenario in this process and return its measurements.
+    """
+    import solarroi.cli
+
+    configure_modules(url)
+
+    if scenario == "forecast":
+        # the extra arguments are for solar-roi.py only
+        argv = ["-c", config_path]
+        main = solarroi.cli.solar_forecast_main
+    else:
+        start_date = END_DATE - datetime.timedelta(days=SCENARIOS[scenario] - 1)
+        argv = ["-c", config_path, "-s", str(start_date), "-e", str(END_DATE), "--no-cache"] + extra_args
+        main = solarroi.cli.solar_roi_main
+
+    start = time.perf_counter()
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        main(argv)
+    wall_time = time.perf_counter() - start
+
+    return {
+        "scenario": scenario,
+        "wall_time": wall_time,
+        # ru_maxrss is in KB on Linux
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark Solar-ROI against the local stand-in APIs",
+        add_help=True
+    )
+    parser.add_argument(
+        "-s", "--scenario", help="Scenario to run, can be repeated (default: all)",
+        dest="scenarios", action="append", choices=SCENARIOS.keys()
+    )
+    parser.add_argument(
+        "--latency", help="Seconds to delay each response by", dest="latency", type=float, default=0.0
+    )
+    parser.add_argument(
+        "--error-rate", help="Proportion of responses to replace with errors",
+        dest="error_rate", type=float, default=0.0
+    )
+    parser.add_argument(
+        "--max-page-size", help="Largest page of results for the stand-in to return (default: 0, no limit)",
+        dest="max_page_size", type=int, default=0
+    )
+    parser.add_argument(
+        "-o", "--output", help="Save the results to this JSON file", dest="output_path"
+    )
+    parser.add_argument(
+        "--child", help=argparse.SUPPRESS, nargs=3, metavar=("SCENARIO", "URL", "CONFIG")
+    )
+    parser.add_argument(
+        "extra_args", help="Extra arguments for solar-roi.py, e.g. -- --workers 8", nargs=argparse.REMAINDER
+    )
+    args = parser.parse_args()
+
+    extra_args = [arg for arg in args.extra_args if arg != "--"]
+
+    if args.child:
+        print(json.dumps(run_scenario(*args.child, extra_args)))
+        return
+
+    standin = StandIn(latency=args.latency, error_rate=args.error_rate, max_page_size=args.max_page_size)
+    standin.start()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        config_path = str(pathlib.Path(tmp_dir) / "solar-roi.conf")
+        write_config(config_path, str(pathlib.Path(tmp_dir) / "cache.sqlite"))
+
+        for scenario in args.scenarios or SCENARIOS.keys():
+            standin.reset_counts()
+            output = subprocess.run(
+                [sys.executable, __file__, "--child", scenario, standin.url, config_path, "--"] + extra_args,
+                check=True,
+                stdout=subprocess.PIPE,
+                text=True
+            ).stdout
+            result = json.loads(output.splitlines()[-1])
+            result["requests"] = dict(standin.counts)
+            result["injected_errors"] = standin.errors
+            results.append(result)
+
+    standin.stop()
+
+    print(
+        f"{'scenario':<10} {'wall time (s)':>14} {'requests':>9} {'errors':>7} {'peak RSS (MB)':>14}  " +
+        "requests by end point"
+    )
+    for result in results:
+        requests = ", ".join(f"{name}: {count}" for name, count in sorted(result["requests"].items()))
+        print(
+            f"{result['scenario']:<10} {result['wall_time']:>14.3f} {sum(result['requests'].values()):>9} " +
+            f"{result['injected_errors']:>7} {result['peak_rss_mb']:>14.1f}  {requests}"
+        )
+
+    if args.output_path:
+        with open(args.output_path, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
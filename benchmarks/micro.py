@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+
+"""
+Microbenchmarks of the CPU bound parts of Solar-ROI.
+
+Each kernel is run on synthetic Agile (import) and fixed rate (export)
+data for a day, a month, a year and five years. The number of runs per
+second and the peak memory allocated by a run are reported, and can be
+saved as a baseline that later runs are compared with.
+"""
+
+import argparse
+import datetime
+import json
+import pathlib
+import platform
+import sys
+import time
+import tracemalloc
+
+from typing import Any, Callable, Dict, List, Tuple
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1] / "src"))
+sys.path.append(str(pathlib.Path(__file__).resolve().parent))
+
+import solarroi.givenergy as givenergy  # noqa
+import solarroi.octopusenergy as octopus_energy  # noqa
+
+from solarroi.common import get_datetime_from_date, get_local_datetime_from_date  # noqa
+from solarroi.roi import calculate_roi  # noqa
+from standin import (  # noqa
+    get_consumption_results,
+    get_energy_flows_data,
+    get_unit_rate_results,
+    EXPORT_MPAN,
+    EXPORT_TARIFF,
+    IMPORT_MPAN,
+    IMPORT_TARIFF
+)
+
+DEFAULT_BASELINE_PATH = pathlib.Path(__file__).resolve().parent / "baselines" / "micro.json"
+# a slow down or memory increase of more than this is a regression
+DEFAULT_THRESHOLD = 0.2
+DEFAULT_MIN_TIME = 1.0
+# last day of every scale, so that runs can be compared
+END_DATE = datetime.date(2023, 12, 31)
+SCALES = {
+    "day": 1,
+    "month": 31,
+    "year": 365,
+    "5-year": 1826
+}
+
+
+class Data:
+    """
+    Synthetic API responses for the days from start_date to end_date.
+    """
+
+    def __init__(self, start_date: datetime.date, end_date: datetime.date):
+        self.start_date = start_date
+        self.end_date = end_date
+        self.days = [start_date + datetime.timedelta(days=i) for i in range((end_date - start_date).days + 1)]
+        # prices include the day before, as in get_energy_cost_by_day
+        self.price_days = [start_date - datetime.timedelta(days=1)] + self.days
+
+        prices_start = get_datetime_from_date(self.price_days[0])
+        prices_end = get_datetime_from_date(end_date + datetime.timedelta(days=1))
+        self.agile_rates = get_unit_rate_results(IMPORT_TARIFF, prices_start, prices_end)
+        self.fixed_rates = get_unit_rate_results(EXPORT_TARIFF, prices_start, prices_end)
+
+        start = get_local_datetime_from_date(start_date)
+        end = get_local_datetime_from_date(end_date + datetime.timedelta(days=1))
+        self.import_results = get_consumption_results(IMPORT_MPAN, start, end)
+        self.export_results = get_consumption_results(EXPORT_MPAN, start, end)
+
+        types = givenergy.HOME_CONSUMPTION_TYPES + givenergy.GRID_IMPORT_TYPES
+        self.energy_flows = list(get_energy_flows_data(start_date, end_date, types)["data"].values())
+
+    def __repr__(self) -> str:
+        return f"<start_date: {self.start_date}, end_date: {self.end_date}>"
+
+    def get_timeline(self, tariff_code: str, rates: List[Dict]) -> octopus_energy.TariffTimeline:
+        timeline = octopus_energy.TariffTimeline([{
+            "tariff_code": tariff_code,
+            "valid_from": "2020-01-01T00:00:00Z",
+            "valid_to": None
+        }])
+        prices = octopus_energy.get_tariff_periods_by_day(rates, self.price_days)
+        timeline.add_periods(period for periods in prices.values() for period in periods)
+        return timeline
+
+    def get_consumption(self, consumption_results: List[Dict]) -> Tuple:
+        dates = {day.isoformat() for day in self.days}
+        return octopus_energy.get_consumption_by_day(consumption_results, dates)
+
+
+def bench_parse_energy_flows(data: Data) -> Callable[[], Any]:
+    return lambda: givenergy.parse_energy_flows(data.energy_flows)
+
+
+def bench_agile_tariff_periods(data: Data) -> Callable[[], Any]:
+    return lambda: data.get_timeline(IMPORT_TARIFF, data.agile_rates)
+
+
+def bench_fixed_tariff_periods(data: Data) -> Callable[[], Any]:
+    return lambda: data.get_timeline(EXPORT_TARIFF, data.fixed_rates)
+
+
+def bench_consumption_by_day(data: Data) -> Callable[[], Any]:
+    return lambda: data.get_consumption(data.import_results)
+
+
+def bench_roi_by_day(data: Data) -> Callable[[], Any]:
+    import_timeline = data.get_timeline(IMPORT_TARIFF, data.agile_rates)
+    export_timeline = data.get_timeline(EXPORT_TARIFF, data.fixed_rates)
+    import_consumption, import_readings = data.get_consumption(data.import_results)
+    export_consumption, export_readings = data.get_consumption(data.export_results)
+    import_cost = {
+        "consumption": import_consumption,
+        "readings": import_readings,
+        "timeline": import_timeline
+    }
+    export_cost = {
+        "generation": export_consumption,
+        "readings": export_readings,
+        "timeline": export_timeline
+    }
+    giv_energy_use = givenergy.parse_energy_flows(data.energy_flows)
+    return lambda: calculate_roi(data.start_date, data.end_date, import_cost, export_cost, giv_energy_use)
+
+
+KERNELS: Dict[str, Callable[[Data], Callable[[], Any]]] = {
+    "parse_energy_flows": bench_parse_energy_flows,
+    "agile_tariff_periods": bench_agile_tariff_periods,
+    "fixed_tariff_periods": bench_fixed_tariff_periods,
+    "consumption_by_day": bench_consumption_by_day,
+    "roi_by_day": bench_roi_by_day
+}
+
+
+def measure(run: Callable[[], Any], min_time: float) -> Dict[str, float]:
+    """
+    Run the given function for at least min_time seconds (and at least
+    three times) and return its speed and peak memory allocation.
+    """
+    # warm up
+    run()
+
+    times = []
+    total = 0.0
+    while total < min_time or len(times) < 3:
+        start = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - start
+        times.append(elapsed)
+        total += elapsed
+
+    # memory is measured separately as tracing slows down each run
+    tracemalloc.start()
+    run()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {
+        "runs": len(times),
+        "ops_per_sec": len(times) / total,
+        "best_ms": min(times) * 1000,
+        "peak_kb": peak / 1024
+    }
+
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict], threshold: float) -> List[str]:
+    """
+    Print the change from the baseline for each result and return the
+    names of the results that have regressed.
+    """
+    regressions = []
+    print(f"\n{'benchmark':<28} {'ops/sec change':>15} {'peak change':>12}")
+    for name, result in results.items():
+        if name not in baseline:
+            print(f"{name:<28} {'new':>15}")
+            continue
+        speed_change = result["ops_per_sec"] / baseline[name]["ops_per_sec"] - 1
+        memory_change = result["peak_kb"] / baseline[name]["peak_kb"] - 1 if baseline[name]["peak_kb"] else 0.0
+        regressed = speed_change < -threshold or memory_change > threshold
+        if regressed:
+            regressions.append(name)
+        print(
+            f"{name:<28} {speed_change:>+14.1%} {memory_change:>+12.1%}" +
+            ("  REGRESSION" if regressed else "")
+        )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run the Solar-ROI microbenchmarks",
+        add_help=True
+    )
+    parser.add_argument(
+        "-k", "--kernel", help="Kernel to run, can be repeated (default: all)",
+        dest="kernels", action="append", choices=KERNELS.keys()
+    )
+    parser.add_argument(
+        "--scale", help="Scale to run, can be repeated (default: all)",
+        dest="scales", action="append", choices=SCALES.keys()
+    )
+    parser.add_argument(
+        "--min-time", help=f"Minimum number of seconds to run each benchmark for (default: {DEFAULT_MIN_TIME})",
+        dest="min_time", type=float, default=DEFAULT_MIN_TIME
+    )
+    parser.add_argument(
+        "--save", help=f"Save the results as a baseline (default path: {DEFAULT_BASELINE_PATH})",
+        dest="save_path", nargs="?", const=str(DEFAULT_BASELINE_PATH)
+    )
+    parser.add_argument(
+        "--compare", help=f"Compare the results with a baseline (default path: {DEFAULT_BASELINE_PATH})",
+        dest="compare_path", nargs="?", const=str(DEFAULT_BASELINE_PATH)
+    )
+    parser.add_argument(
+        "--threshold", help="Slow down or memory increase that counts as a regression " +
+                            f"(default: {DEFAULT_THRESHOLD})",
+        dest="threshold", type=float, default=DEFAULT_THRESHOLD
+    )
+    args = parser.parse_args()
+
+    results: Dict[str, Dict] = {}
+    print(f"{'benchmark':<28} {'ops/sec':>10} {'best (ms)':>10} {'peak (KB)':>10}")
+    for scale in args.scales or SCALES.keys():
+        data = Data(END_DATE - datetime.timedelta(days=SCALES[scale] - 1), END_DATE)
+        for kernel in args.kernels or KERNELS.keys():
+            name = f"{kernel}/{scale}"
+            result = measure(KERNELS[kernel](data), args.min_time)
+            results[name] = result
+            print(f"{name:<28} {result['ops_per_sec']:>10.2f} {result['best_ms']:>10.2f} {result['peak_kb']:>10.1f}")
+
+    exit_code = 0
+    if args.compare_path:
+        with open(args.compare_path, "r") as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.threshold)
+        if len(regressions) > 0:
+            print(f"\n{len(regressions)} regressions")
+            exit_code = 1
+
+    if args.save_path:
+        path = pathlib.Path(args.save_path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w") as f:
+            json.dump({
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "created": datetime.datetime.now().isoformat(timespec="seconds"),
+                "results": results
+            }, f, indent=2)
+        print(f"\nBaseline saved to {path}")
+
+    sys.exit(exit_code)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,560 @@
+#!/usr/bin/env python3
+
+"""
+Local stand-in for the Octopus Energy, GivEnergy and Solcast APIs.
+
+The server answers the requests that Solar-ROI makes with synthetic data
+(or with recorded responses, if given) so that the commands can be run
+and measured without live accounts. Responses can be delayed and a
+proportion of them replaced with errors to exercise the retry logic.
+
+The APIs are served under these prefixes:
+
+    /octopus/v1   Octopus Energy
+    /givenergy/v1 GivEnergy
+    /solcast      Solcast
+"""
+
+import argparse
+import datetime
+import json
+import logging
+import math
+import random
+import re
+import threading
+import time
+import urllib.parse
+import zoneinfo
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+LONDON = zoneinfo.ZoneInfo("Europe/London")
+UTC = datetime.timezone.utc
+SLOT = datetime.timedelta(minutes=30)
+
+ACCOUNT = "A-12345678"
+IMPORT_MPAN = "1000000000001"
+IMPORT_SERIAL = "21L0000001"
+IMPORT_TARIFF = "E-1R-AGILE-FLEX-22-11-25-C"
+EXPORT_MPAN = "1000000000002"
+EXPORT_SERIAL = "21L0000002"
+EXPORT_TARIFF = "E-1R-OUTGOING-FIX-12M-19-05-13-C"
+EXPORT_PRICE = 15.0
+INVERTER_SERIAL = "SA0000001"
+RESOURCE_ID = "0000-0000-0000-0000"
+
+# default page sizes of the real APIs
+OCTOPUS_PAGE_SIZE = 100
+GIVENERGY_PAGE_SIZE = 15
+
+
+def get_noise(dt: datetime.datetime, salt: int = 0) -> float:
+    """
+    Return a repeatable value from 0 to 1 for the given time.
+    """
+    return ((int(dt.timestamp()) // 1800 + salt) * 2654435761 % 4294967296) / 4294967296
+
+
+def get_solar(dt: datetime.datetime) -> float:
+    """
+    Return the synthetic PV generation in kWh for the half hour from dt.
+    """
+    local = dt.astimezone(LONDON)
+    hour = local.hour + local.minute / 60
+    # longer and stronger days in the summer
+    season = 0.5 - 0.5 * math.cos(2 * math.pi * (local.timetuple().tm_yday + 10) / 365)
+    day_length = 8 + 8 * season
+    sunrise = 12.5 - day_length / 2
+    if hour < sunrise or hour > sunrise + day_length:
+        return 0.0
+    return round((0.3 + 1.2 * season) * math.sin(math.pi * (hour - sunrise) / day_length) * get_noise(dt, 1), 3)
+
+
+def get_load(dt: datetime.datetime) -> float:
+    """
+    Return the synthetic home consumption in kWh for the half hour from dt.
+    """
+    hour = dt.astimezone(LONDON).hour
+    peak = 0.4 if 17 <= hour < 21 else 0.0
+    return round(0.15 + peak + 0.2 * get_noise(dt, 2), 3)
+
+
+def get_agile_price(dt: datetime.datetime) -> float:
+    hour = dt.astimezone(LONDON).hour
+    peak = 15.0 if 16 <= hour < 19 else 0.0
+    return round(12 + 8 * math.sin(2 * math.pi * (hour - 9) / 24) + peak + 4 * get_noise(dt, 3), 2)
+
+
+def get_flows(dt: datetime.datetime) -> Dict[int, float]:
+    """
+    Return the synthetic energy flows for the half hour from dt, keyed by
+    GivEnergy energy type.
+    """
+    solar = get_solar(dt)
+    load = get_load(dt)
+    pv_to_home = min(solar, load)
+    battery_to_home = round((load - pv_to_home) * 0.5, 3)
+    grid_to_home = round(load - pv_to_home - battery_to_home, 3)
+    grid_to_battery = 0.5 if 1 <= dt.astimezone(LONDON).hour < 4 else 0.0
+    return {
+        0: pv_to_home,
+        1: round((solar - pv_to_home) * 0.5, 3),
+        2: round((solar - pv_to_home) * 0.5, 3),
+        3: grid_to_home,
+        4: grid_to_battery,
+        5: battery_to_home,
+        6: 0.0
+    }
+
+
+def get_slots(start: datetime.datetime, end: datetime.datetime) -> Iterator[datetime.datetime]:
+    """
+    Yield the start of each half hour from start (rounded up) to end.
+    """
+    start = start.astimezone(UTC)
+    slot = datetime.datetime.fromtimestamp(math.ceil(start.timestamp() / 1800) * 1800, UTC)
+    while slot < end:
+        yield slot
+        slot += SLOT
+
+
+def parse_datetime(value: str) -> datetime.datetime:
+    dt = datetime.datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=UTC)
+    return dt
+
+
+def format_utc(dt: datetime.datetime) -> str:
+    return dt.astimezone(UTC).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def get_unit_rate_results(tariff: str, start: datetime.datetime, end: datetime.datetime) -> List[Dict]:
+    """
+    Return the standard unit rates of the given tariff from start to end,
+    newest first. EXPORT_TARIFF is a fixed rate and any other tariff has
+    Agile half hourly prices.
+    """
+    if tariff == EXPORT_TARIFF:
+        return [{
+            "value_exc_vat": EXPORT_PRICE,
+            "value_inc_vat": EXPORT_PRICE,
+            "valid_from": "2015-01-01T00:00:00Z",
+            "valid_to": None,
+            "payment_method": None
+        }]
+
+    return [
+        {
+            "value_exc_vat": round(get_agile_price(slot) / 1.05, 4),
+            "value_inc_vat": get_agile_price(slot),
+            "valid_from": format_utc(slot),
+            "valid_to": format_utc(slot + SLOT),
+            "payment_method": None
+        }
+        for slot in get_slots(start, end)
+    ][::-1]
+
+
+def get_consumption_results(mpan: str, start: datetime.datetime, end: datetime.datetime) -> List[Dict]:
+    """
+    Return the half hourly consumption results of the given meter from
+    start to end, oldest first.
+    """
+    def get_export(slot: datetime.datetime) -> float:
+        return get_flows(slot)[2]
+
+    def get_import(slot: datetime.datetime) -> float:
+        flows = get_flows(slot)
+        return round(flows[3] + flows[4], 3)
+
+    get_value = get_export if mpan == EXPORT_MPAN else get_import
+    return [
+        {
+            "consumption": get_value(slot),
+            "interval_start": slot.astimezone(LONDON).isoformat(),
+            "interval_end": (slot + SLOT).astimezone(LONDON).isoformat()
+        }
+        for slot in get_slots(start, end)
+    ]
+
+
+def get_energy_flows_data(start_date: datetime.date, end_date: datetime.date, types: List[int]) -> Dict:
+    """
+    Return the half hourly energy flows of the given types for the local
+    days from start_date up to and including end_date.
+    """
+    start = datetime.datetime.combine(start_date, datetime.time(), tzinfo=LONDON)
+    end = datetime.datetime.combine(end_date + datetime.timedelta(days=1), datetime.time(), tzinfo=LONDON)
+
+    data = {}
+    for index, slot in enumerate(get_slots(start, end)):
+        flows = get_flows(slot)
+        data[str(index)] = {
+            "start_time": slot.astimezone(LONDON).strftime("%Y-%m-%d %H:%M"),
+            "end_time": (slot + SLOT).astimezone(LONDON).strftime("%Y-%m-%d %H:%M"),
+            "data": {str(energy_type): flows[energy_type] for energy_type in types}
+        }
+    return {"data": data}
+
+
+class StandIn:
+    """
+    The stand-in server. latency seconds are added to every response and
+    error_rate is the proportion of responses that are replaced with an
+    error_status error. Recorded responses, keyed by "METHOD path?query"
+    (with the JSON body appended for POST requests), take precedence over
+    the synthetic ones. Requests for pages larger than max_page_size (0 for
+    no limit) are given pages of max_page_size results, so that runs
+    follow the links to the later pages as they would with a lower limit.
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0.0,
+        error_rate: float = 0.0,
+        error_status: int = 429,
+        seed: int = 0,
+        recordings: Optional[Dict[str, Any]] = None,
+        max_page_size: int = 0
+    ):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.max_page_size = max_page_size
+        self.recordings = recordings if recordings is not None else {}
+        self.counts: Dict[str, int] = {}
+        self.errors = 0
+        self.__random = random.Random(seed)
+        self.__lock = threading.Lock()
+        self.__server = ThreadingHTTPServer((host, port), StandInHandler)
+        self.__server.daemon_threads = True
+        self.__server.standin = self  # type: ignore
+        self.__thread: Optional[threading.Thread] = None
+
+        self.routes: List[Tuple[str, re.Pattern, Callable]] = [
+            ("GET", re.compile(r"^/octopus/v1/accounts/(?P<account>[^/]+)/$"), self.get_account),
+            (
+                "GET",
+                re.compile(r"^/octopus/v1/products/[^/]+/electricity-tariffs/(?P<tariff>[^/]+)/standard-unit-rates/$"),
+                self.get_unit_rates
+            ),
+            (
+                "GET",
+                re.compile(r"^/octopus/v1/electricity-meter-points/(?P<mpan>[^/]+)/meters/[^/]+/consumption/$"),
+                self.get_consumption
+            ),
+            ("POST", re.compile(r"^/givenergy/v1/inverter/[^/]+/energy-flows$"), self.get_energy_flows),
+            ("GET", re.compile(r"^/givenergy/v1/inverter/[^/]+/data-points/(?P<time>[^/]+)$"), self.get_data_points),
+            ("GET", re.compile(r"^/solcast/rooftop_sites/[^/]+/forecasts$"), self.get_forecasts)
+        ]
+
+    def __repr__(self) -> str:
+        return f"<url: {self.url}, latency: {self.latency}, error_rate: {self.error_rate}, " + \
+            f"max_page_size: {self.max_page_size}>"
+
+    @property
+    def url(self) -> str:
+        host, port = self.__server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.__thread = threading.Thread(target=self.__server.serve_forever, daemon=True)
+        self.__thread.start()
+        logging.debug("StandIn: listening on %s", self.url)
+
+    def stop(self):
+        self.__server.shutdown()
+        self.__server.server_close()
+
+    def serve_forever(self):
+        self.__server.serve_forever()
+
+    def reset_counts(self):
+        with self.__lock:
+            self.counts = {}
+            self.errors = 0
+
+    def count(self, name: str):
+        with self.__lock:
+            self.counts[name] = self.counts.get(name, 0) + 1
+
+    def inject_error(self) -> bool:
+        with self.__lock:
+            if self.error_rate > 0 and self.__random.random() < self.error_rate:
+                self.errors += 1
+                return True
+        return False
+
+    def handle(
+        self, method: str, path: str, query: Dict[str, str], body: Optional[Dict]
+    ) -> Tuple[int, Any, Dict[str, str]]:
+        """
+        Return the status, JSON body and headers of the response to the given request.
+        """
+        if self.latency > 0:
+            time.sleep(self.latency)
+
+        for route_method, pattern, handler in self.routes:
+            match = pattern.match(path)
+            if route_method == method and match:
+                self.count(handler.__name__[4:])
+                if self.inject_error():
+                    return (self.error_status, {"message": "Injected error"}, {"Retry-After": "0"})
+
+                key = f"{method} {path}"
+                if len(query) > 0:
+                    key += "?" + urllib.parse.urlencode(sorted(query.items()))
+                if body is not None:
+                    key += " " + json.dumps(body, sort_keys=True)
+                if key in self.recordings:
+                    return (200, self.recordings[key], {})
+
+                return (200, handler(path, query, body, **match.groupdict()), {})
+
+        self.count("unknown")
+        return (404, {"message": f"Not found: {method} {path}"}, {})
+
+    def get_page_size(self, query: Dict[str, str], name: str, default: int) -> int:
+        """
+        Return the page size requested by the given parameter, capped at
+        max_page_size.
+        """
+        page_size = int(query.get(name, default))
+        if self.max_page_size > 0:
+            return min(page_size, self.max_page_size)
+        return page_size
+
+    def get_page(self, path: str, query: Dict[str, str], results: List[Any]) -> Dict[str, Any]:
+        """
+        Return the page of results given by the page and page_size parameters
+        in the format used by the Octopus Energy API.
+        """
+        page_size = self.get_page_size(query, "page_size", OCTOPUS_PAGE_SIZE)
+        page = int(query.get("page", 1))
+        next_url = None
+        if page * page_size < len(results):
+            next_query = dict(query)
+            next_query["page"] = str(page + 1)
+            next_url = f"{self.url}{path}?{urllib.parse.urlencode(next_query)}"
+        return {
+            "count": len(results),
+            "next": next_url,
+            "previous": None,
+            "results": results[(page - 1) * page_size:page * page_size]
+        }
+
+    def get_account(self, path: str, query: Dict[str, str], body: Optional[Dict], account: str) -> Dict:
+        return {
+            "number": account,
+            "properties": [{
+                "electricity_meter_points": [
+                    {
+                        "mpan": IMPORT_MPAN,
+                        "is_export": False,
+                        "meters": [{"serial_number": IMPORT_SERIAL}],
+                        "agreements": [{
+                            "tariff_code": IMPORT_TARIFF,
+                            "valid_from": "2020-01-01T00:00:00Z",
+                            "valid_to": None
+                        }]
+                    },
+                    {
+                        "mpan": EXPORT_MPAN,
+                        "is_export": True,
+                        "meters": [{"serial_number": EXPORT_SERIAL}],
+                        "agreements": [{
+                            "tariff_code": EXPORT_TARIFF,
+                            "valid_from": "2020-01-01T00:00:00Z",
+                            "valid_to": None
+                        }]
+                    }
+                ]
+            }]
+        }
+
+    def get_unit_rates(self, path: str, query: Dict[str, str], body: Optional[Dict], tariff: str) -> Dict:
+        results = get_unit_rate_results(
+            tariff, parse_datetime(query["period_from"]), parse_datetime(query["period_to"])
+        )
+        return self.get_page(path, query, results)
+
+    def get_consumption(self, path: str, query: Dict[str, str], body: Optional[Dict], mpan: str) -> Dict:
+        results = get_consumption_results(
+            mpan, parse_datetime(query["period_from"]), parse_datetime(query["period_to"])
+        )
+        if query.get("order_by") != "period":
+            results.reverse()
+        return self.get_page(path, query, results)
+
+    def get_energy_flows(self, path: str, query: Dict[str, str], body: Optional[Dict]) -> Dict:
+        assert body is not None
+        types = [int(energy_type) for energy_type in body.get("types", range(7))]
+        return get_energy_flows_data(
+            datetime.date.fromisoformat(body["start_time"]), datetime.date.fromisoformat(body["end_time"]), types
+        )
+
+    def get_data_points(self, path: str, query: Dict[str, str], body: Optional[Dict], time: str) -> Dict:
+        date = parse_datetime(time).date()
+        start = datetime.datetime.combine(date, datetime.time(), tzinfo=UTC)
+        points = []
+        consumption = 0.0
+        # one data point every five minutes
+        for index in range(288):
+            dt = start + datetime.timedelta(minutes=5 * index)
+            consumption += get_load(dt) / 6
+            points.append({"time": format_utc(dt), "today": {"consumption": round(consumption, 1)}})
+
+        page_size = self.get_page_size(query, "pageSize", GIVENERGY_PAGE_SIZE)
+        page = int(query.get("page", 1))
+        return {
+            "data": points[(page - 1) * page_size:page * page_size],
+            "meta": {
+                "current_page": page,
+                "last_page": math.ceil(len(points) / page_size),
+                "per_page": page_size,
+                "total": len(points)
+            }
+        }
+
+    def get_forecasts(self, path: str, query: Dict[str, str], body: Optional[Dict]) -> Dict:
+        now = datetime.datetime.now(UTC)
+        # seven days of forecasts as returned by Solcast
+        return {
+            "forecasts": [
+                {
+                    "pv_estimate": round(get_solar(slot) * 2, 4),
+                    "period_end": format_utc(slot + SLOT),
+                    "period": "PT30M"
+                }
+                for slot in get_slots(now, now + datetime.timedelta(days=7))
+            ]
+        }
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format: str, *args: Any):
+        logging.debug("StandIn: " + format, *args)
+
+    def do_GET(self):
+        self.respond("GET")
+
+    def do_POST(self):
+        self.respond("POST")
+
+    def respond(self, method: str):
+        url = urllib.parse.urlsplit(self.path)
+        query = dict(urllib.parse.parse_qsl(url.query))
+        body = None
+        length = int(self.headers.get("Content-Length", 0))
+        if length > 0:
+            body = json.loads(self.rfile.read(length))
+
+        status, data, headers = self.server.standin.handle(method, url.path, query, body)  # type: ignore
+
+        content = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(content)
+
+
+def configure_modules(url: str):
+    """
+    Point the Solar-ROI API modules at the stand-in server at url.
+    """
+    import solarroi.givenergy
+    import solarroi.octopusenergy
+    import solarroi.solcast
+
+    solarroi.octopusenergy.BASE_URL = f"{url}/octopus/v1"
+    solarroi.givenergy.BASE_URL = f"{url}/givenergy/v1"
+    solarroi.solcast.BASE_URL = f"{url}/solcast"
+
+
+def write_config(path: str, cache_path: str):
+    """
+    Write a Solar-ROI config file that uses the stand-in accounts.
+    """
+    with open(path, "w") as f:
+        f.write(
+            "[GivEnergy]\n"
+            "api_key = standin\n"
+            f"inverter_serial = {INVERTER_SERIAL}\n\n"
+            "[OctopusEnergy]\n"
+            f"account = {ACCOUNT}\n"
+            "api_key = standin\n\n"
+            "[Solcast]\n"
+            "api_key = standin\n"
+            f"resource_id = {RESOURCE_ID}\n\n"
+            "[Cache]\n"
+            f"path = {cache_path}\n\n"
+            "[HTTP]\n"
+            "backoff = 0.01\n"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run a local stand-in for the Octopus Energy, GivEnergy and Solcast APIs",
+        add_help=True
+    )
+    parser.add_argument("--host", help="Address to listen on", dest="host", default="127.0.0.1")
+    parser.add_argument("-p", "--port", help="Port to listen on", dest="port", type=int, default=8080)
+    parser.add_argument(
+        "--latency", help="Seconds to delay each response by", dest="latency", type=float, default=0.0
+    )
+    parser.add_argument(
+        "--error-rate", help="Proportion of responses to replace with errors",
+        dest="error_rate", type=float, default=0.0
+    )
+    parser.add_argument(
+        "--error-status", help="Status code of injected errors", dest="error_status", type=int, default=429
+    )
+    parser.add_argument(
+        "--recordings", help="JSON file of recorded responses", dest="recordings_path"
+    )
+    parser.add_argument(
+        "--max-page-size", help="Largest page of results to return, whatever page size is requested " +
+                                "(default: 0, no limit)",
+        dest="max_page_size", type=int, default=0
+    )
+    parser.add_argument(
+        "-v", "--verbose", help="Turn on debug messages", dest="verbose", action="store_true"
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        format="%(asctime)s:%(levelname)s: %(message)s",
+        datefmt="%Y/%m/%d %H:%M:%S",
+        level=logging.DEBUG if args.verbose else logging.INFO
+    )
+
+    recordings = None
+    if args.recordings_path:
+        with open(args.recordings_path, "r") as f:
+            recordings = json.load(f)
+
+    standin = StandIn(
+        args.host, args.port, args.latency, args.error_rate, args.error_status, recordings=recordings,
+        max_page_size=args.max_page_size
+    )
+    logging.info("Serving on %s", standin.url)
+    try:
+        standin.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
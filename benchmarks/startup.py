@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+
+"""
+Start up benchmark of Solar-ROI.
+
+Each module is imported in a new Python process so that nothing is already
+loaded, and the import time and modules it loads are reported. Importing a
+module that pulls in one of its forbidden modules (e.g. SQLAlchemy when
+importing solarroi.cli) fails the check, as does a slow down of more than
+the threshold compared with a saved baseline.
+"""
+
+import argparse
+import datetime
+import json
+import pathlib
+import platform
+import statistics
+import subprocess
+import sys
+
+from typing import Dict, List
+
+SRC_PATH = pathlib.Path(__file__).resolve().parents[1] / "src"
+DEFAULT_BASELINE_PATH = pathlib.Path(__file__).resolve().parent / "baselines" / "startup.json"
+DEFAULT_RUNS = 10
+# import times are noisy, so allow more of a slow down than micro.py
+DEFAULT_THRESHOLD = 0.5
+# modules that must not be loaded by importing each module
+CHECKS = {
+    "solarroi.cli": ["numpy", "pymysql", "requests", "sqlalchemy"],
+    "solarroi.solcast": ["numpy", "pymysql", "sqlalchemy"],
+    "solarroi.roi": ["pymysql", "sqlalchemy"],
+    "solarroi.sql": ["numpy", "requests"]
+}
+CHILD_CODE = """
+import json
+import sys
+import time
+sys.path.insert(0, {src_path!r})
+start = time.perf_counter()
+import {module}
+print(json.dumps({{"seconds": time.perf_counter() - start, "modules": sorted(sys.modules)}}))
+"""
+
+
+def measure(module: str, runs: int) -> Dict:
+    """
+    Import the given module in runs new processes and return the median
+    and best import times and the modules it loaded.
+    """
+    times = []
+    modules: List[str] = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "-c", CHILD_CODE.format(src_path=str(SRC_PATH), module=module)],
+            check=True,
+            stdout=subprocess.PIPE,
+            text=True
+        ).stdout
+        result = json.loads(output)
+        times.append(result["seconds"])
+        modules = result["modules"]
+
+    return {
+        "median_ms": statistics.median(times) * 1000,
+        "best_ms": min(times) * 1000,
+        "modules": len(modules),
+        "forbidden": [name for name in CHECKS[module] if name in modules]
+    }
+
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict], threshold: float) -> List[str]:
+    """
+    Print the change from the baseline for each result and return the
+    names of the results that have regressed.
+    """
+    regressions = []
+    print(f"\n{'module':<20} {'time change':>12}")
+    for name, result in results.items():
+        if name not in baseline:
+            print(f"{name:<20} {'new':>12}")
+            continue
+        change = result["median_ms"] / baseline[name]["median_ms"] - 1
+        regressed = change > threshold
+        if regressed:
+            regressions.append(name)
+        print(f"{name:<20} {change:>+12.1%}" + ("  REGRESSION" if regressed else ""))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Check the import time of the Solar-ROI modules",
+        add_help=True
+    )
+    parser.add_argument(
+        "-m", "--module", help="Module to check, can be repeated (default: all)",
+        dest="modules", action="append", choices=CHECKS.keys()
+    )
+    parser.add_argument(
+        "--runs", help=f"Number of times to import each module (default: {DEFAULT_RUNS})",
+        dest="runs", type=int, default=DEFAULT_RUNS
+    )
+    parser.add_argument(
+        "--save", help=f"Save the results as a baseline (default path: {DEFAULT_BASELINE_PATH})",
+        dest="save_path", nargs="?", const=str(DEFAULT_BASELINE_PATH)
+    )
+    parser.add_argument(
+        "--compare", help=f"Compare the results with a baseline (default path: {DEFAULT_BASELINE_PATH})",
+        dest="compare_path", nargs="?", const=str(DEFAULT_BASELINE_PATH)
+    )
+    parser.add_argument(
+        "--threshold", help=f"Slow down that counts as a regression (default: {DEFAULT_THRESHOLD})",
+        dest="threshold", type=float, default=DEFAULT_THRESHOLD
+    )
+    args = parser.parse_args()
+
+    results: Dict[str, Dict] = {}
+    exit_code = 0
+    print(f"{'module':<20} {'median (ms)':>12} {'best (ms)':>10} {'modules':>8}  forbidden modules loaded")
+    for module in args.modules or CHECKS.keys():
+        result = measure(module, args.runs)
+        results[module] = result
+        print(
+            f"{module:<20} {result['median_ms']:>12.1f} {result['best_ms']:>10.1f} {result['modules']:>8}  " +
+            (", ".join(result["forbidden"]) or "none")
+        )
+        if len(result["forbidden"]) > 0:
+            exit_code = 1
+
+    if args.compare_path:
+        with open(args.compare_path, "r") as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.threshold)
+        if len(regressions) > 0:
+            print(f"\n{len(regressions)} regressions")
+            exit_code = 1
+
+    if args.save_path:
+        path = pathlib.Path(args.save_path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w") as f:
+            json.dump({
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "created": datetime.datetime.now().isoformat(timespec="seconds"),
+                "results": results
+            }, f, indent=2)
+        print(f"\nBaseline saved to {path}")
+
+    sys.exit(exit_code)
+
+
+if __name__ == "__main__":
+    main()
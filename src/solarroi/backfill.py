@@ -0,0 +1,229 @@
+"""
+Resumable backfill of the roi table.
+
+The date range is split into windows which are processed in parallel.
+Each window of settled days that has been written to the database is
+recorded in a checkpoint file so that an interrupted backfill can carry
+on from where it stopped, and windows that fail are retried on their own.
+The checkpoint is removed once every window has been processed.
+"""
+
+import concurrent.futures
+import datetime
+import hashlib
+import json
+import logging
+import pathlib
+import threading
+
+from typing import List, Set, Tuple
+
+from sqlalchemy.orm import sessionmaker  # type: ignore
+
+from solarroi.cache import is_settled
+from solarroi.common import DEFAULT_BATCH_SIZE
+from solarroi.config import Config, DEFAULT_CACHE_SETTLEMENT_DAYS
+from solarroi.metrics import get_metrics
+from solarroi.octopusenergy import Meter
+from solarroi.roi import get_roi, get_roi_rows
+from solarroi.sql import update_rollups, upsert, SolarROI, SolarROIHalfHour
+
+DEFAULT_CHECKPOINT_DIR = pathlib.Path.home() / ".cache" / "solar-roi" / "backfill"
+DEFAULT_PARALLEL = 2
+DEFAULT_RETRIES = 2
+
+Window = Tuple[datetime.date, datetime.date]
+
+
+class Checkpoint:
+    """
+    The windows that have been written to the database, and which of them
+    have been included in the rollups.
+    """
+
+    def __init__(self, path: pathlib.Path):
+        self.path = path
+        self.__lock = threading.Lock()
+        self.__completed: Set[Tuple[str, str]] = set()
+        self.__rolled_up: Set[Tuple[str, str]] = set()
+
+        if path.is_file():
+            with open(path, "r") as f:
+                data = json.load(f)
+            self.__completed = {(start, end) for start, end in data["completed"]}
+            self.__rolled_up = {(start, end) for start, end in data.get("rolled_up", [])}
+            logging.info("Loaded %d completed windows from %s", len(self.__completed), path)
+
+    def __repr__(self) -> str:
+        return f"<path: {self.path}, completed: {len(self.__completed)}, rolled_up: {len(self.__rolled_up)}>"
+
+    def get_completed(self) -> List[Window]:
+        with self.__lock:
+            return to_windows(self.__completed)
+
+    def get_not_rolled_up(self) -> List[Window]:
+        """
+        Return the completed windows that have not been rolled up, e.g.
+        because the backfill that wrote them was stopped before the end.
+        """
+        with self.__lock:
+            return to_windows(self.__completed - self.__rolled_up)
+
+    def is_complete(self, window: Window) -> bool:
+        return (window[0].isoformat(), window[1].isoformat()) in self.__completed
+
+    def remove(self):
+        with self.__lock:
+            self.__completed.clear()
+            self.__rolled_up.clear()
+            self.path.unlink(missing_ok=True)
+
+    def add(self, window: Window):
+        """
+        Record the given window as complete and save the checkpoint.
+        """
+        with self.__lock:
+            self.__completed.add((window[0].isoformat(), window[1].isoformat()))
+            self.__save()
+
+    def add_rolled_up(self, windows: List[Window]):
+        """
+        Record the given windows as rolled up and save the checkpoint.
+        """
+        with self.__lock:
+            rolled_up = {(window[0].isoformat(), window[1].isoformat()) for window in windows}
+            self.__rolled_up |= rolled_up & self.__completed
+            self.__save()
+
+    def __save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # write to a temporary file first so that the checkpoint is
+        # never left half written
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump({"completed": sorted(self.__completed), "rolled_up": sorted(self.__rolled_up)}, f, indent=1)
+        tmp_path.replace(self.path)
+
+
+def to_windows(keys: Set[Tuple[str, str]]) -> List[Window]:
+    return [(datetime.date.fromisoformat(start), datetime.date.fromisoformat(end)) for start, end in sorted(keys)]
+
+
+def get_checkpoint_path(config_path: pathlib.Path, start_date: datetime.date, end_date: datetime.date) -> pathlib.Path:
+    """
+    Return the default checkpoint path for a backfill of the given range
+    with the given config file, so that other backfills do not share it.
+    """
+    digest = hashlib.sha256(str(config_path.resolve()).encode()).hexdigest()[:12]
+    return DEFAULT_CHECKPOINT_DIR / f"{start_date}_{end_date}_{digest}.json"
+
+
+def process_window(
+    config: Config,
+    session_maker: sessionmaker,
+    import_meter: Meter,
+    export_meter: Meter,
+    window: Window,
+    checkpoint: Checkpoint,
+    max_workers: int,
+    batch_size: int,
+    settlement_days: int
+) -> bool:
+    """
+    Calculate and save the ROI records for the given window. The window is
+    only added to the checkpoint if all of its days are settled, so that
+    the days that may still change are processed again by a later run.
+    Returns False if the window failed.
+    """
+    logging.info("Processing %s to %s", window[0], window[1])
+    try:
+        results = get_roi(config, import_meter, export_meter, window[0], window[1], max_workers)
+        with get_metrics().phase("write"), session_maker() as session, session.begin():
+            upsert(session, SolarROI, get_roi_rows(results.days), batch_size)
+            upsert(session, SolarROIHalfHour, results.half_hours, batch_size)
+    # the API modules call die() on errors which raises SystemExit
+    except (Exception, SystemExit) as error:
+        logging.error("Failed to process %s to %s: %s", window[0], window[1], error)
+        return False
+
+    if is_settled(window[1], settlement_days):
+        checkpoint.add(window)
+    logging.info("Completed %s to %s", window[0], window[1])
+    return True
+
+
+def backfill(
+    config: Config,
+    session_maker: sessionmaker,
+    import_meter: Meter,
+    export_meter: Meter,
+    windows: List[Window],
+    checkpoint: Checkpoint,
+    parallel: int = DEFAULT_PARALLEL,
+    retries: int = DEFAULT_RETRIES,
+    max_workers: int = 1,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    settlement_days: int = DEFAULT_CACHE_SETTLEMENT_DAYS
+) -> List[Window]:
+    """
+    Process each of the given windows that is not in the checkpoint, up to
+    parallel windows at a time. Windows that fail are retried up to retries
+    times. The rollup tables are then updated for the windows written by
+    this run and any in the checkpoint that have not been rolled up, and
+    the checkpoint is removed if no window failed. Returns the windows that
+    could not be processed.
+    """
+    pending = [window for window in windows if not checkpoint.is_complete(window)]
+    logging.info("%d of %d windows to process", len(pending), len(windows))
+
+    written: List[Window] = []
+    attempt = 0
+    while len(pending) > 0 and attempt <= retries:
+        if attempt > 0:
+            logging.info("Retrying %d failed windows (attempt %d of %d)", len(pending), attempt, retries)
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=parallel) as executor:
+            futures = [
+                executor.submit(
+                    process_window,
+                    config,
+                    session_maker,
+                    import_meter,
+                    export_meter,
+                    window,
+                    checkpoint,
+                    max_workers,
+                    batch_size,
+                    settlement_days
+                )
+                for window in pending
+            ]
+            results = [future.result() for future in futures]
+            written.extend(window for window, result in zip(pending, results) if result)
+            pending = [window for window, result in zip(pending, results) if not result]
+
+        attempt += 1
+
+    # the rollups are updated once at the end as windows that finish out of
+    # order would otherwise overwrite each other's running totals. A
+    # backfill that was stopped before this point left windows in the
+    # checkpoint that have not been rolled up, so they are included too.
+    rollup_windows = sorted(set(written) | set(checkpoint.get_not_rolled_up()))
+    if len(rollup_windows) > 0:
+        logging.info("Updating rollups")
+        with get_metrics().phase("write"), session_maker() as session, session.begin():
+            update_rollups(session, get_window_dates(rollup_windows), batch_size)
+        checkpoint.add_rolled_up(rollup_windows)
+
+    if len(pending) == 0:
+        checkpoint.remove()
+
+    return pending
+
+
+def get_window_dates(windows: List[Window]) -> List[datetime.date]:
+    return [
+        window[0] + datetime.timedelta(days=i)
+        for window in windows
+        for i in range((window[1] - window[0]).days + 1)
+    ]
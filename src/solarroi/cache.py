@@ -0,0 +1,201 @@
+"""
+On disk cache for API responses.
+
+Historical prices, consumption and energy flows do not change once a day
+has been settled, so responses for those days are kept in a SQLite
+database and reused by later runs. Responses for recent days are always
+fetched again.
+
+Ranged requests are split by get_cache_chunks into whole calendar months,
+which are the same whatever range a run asks for, and a recent tail that
+is never cached.
+"""
+
+import datetime
+import json
+import logging
+import pathlib
+import sqlite3
+import threading
+import time
+
+from typing import Any, Dict, List, Optional, Tuple
+
+from solarroi.config import Config
+from solarroi.metrics import get_metrics
+
+
+class ResponseCache:
+
+    def __init__(
+        self, path: pathlib.Path, settlement_days: int, max_size: int, refresh: bool = False
+    ):
+        self.path = path
+        self.settlement_days = settlement_days
+        self.max_size = max_size
+        self.refresh = refresh
+        self.__lock = threading.Lock()
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.__conn = sqlite3.connect(str(path), check_same_thread=False)
+        self.__conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, data TEXT NOT NULL, size INTEGER NOT NULL, "
+            "created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self.__conn.execute(
+            "CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)"
+        )
+        self.__conn.commit()
+
+    def __repr__(self) -> str:
+        return f"<path: {self.path}, settlement_days: {self.settlement_days}, " + \
+            f"max_size: {self.max_size}, refresh: {self.refresh}>"
+
+    @staticmethod
+    def get_key(method: str, url: str, params: Optional[Dict]) -> str:
+        return f"{method} {url} {json.dumps(params, sort_keys=True)}"
+
+    def is_settled(self, date: datetime.date) -> bool:
+        """
+        Return True if the data for the given date will no longer change.
+        """
+        return is_settled(date, self.settlement_days)
+
+    def get(self, method: str, url: str, params: Optional[Dict] = None) -> Optional[Any]:
+        """
+        Return the cached response for the given request or None.
+        """
+        if self.refresh:
+            get_metrics().record_cache(url, False)
+            return None
+
+        key = self.get_key(method, url, params)
+        with self.__lock:
+            row = self.__conn.execute(
+                "SELECT data FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                get_metrics().record_cache(url, False)
+                return None
+            self.__conn.execute(
+                "UPDATE responses SET accessed = ? WHERE key = ?", (time.time(), key)
+            )
+            self.__conn.commit()
+
+        logging.debug("ResponseCache.get: hit for %s", key)
+        get_metrics().record_cache(url, True)
+        return json.loads(row[0])
+
+    def put(
+        self, method: str, url: str, params: Optional[Dict], data: Any, end_date: datetime.date
+    ):
+        """
+        Store the response for the given request if all of the data it
+        contains (up to and including end_date) has been settled.
+        """
+        if not self.is_settled(end_date):
+            return
+
+        key = self.get_key(method, url, params)
+        text = json.dumps(data)
+        now = time.time()
+        with self.__lock:
+            self.__conn.execute(
+                "INSERT OR REPLACE INTO responses (key, data, size, created, accessed) " +
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, text, len(text), now, now)
+            )
+            self.__evict()
+            self.__conn.commit()
+
+    def close(self):
+        with self.__lock:
+            self.__conn.close()
+
+    def __evict(self):
+        """
+        Remove the least recently used responses until the cache fits
+        within its maximum size.
+        """
+        total = self.__conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_size:
+            return
+
+        rows = self.__conn.execute("SELECT key, size FROM responses ORDER BY accessed").fetchall()
+        for key, size in rows:
+            if total <= self.max_size:
+                break
+            logging.debug("ResponseCache: evicting %s", key)
+            self.__conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+
+
+def is_settled(date: datetime.date, settlement_days: int) -> bool:
+    """
+    Return True if the API data for the given date is more than
+    settlement_days old, after which it is assumed to be final.
+    """
+    today = datetime.datetime.now(datetime.timezone.utc).date()
+    return date < today - datetime.timedelta(days=settlement_days)
+
+
+response_cache: Optional[ResponseCache] = None
+
+
+def get_cache() -> Optional[ResponseCache]:
+    return response_cache
+
+
+def get_cache_chunks(
+    start_date: datetime.date, end_date: datetime.date
+) -> List[Tuple[datetime.date, datetime.date, bool]]:
+    """
+    Split the given range into the ranges to request, each with whether its
+    response can be cached. Every settled month that the range touches is
+    requested in full, so the same request is made by any range that
+    includes the month; the caller must ignore the days outside the range.
+    The days after the last settled month are requested as one range that
+    is not cached. Without a cache the range is requested as it is.
+    """
+    cache = get_cache()
+    if cache is None:
+        return [(start_date, end_date, False)]
+
+    chunks = []
+    month = start_date.replace(day=1)
+    while month <= end_date:
+        next_month = (month + datetime.timedelta(days=32)).replace(day=1)
+        if not cache.is_settled(next_month - datetime.timedelta(days=1)):
+            break
+        chunks.append((month, next_month - datetime.timedelta(days=1), True))
+        month = next_month
+
+    tail_start = max(start_date, month)
+    if tail_start <= end_date:
+        chunks.append((tail_start, end_date, False))
+    return chunks
+
+
+def setup_cache(config: Config, refresh: bool = False) -> ResponseCache:
+    """
+    Create the response cache using the Cache section of the config.
+    """
+    global response_cache
+
+    response_cache = ResponseCache(
+        config.cache.path,
+        config.cache.settlement_days,
+        config.cache.max_size_mb * 1024 * 1024,
+        refresh
+    )
+    logging.debug("setup_cache: %s", response_cache)
+    return response_cache
+
+
+def close_cache():
+    global response_cache
+
+    if response_cache is not None:
+        response_cache.close()
+        response_cache = None
@@ -1,20 +1,102 @@
 import argparse
+import contextlib
 import datetime
 import logging
 import pathlib
 import pprint
 import re
+import signal
+import threading
+
+from typing import Iterator, List, Optional
 
 import solarroi
-import solarroi.givenergy as givenergy
-import solarroi.octopusenergy as octopus_energy
-import solarroi.solcast as solcast
 
-from solarroi.common import check_file, die
-from solarroi.sql import connect_db, Solcast, SolarROI
+# The API clients (requests), ROI calculation (NumPy), database
+# (SQLAlchemy) and profiling (cProfile) modules are imported by the
+# functions that use them, so that a command only loads what it needs and
+# starts quickly.
+from solarroi.cache import close_cache, get_cache, setup_cache
+from solarroi.common import check_file, die, get_windows, DEFAULT_BATCH_SIZE, DEFAULT_WINDOW_DAYS
+from solarroi.config import get_config, Config
+from solarroi.daemon import run_daemon, Schedule
+from solarroi.metrics import get_metrics, reset_metrics, write_metrics
+
+DATE_RE = re.compile(r"^2[0-9]{3}-[0|1|2][0-9]-[0|1|2|3][0-9]+$")
+DEFAULT_ACCOUNT_MAX_AGE = 21600
+DEFAULT_FORECAST_INTERVAL = 3600
+DEFAULT_JITTER = 60
+DEFAULT_PROFILE_DIR = "profile"
+DEFAULT_ROI_INTERVAL = 1800
+DEFAULT_WORKERS = 4
+NOW_RE = re.compile(r"^now-(?P<days>[0-9]+)$")
+
+
+def setup_logging(verbose: bool):
+    log_date = "%Y/%m/%d %H:%M:%S"
+    log_format = "%(asctime)s:%(levelname)s: %(message)s"
+    log_level = logging.INFO
+    if verbose:
+        log_level = logging.DEBUG
+
+    logging.basicConfig(format=log_format, datefmt=log_date, level=log_level)
+
+
+def load_config(config_path: Optional[str]) -> Config:
+    if config_path:
+        path = pathlib.Path(config_path).resolve()
+        logging.debug("Using config file: %s", path)
+        check_file(path)
+        solarroi.conf_file = path
+
+    return get_config()
+
+
+@contextlib.contextmanager
+def record_metrics(command: str, config: Config) -> Iterator[None]:
+    """
+    Record the metrics of the command run in the with block and write them
+    to the command's files for the paths in the Metrics section of the
+    config, even if it fails.
+    """
+    reset_metrics()
+    try:
+        yield
+    finally:
+        write_metrics(command, config.metrics.json_path, config.metrics.prometheus_path)
 
 
-def solar_forecast_main():
+@contextlib.contextmanager
+def profile_command(command: str, profile_dir: Optional[str]) -> Iterator[None]:
+    """
+    Profile the command run in the with block if profile_dir is given.
+    """
+    if profile_dir is None:
+        yield
+        return
+
+    from solarroi.profiling import profile_run
+
+    with profile_run(command, profile_dir):
+        yield
+
+
+def parse_date_argument(value: str, name: str, today: datetime.date) -> str:
+    """
+    Return the ISO date for the given date argument, which may be a date or
+    now-X for the date X days ago.
+    """
+    now_match = NOW_RE.match(value)
+    if now_match:
+        minus_days = int(now_match.group("days"))
+        return str(today - datetime.timedelta(days=minus_days))
+
+    if not DATE_RE.match(value):
+        die(f"Invalid {name} date: {value}")
+    return value
+
+
+def solar_forecast_main(argv: Optional[List[str]] = None):
     parser = argparse.ArgumentParser(
         description="Fetch solar forecast from Solcast",
         add_help=True
@@ -27,64 +109,84 @@ def solar_forecast_main():
         "-d", "--use-database", help="Save records to database",
         dest="use_database", action="store_true"
     )
+    parser.add_argument(
+        "--batch-size", help="Number of records to write to the database in each " +
+                             f"statement (default: {DEFAULT_BATCH_SIZE})",
+        dest="batch_size", type=int, default=DEFAULT_BATCH_SIZE
+    )
+    parser.add_argument(
+        "--skip-unchanged", help="Only write forecasts whose estimate has changed",
+        dest="skip_unchanged", action="store_true"
+    )
+    parser.add_argument(
+        "--profile", help="Profile the run and save the results to this directory " +
+                          f"(default: {DEFAULT_PROFILE_DIR})",
+        dest="profile_dir", nargs="?", const=DEFAULT_PROFILE_DIR
+    )
     parser.add_argument(
         "-v", "--verbose", help="Turn on debug messages", dest="verbose",
         action="store_true"
     )
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
 
-    log_date = "%Y/%m/%d %H:%M:%S"
-    log_format = "%(asctime)s:%(levelname)s: %(message)s"
-    log_level = logging.INFO
-    if args.verbose:
-        log_level = logging.DEBUG
+    setup_logging(args.verbose)
 
-    logging.basicConfig(format=log_format, datefmt=log_date, level=log_level)
+    if args.batch_size < 1:
+        die(f"Invalid batch size: {args.batch_size}")
+
+    config = load_config(args.config_path)
 
-    if args.config_path:
-        config_path = pathlib.Path(args.config_path).resolve()
-        logging.debug("Using config file: %s", config_path)
-        check_file(config_path)
-        solarroi.conf_file = config_path
+    with record_metrics("forecast", config), profile_command("forecast", args.profile_dir):
+        run_forecast(args, config)
 
-    forecasts = solcast.get_forecasts()
+
+def run_forecast(args: argparse.Namespace, config: Config):
+    """
+    Fetch the Solcast forecast and save or print it.
+    """
+    import solarroi.solcast as solcast
+
+    with get_metrics().phase("fetch"):
+        forecasts = solcast.get_forecasts(config)
 
     if len(forecasts) == 0:
         die("No forecast records returned!")
 
     if args.use_database:
         logging.debug("Saving records to database...")
-        session_maker = connect_db()
-        with session_maker() as session:
-            for forecast in forecasts:
-                date = datetime.datetime.fromisoformat(forecast["period_end"])
-                pv_estimate = forecast["pv_estimate"]
-
-                forecast_record = session.query(Solcast).filter(
-                    Solcast.date == date
-                ).first()
+        rows = [
+            {
+                # the database stores naive UTC date times
+                "date": datetime.datetime.fromisoformat(forecast["period_end"]).astimezone(
+                    datetime.timezone.utc
+                ).replace(tzinfo=None),
+                "pv_estimate": forecast["pv_estimate"]
+            }
+            for forecast in forecasts
+        ]
 
-                if forecast_record:
-                    logging.debug("Updating existing record for %s", date)
-                    forecast_record.pv_estimate = pv_estimate
-                else:
-                    logging.debug("Creating new record for %s", date)
+        from solarroi.sql import connect_db, get_solcast_estimates, upsert, Solcast
 
-                    forecast_record = Solcast(
-                        date=date,
-                        pv_estimate=pv_estimate
-                    )
+        session_maker = connect_db(config)
+        with get_metrics().phase("write"), session_maker() as session, session.begin():
+            if args.skip_unchanged:
+                estimates = get_solcast_estimates(
+                    session,
+                    min(row["date"] for row in rows),
+                    max(row["date"] for row in rows)
+                )
+                rows = [row for row in rows if estimates.get(row["date"]) != row["pv_estimate"]]
+                logging.debug("%d forecast records have changed", len(rows))
 
-                session.add(forecast_record)
-                session.commit()
+            upsert(session, Solcast, rows, args.batch_size)
 
         logging.info("Forecast records saved to database")
     else:
         pprint.pprint(forecasts)
 
 
-def solar_roi_main():
+def solar_roi_main(argv: Optional[List[str]] = None):
     parser = argparse.ArgumentParser(
         description="Calculate ROI for your PV system using GivEnergy " +
                     "and Octopus Energy APIs",
@@ -101,175 +203,501 @@ def solar_roi_main():
     parser.add_argument(
         "-s", "--start", help="Date to get consumption data from. Use now-X " +
                               "to specify a date X days ago.",
-        dest="start_date", required=True
+        dest="start_date", required=False
     )
     parser.add_argument(
         "-e", "--end", help="End date to get consumption data up to.",
         dest="end_date", required=False
     )
+    parser.add_argument(
+        "-i", "--incremental", help="Start from the day after the newest record " +
+                                    "in the database. Requires --use-database.",
+        dest="incremental", action="store_true"
+    )
+    parser.add_argument(
+        "--recheck-days", help="Number of stored days to process again in " +
+                               "incremental mode to pick up late meter readings " +
+                               "(default: settlement_days of the Cache section)",
+        dest="recheck_days", type=int
+    )
+    parser.add_argument(
+        "--batch-size", help="Number of records to write to the database in each " +
+                             f"statement (default: {DEFAULT_BATCH_SIZE})",
+        dest="batch_size", type=int, default=DEFAULT_BATCH_SIZE
+    )
+    parser.add_argument(
+        "--window-days", help="Number of days to fetch and process at a time " +
+                              f"(default: {DEFAULT_WINDOW_DAYS})",
+        dest="window_days", type=int, default=DEFAULT_WINDOW_DAYS
+    )
+    parser.add_argument(
+        "-w", "--workers", help="Number of concurrent requests to make to each API " +
+                                f"(default: {DEFAULT_WORKERS})",
+        dest="workers", type=int, default=DEFAULT_WORKERS
+    )
+    parser.add_argument(
+        "--no-cache", help="Do not use the API response cache",
+        dest="no_cache", action="store_true"
+    )
+    parser.add_argument(
+        "--refresh", help="Ignore cached API responses and replace them",
+        dest="refresh", action="store_true"
+    )
+    parser.add_argument(
+        "--profile", help="Profile the run and save the results to this directory " +
+                          f"(default: {DEFAULT_PROFILE_DIR})",
+        dest="profile_dir", nargs="?", const=DEFAULT_PROFILE_DIR
+    )
     parser.add_argument(
         "-v", "--verbose", help="Turn on debug messages", dest="verbose",
         action="store_true"
     )
 
-    args = parser.parse_args()
+    # the account is fetched on every run unless run by the daemon
+    parser.set_defaults(account_max_age=0)
 
-    log_date = "%Y/%m/%d %H:%M:%S"
-    log_format = "%(asctime)s:%(levelname)s: %(message)s"
-    log_level = logging.INFO
-    if args.verbose:
-        log_level = logging.DEBUG
+    args = parser.parse_args(argv)
 
-    logging.basicConfig(format=log_format, datefmt=log_date, level=log_level)
+    setup_logging(args.verbose)
+
+    config = load_config(args.config_path)
+
+    with record_metrics("roi", config), profile_command("roi", args.profile_dir):
+        run_roi(args, config)
 
-    if args.config_path:
-        config_path = pathlib.Path(args.config_path).resolve()
-        logging.debug("Using config file: %s", config_path)
-        check_file(config_path)
-        solarroi.conf_file = config_path
 
-    date_re = re.compile(r"^2[0-9]{3}-[0|1|2][0-9]-[0|1|2|3][0-9]+$")
+def run_roi(args: argparse.Namespace, config: Config):
+    """
+    Calculate the ROI for the range given by args and print it, saving the
+    records to the database if requested.
+    """
+    import solarroi.octopusenergy as octopus_energy
+
+    from solarroi.roi import get_roi_rows, iter_roi_by_window
+
+    if args.use_database:
+        from solarroi.sql import connect_db, get_latest_roi_date, update_rollups, upsert, SolarROI, SolarROIHalfHour
 
-    end_date = None
+    # the daemon keeps the cache open between runs
+    if not args.no_cache and (get_cache() is None or args.refresh):
+        setup_cache(config, args.refresh)
+
+    today = datetime.datetime.now().date()
+    end_date = str(today)
+    session_maker = None
 
     if args.end_date is not None:
-        if not date_re.match(args.end_date):
-            die(f"Invalid end date: {args.end_date}")
-        end_date = args.end_date
+        end_date = parse_date_argument(args.end_date, "end", today)
+
+    if args.incremental:
+        if args.start_date is not None:
+            die("--start cannot be used with --incremental")
+        if not args.use_database:
+            die("--incremental requires --use-database")
+        recheck_days = args.recheck_days
+        if recheck_days is None:
+            # days that are not settled yet may still be missing readings
+            recheck_days = config.cache.settlement_days
+        if recheck_days < 0:
+            die(f"Invalid number of recheck days: {recheck_days}")
+
+        session_maker = connect_db(config)
+        with session_maker() as session:
+            latest_date = get_latest_roi_date(session)
+        if latest_date is None:
+            die("No records in the database, use --start for the first run")
+        logging.debug("Newest record in the database: %s", latest_date)
+
+        start_date = str(latest_date + datetime.timedelta(days=1 - recheck_days))
+        if end_date < start_date:
+            logging.info("Database is up to date")
+            return
     else:
-        today = datetime.datetime.now().date()
-        end_date = str(today)
+        # Check start date argument
+        if args.start_date is None:
+            die("A start date is required unless --incremental is used")
 
-    # Check start date argument
-    now_re = re.compile(r"^now-(?P<days>[0-9]+)$")
+        start_date = parse_date_argument(args.start_date, "start", today)
 
-    start_date = args.start_date
+        if end_date < start_date:
+            die("End date is before start date")
 
-    now_match = now_re.match(start_date)
-    if now_match:
-        minus_days = int(now_match.group("days"))
-        start_date = str(today - datetime.timedelta(days=minus_days))
-    else:
-        if not date_re.match(start_date):
-            die(f"Invalid start date: {args.start_date}")
+    if args.workers < 1:
+        die(f"Invalid number of workers: {args.workers}")
 
-    if end_date < start_date:
-        die("End date is before start date")
+    if args.batch_size < 1:
+        die(f"Invalid batch size: {args.batch_size}")
 
-    results = {}
-    roi = 0
+    if args.window_days < 1:
+        die(f"Invalid number of window days: {args.window_days}")
 
     logging.debug("Querying Octopus Energy API")
 
-    import_meter, export_meter = octopus_energy.get_tariff_history()
+    import_meter, export_meter = octopus_energy.get_tariff_history(config, args.account_max_age)
 
     logging.debug("Import meter: %s", import_meter)
     logging.debug("Export meter: %s", export_meter)
 
-    octopus_energy_import_cost = octopus_energy.get_energy_cost_by_day(
-        import_meter,
-        start_date,
-        end_date
-    )
+    if session_maker is None and args.use_database:
+        session_maker = connect_db(config)
+
+    roi = 0.0
+    days = 0
 
-    octopus_energy_export_cost = octopus_energy.get_energy_cost_by_day(
+    # process the range a window at a time so that records are written as
+    # soon as they are ready and memory use does not grow with the range
+    for results in iter_roi_by_window(
+        config,
+        import_meter,
         export_meter,
-        start_date,
-        end_date
+        datetime.date.fromisoformat(start_date),
+        datetime.date.fromisoformat(end_date),
+        args.window_days,
+        args.workers
+    ):
+        logging.debug(results.days)
+        roi += sum(record.get("roi", 0) for record in results.days.values())
+        days += len(results.days)
+
+        if args.use_database:
+            logging.debug("Saving records to database...")
+            rows = get_roi_rows(results.days)
+            with get_metrics().phase("write"), session_maker() as session, session.begin():
+                upsert(session, SolarROI, rows, args.batch_size)
+                upsert(session, SolarROIHalfHour, results.half_hours, args.batch_size)
+                update_rollups(session, [row["date"] for row in rows], args.batch_size)
+            logging.debug("Database update complete")
+
+    if days == 0:
+        die(f"No records for {start_date} to {end_date}")
+    roi_per_day = round(roi / days, 2)
+
+    print(f"ROI: £{round(roi, 2)} for {days} days")
+    print(f"ROI per day: £{roi_per_day}")
+
+
+def solar_backfill_main(argv: Optional[List[str]] = None):
+    from solarroi.backfill import DEFAULT_CHECKPOINT_DIR, DEFAULT_PARALLEL, DEFAULT_RETRIES
+
+    parser = argparse.ArgumentParser(
+        description="Backfill the ROI records in the database for a date " +
+                    "range, resuming from where a previous run stopped",
+        add_help=True
+    )
+    parser.add_argument(
+        "-c", "--config", help="Path to config file",
+        dest="config_path"
+    )
+    parser.add_argument(
+        "-s", "--start", help="Date to get consumption data from. Use now-X " +
+                              "to specify a date X days ago.",
+        dest="start_date", required=True
+    )
+    parser.add_argument(
+        "-e", "--end", help="End date to get consumption data up to.",
+        dest="end_date", required=False
+    )
+    parser.add_argument(
+        "--checkpoint", help="Path to the checkpoint file (default: a file in " +
+                             f"{DEFAULT_CHECKPOINT_DIR} for the config file and date range)",
+        dest="checkpoint_path"
+    )
+    parser.add_argument(
+        "-p", "--parallel", help="Number of windows to process at the same time " +
+                                 f"(default: {DEFAULT_PARALLEL})",
+        dest="parallel", type=int, default=DEFAULT_PARALLEL
+    )
+    parser.add_argument(
+        "-r", "--retries", help="Number of times to retry failed windows " +
+                                f"(default: {DEFAULT_RETRIES})",
+        dest="retries", type=int, default=DEFAULT_RETRIES
+    )
+    parser.add_argument(
+        "--batch-size", help="Number of records to write to the database in each " +
+                             f"statement (default: {DEFAULT_BATCH_SIZE})",
+        dest="batch_size", type=int, default=DEFAULT_BATCH_SIZE
+    )
+    parser.add_argument(
+        "--window-days", help="Number of days in each window " +
+                              f"(default: {DEFAULT_WINDOW_DAYS})",
+        dest="window_days", type=int, default=DEFAULT_WINDOW_DAYS
+    )
+    parser.add_argument(
+        "-w", "--workers", help="Number of concurrent requests to make to each API " +
+                                f"for each window (default: {DEFAULT_WORKERS})",
+        dest="workers", type=int, default=DEFAULT_WORKERS
+    )
+    parser.add_argument(
+        "--no-cache", help="Do not use the API response cache",
+        dest="no_cache", action="store_true"
+    )
+    parser.add_argument(
+        "-v", "--verbose", help="Turn on debug messages", dest="verbose",
+        action="store_true"
     )
 
-    logging.debug("Querying GivEnergy API")
+    args = parser.parse_args(argv)
 
-    giv_energy_use = givenergy.get_energy_consumption_by_day(
-        start_date,
-        end_date
+    setup_logging(args.verbose)
+
+    config = load_config(args.config_path)
+
+    with record_metrics("backfill", config):
+        run_backfill(args, config)
+
+
+def run_backfill(args: argparse.Namespace, config: Config):
+    """
+    Backfill the range given by args.
+    """
+    import solarroi.octopusenergy as octopus_energy
+
+    from solarroi.backfill import backfill, get_checkpoint_path, Checkpoint
+    from solarroi.sql import connect_db
+
+    if not args.no_cache:
+        setup_cache(config)
+
+    today = datetime.datetime.now().date()
+    start_date = parse_date_argument(args.start_date, "start", today)
+    end_date = str(today)
+    if args.end_date is not None:
+        end_date = parse_date_argument(args.end_date, "end", today)
+
+    if end_date < start_date:
+        die("End date is before start date")
+
+    for name in ["parallel", "workers", "batch_size", "window_days"]:
+        if getattr(args, name) < 1:
+            die(f"Invalid {name.replace('_', ' ')}: {getattr(args, name)}")
+
+    if args.retries < 0:
+        die(f"Invalid retries: {args.retries}")
+
+    import_meter, export_meter = octopus_energy.get_tariff_history(config)
+
+    logging.debug("Import meter: %s", import_meter)
+    logging.debug("Export meter: %s", export_meter)
+
+    windows = list(get_windows(
+        datetime.date.fromisoformat(start_date),
+        datetime.date.fromisoformat(end_date),
+        args.window_days
+    ))
+
+    if args.checkpoint_path is None:
+        checkpoint_path = get_checkpoint_path(
+            config.path, datetime.date.fromisoformat(start_date), datetime.date.fromisoformat(end_date)
+        )
+    else:
+        checkpoint_path = pathlib.Path(args.checkpoint_path).expanduser()
+
+    failed = backfill(
+        config,
+        connect_db(config),
+        import_meter,
+        export_meter,
+        windows,
+        Checkpoint(checkpoint_path),
+        args.parallel,
+        args.retries,
+        args.workers,
+        args.batch_size,
+        config.cache.settlement_days
     )
 
-    for date, result in giv_energy_use.items():
-        results[date] = {}
-        results[date]["grid_export"] = 0
-        results[date]["grid_import"] = 0
+    if len(failed) > 0:
+        die(
+            f"{len(failed)} windows failed: " +
+            ", ".join(f"{window[0]} to {window[1]}" for window in failed) +
+            ". Run the backfill again to retry them."
+        )
 
-        if date in octopus_energy_import_cost["consumption"]:
-            # work out no PV cost
-            no_pv_cost = 0.0
-            for consumption_period in result["consumption_periods"]:
-                # find price for this time
-                for tariff_price in octopus_energy_import_cost["prices"][date]:
-                    if tariff_price.is_active(consumption_period.valid_from):
-                        no_pv_cost += tariff_price.price * consumption_period.consumption
-                        break
+    logging.info("Backfill of %s to %s complete", start_date, end_date)
 
-            results[date] = {
-                "home_consumption": result["total_home_consumption"],
-                "no_pv_cost": round(no_pv_cost, 2),
-                "cost": octopus_energy_import_cost["expenditure"][date],
-                "grid_import": octopus_energy_import_cost["consumption"][date]
-            }
-        else:
-            continue
-
-        if date in octopus_energy_export_cost["generation"]:
-            results[date]["income"] = octopus_energy_export_cost["income"][date]
-            results[date]["grid_export"] = octopus_energy_export_cost["generation"][date]
-        else:
-            results[date]["income"] = 0
-            results[date]["grid_export"] = 0
-            results[date]["roi"] = 0
-
-        results[date]["roi"] = (results[date]["no_pv_cost"] - results[date]["cost"]) + results[date]["income"]
-        roi += results[date]["roi"]
-
-    logging.debug(results)
-    days = len(results)
-    roi_per_day = round(roi / days, 2)
 
-    print(f"ROI: £{round(roi, 2)} for {days} days")
-    print(f"ROI per day: £{roi_per_day}")
+def solar_daemon_main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(
+        description="Keep the ROI records and solar forecast in the database " +
+                    "up to date, running each on a schedule",
+        add_help=True
+    )
+    parser.add_argument(
+        "-c", "--config", help="Path to config file",
+        dest="config_path"
+    )
+    parser.add_argument(
+        "--roi-interval", help="Seconds between incremental ROI updates, 0 to disable " +
+                               f"(default: {DEFAULT_ROI_INTERVAL})",
+        dest="roi_interval", type=float, default=DEFAULT_ROI_INTERVAL
+    )
+    parser.add_argument(
+        "--forecast-interval", help="Seconds between forecast refreshes, 0 to disable " +
+                                    f"(default: {DEFAULT_FORECAST_INTERVAL})",
+        dest="forecast_interval", type=float, default=DEFAULT_FORECAST_INTERVAL
+    )
+    parser.add_argument(
+        "--jitter", help="Maximum random number of seconds to delay each run by " +
+                         f"(default: {DEFAULT_JITTER})",
+        dest="jitter", type=float, default=DEFAULT_JITTER
+    )
+    parser.add_argument(
+        "--account-max-age", help="Seconds to reuse the Octopus Energy account and " +
+                                  f"agreements for (default: {DEFAULT_ACCOUNT_MAX_AGE})",
+        dest="account_max_age", type=float, default=DEFAULT_ACCOUNT_MAX_AGE
+    )
+    parser.add_argument(
+        "--recheck-days", help="Number of stored days to process again on each ROI " +
+                               "update to pick up late meter readings " +
+                               "(default: settlement_days of the Cache section)",
+        dest="recheck_days", type=int
+    )
+    parser.add_argument(
+        "--batch-size", help="Number of records to write to the database in each " +
+                             f"statement (default: {DEFAULT_BATCH_SIZE})",
+        dest="batch_size", type=int, default=DEFAULT_BATCH_SIZE
+    )
+    parser.add_argument(
+        "--window-days", help="Number of days to fetch and process at a time " +
+                              f"(default: {DEFAULT_WINDOW_DAYS})",
+        dest="window_days", type=int, default=DEFAULT_WINDOW_DAYS
+    )
+    parser.add_argument(
+        "-w", "--workers", help="Number of concurrent requests to make to each API " +
+                                f"(default: {DEFAULT_WORKERS})",
+        dest="workers", type=int, default=DEFAULT_WORKERS
+    )
+    parser.add_argument(
+        "--skip-unchanged", help="Only write forecasts whose estimate has changed",
+        dest="skip_unchanged", action="store_true"
+    )
+    parser.add_argument(
+        "--no-cache", help="Do not use the API response cache",
+        dest="no_cache", action="store_true"
+    )
+    parser.add_argument(
+        "-v", "--verbose", help="Turn on debug messages", dest="verbose",
+        action="store_true"
+    )
 
-    if args.use_database:
-        logging.debug("Saving records to database...")
-        session_maker = connect_db()
-        with session_maker() as session:
-            for date, record in results.items():
-                fields_missing = []
-                for field in ["cost", "grid_export", "grid_import",
-                              "home_consumption", "income", "no_pv_cost",
-                              "roi"]:
-                    if field not in record:
-                        fields_missing.append(field)
-
-                if len(fields_missing) > 0:
-                    logging.warning("%s: Missing fields: %s", date, ",".join(
-                        fields_missing
-                    ))
-                    continue
-
-                solar_roi = session.query(SolarROI).filter(
-                    SolarROI.date == date
-                ).first()
-                if solar_roi:
-                    logging.debug("Updating existing record for %s", date)
-                    solar_roi.cost = record["cost"]
-                    solar_roi.grid_export = record["grid_export"]
-                    solar_roi.grid_import = record["grid_import"]
-                    solar_roi.home_consumption = record["home_consumption"]
-                    solar_roi.income = record["income"]
-                    solar_roi.no_pv_cost = record["no_pv_cost"]
-                    solar_roi.roi = record["roi"]
-                else:
-                    logging.debug("Creating new record for %s", date)
-                    solar_roi = SolarROI(
-                        date=date,
-                        cost=record["cost"],
-                        grid_export=record["grid_export"],
-                        grid_import=record["grid_import"],
-                        home_consumption=record["home_consumption"],
-                        income=record["income"],
-                        no_pv_cost=record["no_pv_cost"],
-                        roi=record["roi"]
-                    )
-                session.add(solar_roi)
-                session.commit()
-
-        logging.debug("Database update complete")
+    args = parser.parse_args(argv)
+
+    setup_logging(args.verbose)
+
+    for name in ["roi_interval", "forecast_interval", "jitter", "account_max_age"]:
+        if getattr(args, name) < 0:
+            die(f"Invalid {name.replace('_', ' ')}: {getattr(args, name)}")
+
+    if args.roi_interval == 0 and args.forecast_interval == 0:
+        die("Nothing to do: both the ROI and forecast schedules are disabled")
+
+    config = load_config(args.config_path)
+
+    stop = threading.Event()
+    for signal_number in [signal.SIGINT, signal.SIGTERM]:
+        signal.signal(signal_number, lambda signal_number, frame: stop.set())
+
+    try:
+        run_daemon(get_schedules(args, config), stop)
+    finally:
+        close_connections()
+
+
+def close_connections():
+    """
+    Close the HTTP connection pools, response cache and database engines
+    that the daemon keeps between runs.
+    """
+    from solarroi.client import close_api_clients
+    from solarroi.sql import close_db
+
+    close_api_clients()
+    close_cache()
+    close_db()
+
+
+def get_schedules(args: argparse.Namespace, config: Config) -> List[Schedule]:
+    """
+    Return the schedules of the ROI and forecast runs requested by the
+    daemon's args.
+    """
+    schedules = []
+    loaded_config = config
+
+    def reload_config() -> Config:
+        """
+        Return the config for a run, closing the connections that were set
+        up with the previous config if the file has changed since.
+        """
+        nonlocal loaded_config
+
+        current_config = get_config()
+        if current_config is not loaded_config:
+            logging.info("Config file %s has changed, reloading", current_config.path)
+            close_connections()
+            loaded_config = current_config
+        return current_config
+
+    if args.roi_interval > 0:
+        roi_args = argparse.Namespace(
+            use_database=True,
+            start_date=None,
+            end_date=None,
+            incremental=True,
+            recheck_days=args.recheck_days,
+            batch_size=args.batch_size,
+            window_days=args.window_days,
+            workers=args.workers,
+            no_cache=args.no_cache,
+            refresh=False,
+            account_max_age=args.account_max_age
+        )
+
+        def run_roi_update():
+            run_config = reload_config()
+            with record_metrics("roi", run_config):
+                run_roi(roi_args, run_config)
+
+        schedules.append(Schedule("roi", args.roi_interval, args.jitter, run_roi_update))
+
+    if args.forecast_interval > 0:
+        forecast_args = argparse.Namespace(
+            use_database=True,
+            batch_size=args.batch_size,
+            skip_unchanged=args.skip_unchanged
+        )
+
+        def run_forecast_refresh():
+            run_config = reload_config()
+            with record_metrics("forecast", run_config):
+                run_forecast(forecast_args, run_config)
+
+        schedules.append(Schedule("forecast", args.forecast_interval, args.jitter, run_forecast_refresh))
+
+    return schedules
+
+
+COMMANDS = {
+    "backfill": solar_backfill_main,
+    "daemon": solar_daemon_main,
+    "forecast": solar_forecast_main,
+    "roi": solar_roi_main
+}
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(
+        description="Solar-ROI: calculate the ROI of a GivEnergy PV system " +
+                    "that uses Octopus Energy",
+        add_help=True
+    )
+    parser.add_argument(
+        "command", help="Command to run", choices=sorted(COMMANDS.keys())
+    )
+    parser.add_argument(
+        "args", help="Arguments for the command, use COMMAND -h for help",
+        nargs=argparse.REMAINDER
+    )
+
+    args = parser.parse_args(argv)
+    COMMANDS[args.command](args.args)
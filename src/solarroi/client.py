@@ -0,0 +1,200 @@
+"""
+Shared HTTP client layer for the GivEnergy, Octopus Energy and Solcast APIs.
+
+Each API host gets one requests session with a keep-alive connection pool
+and its authentication headers set up once, so that repeated calls reuse
+the same TCP and TLS connections.
+
+Requests to each host are limited by a token bucket so that concurrent
+callers stay within the provider's rate limit. Responses that indicate a
+temporary problem (429 and 5xx) and connection errors are retried with
+jittered exponential backoff, waiting for Retry-After when it is given.
+"""
+
+import datetime
+import email.utils
+import logging
+import random
+import threading
+import time
+import urllib.parse
+
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import requests
+
+from requests.adapters import HTTPAdapter
+
+from solarroi.config import HTTPConfig
+from solarroi.metrics import get_metrics
+
+# status codes that are worth retrying
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class RateLimiter:
+    """
+    Token bucket that allows rate requests per second on average, with
+    bursts of up to burst requests. A rate of 0 means no limit. All of the
+    callers can be held back with pause, e.g. when a server returns
+    Retry-After.
+    """
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1.0, rate)
+        self.__lock = threading.Lock()
+        self.__tokens = self.burst
+        self.__updated = time.monotonic()
+        self.__paused_until = 0.0
+
+    def __repr__(self) -> str:
+        return f"<rate: {self.rate}, burst: {self.burst}>"
+
+    def acquire(self):
+        """
+        Wait until a request may be made.
+        """
+        with self.__lock:
+            now = time.monotonic()
+            start = max(now, self.__paused_until)
+            if self.rate > 0:
+                self.__tokens = min(self.burst, self.__tokens + (now - self.__updated) * self.rate)
+                self.__updated = now
+                # take the token now, even if that leaves the bucket in debt,
+                # so that waiting callers are served in order
+                self.__tokens -= 1
+                if self.__tokens < 0:
+                    start = max(start, now - self.__tokens / self.rate)
+        delay = start - now
+        if delay > 0:
+            time.sleep(delay)
+
+    def pause(self, seconds: float):
+        """
+        Stop any request from being made for the given number of seconds.
+        """
+        with self.__lock:
+            self.__paused_until = max(self.__paused_until, time.monotonic() + seconds)
+
+
+class ApiClient:
+
+    def __init__(
+        self,
+        http_config: HTTPConfig,
+        headers: Optional[Dict[str, str]] = None,
+        auth: Optional[Tuple[str, str]] = None,
+        rate_limit: Optional[float] = None
+    ):
+        self.pool_size = http_config.pool_size
+        self.timeout = http_config.timeout
+        self.retries = http_config.retries
+        self.backoff = http_config.backoff
+        self.max_backoff = http_config.max_backoff
+        self.rate_limiter = RateLimiter(http_config.rate_limit if rate_limit is None else rate_limit)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        if headers is not None:
+            self.session.headers.update(headers)
+        if auth is not None:
+            self.session.auth = auth
+
+    def __repr__(self) -> str:
+        return f"<pool_size: {self.pool_size}, timeout: {self.timeout}, " + \
+            f"rate_limiter: {self.rate_limiter}, retries: {self.retries}>"
+
+    def get_backoff(self, attempt: int) -> float:
+        """
+        Return a random delay of up to backoff * 2^attempt seconds.
+        """
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    def request(self, method: str, url: str, **kwargs: Any) -> requests.Response:
+        """
+        Make the given request, retrying temporary failures. The last
+        response is returned if it still fails after all of the retries.
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        attempt = 0
+        while True:
+            self.rate_limiter.acquire()
+            start = time.perf_counter()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as error:
+                get_metrics().record_request(url, "error", time.perf_counter() - start, 0)
+                if attempt >= self.retries:
+                    raise
+                delay = self.get_backoff(attempt)
+                logging.warning("%s %s failed: %s, retrying in %.1fs", method, url, error, delay)
+            else:
+                get_metrics().record_request(
+                    url, str(response.status_code), time.perf_counter() - start, len(response.content)
+                )
+                if response.status_code not in RETRY_STATUS_CODES or attempt >= self.retries:
+                    return response
+                retry_after = get_retry_after(response)
+                if retry_after is not None:
+                    # the whole host is over its limit, not just this request
+                    delay = retry_after
+                    self.rate_limiter.pause(delay)
+                else:
+                    delay = self.get_backoff(attempt)
+                logging.warning(
+                    "%s %s returned %d, retrying in %.1fs", method, url, response.status_code, delay
+                )
+            get_metrics().record_retry(url)
+            time.sleep(delay)
+            attempt += 1
+
+
+def get_retry_after(response: requests.Response) -> Optional[float]:
+    """
+    Return the number of seconds from the Retry-After header of the given
+    response, which may be a number of seconds or a date, or None.
+    """
+    value = response.headers.get("Retry-After")
+    if value is None:
+        return None
+
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+
+    try:
+        retry_date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        logging.warning("Invalid Retry-After header: %s", value)
+        return None
+    if retry_date.tzinfo is None:
+        retry_date = retry_date.replace(tzinfo=datetime.timezone.utc)
+    return max(0.0, (retry_date - datetime.datetime.now(datetime.timezone.utc)).total_seconds())
+
+
+api_clients: Dict[str, ApiClient] = {}
+api_clients_lock = threading.Lock()
+
+
+def get_api_client(base_url: str, create: Callable[[], ApiClient]) -> ApiClient:
+    """
+    Return the client for the host of the given URL, calling create to
+    make it the first time the host is used.
+    """
+    host = urllib.parse.urlsplit(base_url).netloc
+    with api_clients_lock:
+        if host not in api_clients:
+            api_clients[host] = create()
+            logging.debug("get_api_client: created %s for %s", api_clients[host], host)
+        return api_clients[host]
+
+
+def close_api_clients():
+    with api_clients_lock:
+        for api_client in api_clients.values():
+            api_client.session.close()
+        api_clients.clear()
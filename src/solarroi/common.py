@@ -1,10 +1,17 @@
-import configparser
 import datetime
 import logging
 import pathlib
 import sys
+import zoneinfo
 
-import solarroi
+from typing import Iterator, NoReturn, Optional, Tuple
+
+# number of records written to the database in each statement
+DEFAULT_BATCH_SIZE = 500
+# number of days fetched and processed at a time
+DEFAULT_WINDOW_DAYS = 31
+# time zone used for the days that records are grouped by
+TIMEZONE = "Europe/London"
 
 
 def check_file(f: pathlib.Path):
@@ -15,7 +22,7 @@ def check_file(f: pathlib.Path):
         die(f"{f} does not exist")
 
 
-def die(msg: str):
+def die(msg: str) -> NoReturn:
     """
     Exit the program with the given error message.
     """
@@ -23,20 +30,6 @@ def die(msg: str):
     sys.exit(1)
 
 
-def get_config_opion(section_name: str, option_name: str) -> str:
-    check_file(solarroi.conf_file)
-    parser = configparser.ConfigParser()
-    parser.read(solarroi.conf_file)
-
-    if not parser.has_section(section_name):
-        die(f"Could not find section {section_name} in {solarroi.conf_file}")
-
-    if not parser.has_option(section_name, option_name):
-        die(f"Section {section_name} has no option {option_name}")
-
-    return parser.get(section_name, option_name)
-
-
 def get_datetime_from_date(d: datetime.date, endOfDay: bool = False) -> datetime.datetime:
     if not endOfDay:
         return datetime.datetime(
@@ -58,3 +51,43 @@ def get_datetime_from_date(d: datetime.date, endOfDay: bool = False) -> datetime
         second=59,
         tzinfo=datetime.timezone.utc
     )
+
+
+def get_windows(
+    start_date: datetime.date, end_date: datetime.date, window_days: int
+) -> Iterator[Tuple[datetime.date, datetime.date]]:
+    """
+    Split the given range into windows of up to window_days days.
+    """
+    window_start = start_date
+    while window_start <= end_date:
+        window_end = min(window_start + datetime.timedelta(days=window_days - 1), end_date)
+        yield (window_start, window_end)
+        window_start = window_end + datetime.timedelta(days=1)
+
+
+def parse_local_datetime(value: str, after: Optional[datetime.datetime] = None) -> datetime.datetime:
+    """
+    Parse the given ISO date time, which is in the local TIMEZONE unless it
+    has an offset. When the clocks go back the local times of the repeated
+    hour are ambiguous: a time that would not be later than after is taken
+    to be its second occurrence.
+    """
+    dt = datetime.datetime.fromisoformat(value)
+    if dt.tzinfo is not None:
+        return dt
+    dt = dt.replace(tzinfo=zoneinfo.ZoneInfo(TIMEZONE))
+    # compare timestamps, as comparing times in the same zone ignores the fold
+    if after is not None and dt.timestamp() <= after.timestamp():
+        second = dt.replace(fold=1)
+        # the fold only changes the time of the repeated hour
+        if second.utcoffset() != dt.utcoffset():
+            return second
+    return dt
+
+
+def get_local_datetime_from_date(d: datetime.date) -> datetime.datetime:
+    """
+    Return the start of the given day in the local TIMEZONE.
+    """
+    return datetime.datetime.combine(d, datetime.time(), tzinfo=zoneinfo.ZoneInfo(TIMEZONE))
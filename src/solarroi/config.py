@@ -0,0 +1,273 @@
+"""
+Solar-ROI configuration.
+
+The config file is parsed and validated once into a Config object which
+is then passed to the API client modules. get_config only parses the
+file again if it has been modified since it was last loaded.
+"""
+
+import configparser
+import logging
+import pathlib
+import threading
+
+from typing import Callable, Dict, List, Optional, TypeVar
+
+import solarroi
+
+from solarroi.common import check_file, die
+
+T = TypeVar("T")
+
+DEFAULT_CACHE_PATH = pathlib.Path.home() / ".cache" / "solar-roi" / "cache.sqlite"
+# number of days after which API data is assumed to be final
+DEFAULT_CACHE_SETTLEMENT_DAYS = 3
+DEFAULT_CACHE_MAX_SIZE_MB = 256
+DEFAULT_HTTP_POOL_SIZE = 10
+DEFAULT_HTTP_TIMEOUT = 60.0
+# requests per second to each API host, 0 for no limit
+DEFAULT_HTTP_RATE_LIMIT = 0.0
+DEFAULT_HTTP_RETRIES = 5
+# seconds before the first retry, doubled for each retry after that
+DEFAULT_HTTP_BACKOFF = 1.0
+DEFAULT_HTTP_MAX_BACKOFF = 60.0
+
+
+class GivEnergyConfig:
+
+    SECTION = "GivEnergy"
+
+    def __init__(self, api_key: str, inverter_serial: str, rate_limit: float = DEFAULT_HTTP_RATE_LIMIT):
+        self.api_key = api_key
+        self.inverter_serial = inverter_serial
+        self.rate_limit = rate_limit
+
+    def __repr__(self) -> str:
+        return f"<inverter_serial: {self.inverter_serial}, rate_limit: {self.rate_limit}>"
+
+
+class OctopusEnergyConfig:
+
+    SECTION = "OctopusEnergy"
+
+    def __init__(self, account: str, api_key: str, rate_limit: float = DEFAULT_HTTP_RATE_LIMIT):
+        self.account = account
+        self.api_key = api_key
+        self.rate_limit = rate_limit
+
+    def __repr__(self) -> str:
+        return f"<account: {self.account}, rate_limit: {self.rate_limit}>"
+
+
+class MySQLConfig:
+
+    SECTION = "MySQL"
+
+    def __init__(self, user: str, password: str, database: str, host: str):
+        self.user = user
+        self.password = password
+        self.database = database
+        self.host = host
+
+    def __repr__(self) -> str:
+        return f"<user: {self.user}, database: {self.database}, host: {self.host}>"
+
+
+class SolcastConfig:
+
+    SECTION = "Solcast"
+
+    def __init__(self, api_key: str, resource_id: str, rate_limit: float = DEFAULT_HTTP_RATE_LIMIT):
+        self.api_key = api_key
+        self.resource_id = resource_id
+        self.rate_limit = rate_limit
+
+    def __repr__(self) -> str:
+        return f"<resource_id: {self.resource_id}, rate_limit: {self.rate_limit}>"
+
+
+class CacheConfig:
+
+    SECTION = "Cache"
+
+    def __init__(
+        self,
+        path: pathlib.Path = DEFAULT_CACHE_PATH,
+        settlement_days: int = DEFAULT_CACHE_SETTLEMENT_DAYS,
+        max_size_mb: int = DEFAULT_CACHE_MAX_SIZE_MB
+    ):
+        self.path = path
+        self.settlement_days = settlement_days
+        self.max_size_mb = max_size_mb
+
+    def __repr__(self) -> str:
+        return f"<path: {self.path}, settlement_days: {self.settlement_days}, max_size_mb: {self.max_size_mb}>"
+
+
+class HTTPConfig:
+
+    SECTION = "HTTP"
+
+    def __init__(
+        self,
+        pool_size: int = DEFAULT_HTTP_POOL_SIZE,
+        timeout: float = DEFAULT_HTTP_TIMEOUT,
+        rate_limit: float = DEFAULT_HTTP_RATE_LIMIT,
+        retries: int = DEFAULT_HTTP_RETRIES,
+        backoff: float = DEFAULT_HTTP_BACKOFF,
+        max_backoff: float = DEFAULT_HTTP_MAX_BACKOFF
+    ):
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.rate_limit = rate_limit
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+    def __repr__(self) -> str:
+        return f"<pool_size: {self.pool_size}, timeout: {self.timeout}, rate_limit: {self.rate_limit}, " + \
+            f"retries: {self.retries}, backoff: {self.backoff}, max_backoff: {self.max_backoff}>"
+
+
+class MetricsConfig:
+
+    SECTION = "Metrics"
+
+    def __init__(self, json_path: Optional[pathlib.Path] = None, prometheus_path: Optional[pathlib.Path] = None):
+        self.json_path = json_path
+        self.prometheus_path = prometheus_path
+
+    def __repr__(self) -> str:
+        return f"<json_path: {self.json_path}, prometheus_path: {self.prometheus_path}>"
+
+
+class Config:
+
+    def __init__(self, path: pathlib.Path):
+        check_file(path)
+        self.path = path
+        self.mtime = path.stat().st_mtime
+
+        parser = configparser.ConfigParser()
+        parser.read(path)
+        self.__parser = parser
+
+        self.http = HTTPConfig(
+            self.__get(HTTPConfig.SECTION, "pool_size", int, DEFAULT_HTTP_POOL_SIZE),
+            self.__get(HTTPConfig.SECTION, "timeout", float, DEFAULT_HTTP_TIMEOUT),
+            self.__get(HTTPConfig.SECTION, "rate_limit", float, DEFAULT_HTTP_RATE_LIMIT),
+            self.__get(HTTPConfig.SECTION, "retries", int, DEFAULT_HTTP_RETRIES),
+            self.__get(HTTPConfig.SECTION, "backoff", float, DEFAULT_HTTP_BACKOFF),
+            self.__get(HTTPConfig.SECTION, "max_backoff", float, DEFAULT_HTTP_MAX_BACKOFF)
+        )
+
+        # API and database sections are only required by the commands
+        # that use them, but if present they must be complete
+        self.__givenergy = self.__load_section(
+            GivEnergyConfig.SECTION, ["api_key", "inverter_serial"],
+            lambda options: GivEnergyConfig(**options, rate_limit=self.__get_rate_limit(GivEnergyConfig.SECTION))
+        )
+        self.__octopus_energy = self.__load_section(
+            OctopusEnergyConfig.SECTION, ["account", "api_key"],
+            lambda options: OctopusEnergyConfig(
+                **options, rate_limit=self.__get_rate_limit(OctopusEnergyConfig.SECTION)
+            )
+        )
+        self.__mysql = self.__load_section(
+            MySQLConfig.SECTION, ["user", "password", "database", "host"],
+            lambda options: MySQLConfig(**options)
+        )
+        self.__solcast = self.__load_section(
+            SolcastConfig.SECTION, ["api_key", "resource_id"],
+            lambda options: SolcastConfig(**options, rate_limit=self.__get_rate_limit(SolcastConfig.SECTION))
+        )
+
+        self.cache = CacheConfig(
+            pathlib.Path(self.__get(CacheConfig.SECTION, "path", str, str(DEFAULT_CACHE_PATH))).expanduser(),
+            self.__get(CacheConfig.SECTION, "settlement_days", int, DEFAULT_CACHE_SETTLEMENT_DAYS),
+            self.__get(CacheConfig.SECTION, "max_size_mb", int, DEFAULT_CACHE_MAX_SIZE_MB)
+        )
+        self.metrics = MetricsConfig(
+            self.__get_path(MetricsConfig.SECTION, "json_path"),
+            self.__get_path(MetricsConfig.SECTION, "prometheus_path")
+        )
+
+    def __repr__(self) -> str:
+        return f"<path: {self.path}, mtime: {self.mtime}>"
+
+    def __get(self, section_name: str, option_name: str, convert: Callable[[str], T], fallback: T) -> T:
+        if not self.__parser.has_option(section_name, option_name):
+            return fallback
+        value = self.__parser.get(section_name, option_name)
+        try:
+            return convert(value)
+        except ValueError:
+            die(f"Invalid value for {option_name} in section {section_name}: {value}")
+
+    def __get_path(self, section_name: str, option_name: str) -> Optional[pathlib.Path]:
+        if not self.__parser.has_option(section_name, option_name):
+            return None
+        return pathlib.Path(self.__parser.get(section_name, option_name)).expanduser()
+
+    def __get_rate_limit(self, section_name: str) -> float:
+        # an API section's rate_limit overrides the one in the HTTP section
+        return self.__get(section_name, "rate_limit", float, self.http.rate_limit)
+
+    def __load_section(
+        self, section_name: str, option_names: List[str], create: Callable[[Dict[str, str]], T]
+    ) -> Optional[T]:
+        if not self.__parser.has_section(section_name):
+            return None
+
+        options = {}
+        for option_name in option_names:
+            if not self.__parser.has_option(section_name, option_name):
+                die(f"Section {section_name} has no option {option_name}")
+            options[option_name] = self.__parser.get(section_name, option_name)
+
+        return create(options)
+
+    def __require(self, section: Optional[T], section_name: str) -> T:
+        if section is None:
+            die(f"Could not find section {section_name} in {self.path}")
+        return section
+
+    @property
+    def givenergy(self) -> GivEnergyConfig:
+        return self.__require(self.__givenergy, GivEnergyConfig.SECTION)
+
+    @property
+    def mysql(self) -> MySQLConfig:
+        return self.__require(self.__mysql, MySQLConfig.SECTION)
+
+    @property
+    def octopus_energy(self) -> OctopusEnergyConfig:
+        return self.__require(self.__octopus_energy, OctopusEnergyConfig.SECTION)
+
+    @property
+    def solcast(self) -> SolcastConfig:
+        return self.__require(self.__solcast, SolcastConfig.SECTION)
+
+
+loaded_config: Optional[Config] = None
+loaded_config_lock = threading.Lock()
+
+
+def get_config() -> Config:
+    """
+    Return the configuration from solarroi.conf_file, only parsing the file
+    again if it has changed since it was last loaded.
+    """
+    global loaded_config
+
+    path = pathlib.Path(solarroi.conf_file)
+    check_file(path)
+    with loaded_config_lock:
+        if (
+            loaded_config is None or
+            loaded_config.path != path or
+            loaded_config.mtime != path.stat().st_mtime
+        ):
+            loaded_config = Config(path)
+            logging.debug("get_config: loaded %s", loaded_config)
+        return loaded_config
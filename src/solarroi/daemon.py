@@ -0,0 +1,90 @@
+"""
+Scheduler for the solar-roi daemon.
+
+The daemon runs ROI updates and forecast refreshes in one long running
+process so that the config, database engine, HTTP connection pools and
+Octopus Energy account stay loaded between runs. Runs are made one at a
+time so that they never overlap; a run that overruns its interval delays
+the next run instead of starting a second one.
+"""
+
+import logging
+import random
+import threading
+import time
+
+from typing import Callable, List, Optional
+
+
+class Schedule:
+
+    def __init__(self, name: str, interval: float, jitter: float, run: Callable[[], None]):
+        self.name = name
+        self.interval = interval
+        self.jitter = jitter
+        self.run = run
+        self.runs = 0
+        self.failures = 0
+        # time the run is due without jitter, so that jitter does not accumulate
+        self.due = time.time()
+        self.next_run = self.due + random.uniform(0, jitter)
+
+    def __repr__(self) -> str:
+        return f"<name: {self.name}, interval: {self.interval}, jitter: {self.jitter}, next_run: {self.next_run}>"
+
+    def schedule_next(self, now: float):
+        """
+        Set the time of the next run after a run finished at now.
+        """
+        self.due += self.interval
+        # an overdue run is made once, as soon as possible
+        missed = int((now - self.due) // self.interval)
+        if missed > 0:
+            logging.warning("%s: skipping %d runs that are overdue", self.name, missed)
+            self.due += missed * self.interval
+        self.next_run = self.due + random.uniform(0, self.jitter)
+
+
+def run_schedule(schedule: Schedule):
+    """
+    Make one run of the given schedule, logging any failure so that the
+    daemon carries on.
+    """
+    logging.info("%s: starting run", schedule.name)
+    start = time.perf_counter()
+    try:
+        schedule.run()
+    except SystemExit as e:
+        # die() has already logged the reason
+        if e.code:
+            schedule.failures += 1
+            logging.error("%s: run failed", schedule.name)
+    except Exception:
+        schedule.failures += 1
+        logging.exception("%s: run failed", schedule.name)
+    schedule.runs += 1
+    logging.info("%s: run finished in %.1f seconds", schedule.name, time.perf_counter() - start)
+
+
+def run_daemon(schedules: List[Schedule], stop: threading.Event, max_runs: Optional[int] = None):
+    """
+    Run the given schedules until stop is set (or max_runs runs have been
+    made), waiting for each schedule's next run time.
+    """
+    runs = 0
+    while not stop.is_set() and (max_runs is None or runs < max_runs):
+        schedule = min(schedules, key=lambda s: s.next_run)
+        delay = schedule.next_run - time.time()
+        if delay > 0:
+            logging.debug("run_daemon: next run is %s in %.0f seconds", schedule.name, delay)
+            if stop.wait(delay):
+                break
+
+        run_schedule(schedule)
+        schedule.schedule_next(time.time())
+        runs += 1
+
+    logging.info(
+        "Daemon stopping: %s",
+        ", ".join(f"{s.name}: {s.runs} runs, {s.failures} failed" for s in schedules)
+    )
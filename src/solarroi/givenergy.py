@@ -1,29 +1,27 @@
+import concurrent.futures
 import datetime
+import itertools
 import logging
-import requests
 
 from enum import Enum
-from typing import Any, Dict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 
-from solarroi.common import get_config_opion, die
+import numpy as np
+
+from solarroi.cache import get_cache, get_cache_chunks
+from solarroi.client import ApiClient, get_api_client
+from solarroi.common import die, get_windows, parse_local_datetime
+from solarroi.config import Config
+from solarroi.grid import HalfHourSeries
 
 logging.getLogger("requests").setLevel(logging.WARNING)
 logging.getLogger("urllib3").setLevel(logging.WARNING)
 
 BASE_URL = "https://api.givenergy.cloud/v1"
-CONFIG_SECTION = "GivEnergy"
-
-
-class ConsumptionPeriod:
-
-    def __init__(self, valid_from: datetime.datetime, valid_to: datetime.datetime, consumption: float):
-        self.valid_from = valid_from.astimezone(datetime.timezone.utc)
-        self.valid_to = valid_to.astimezone(datetime.timezone.utc)
-        self.consumption = consumption
-
-    def __repr__(self) -> str:
-        return f"<valid_from {self.valid_from.isoformat()}, " + \
-            f"valid_to: {self.valid_to.isoformat()}, consumption: {self.consumption}>"
+# number of days requested from the energy-flows end point at a time
+ENERGY_FLOWS_WINDOW_DAYS = 31
+# only the last data point of a day is needed, so request the smallest pages
+DATA_POINTS_PAGE_SIZE = 1
 
 
 class GroupingType(Enum):
@@ -49,136 +47,230 @@ def check_response(data: Dict[str, str]):
         die(data["message"])
 
 
-def get_api_key() -> str:
-    return get_config_opion(CONFIG_SECTION, "api_key")
+def create_api_client(config: Config) -> ApiClient:
+    return ApiClient(
+        config.http,
+        headers={
+            "Authorization": f"Bearer {config.givenergy.api_key}",
+            "Content-Type": "application/json",
+            "Accept": "application/json"
+        },
+        rate_limit=config.givenergy.rate_limit
+    )
+
+
+def load_energy_flows(
+    config: Config, url: str, params: Dict[str, Any], cacheable: bool = True
+) -> List[Dict[str, Any]]:
+    """
+    Load the energy flows for the range in the given parameters and return
+    the data points in the order returned by the API. The response is only
+    cached if cacheable is True.
+    """
+    cache = get_cache() if cacheable else None
+    data = None
+    if cache is not None:
+        data = cache.get("POST", url, params)
+
+    if data is None:
+        response = get_api_client(BASE_URL, lambda: create_api_client(config)).request(
+            'POST', url, json=params
+        )
+
+        if response.status_code != 200:
+            die(f"Unable to load {url}, error code: {response.status_code}")
+
+        data = response.json()
+        check_response(data)
+
+        if cache is not None:
+            cache.put("POST", url, params, data, datetime.date.fromisoformat(params["end_time"]))
 
+    if "message" in data and "Unauthenticated" in data["message"]:
+        raise RuntimeError("Unable to access GivEnergy API: Unauthenticated")
 
-def get_energy_consumption_by_day(start_date: str, end_date: str):
-    api_key = get_api_key()
-    inverter_serial = get_inverter_serial()
-
-    home_consumption_types = [
-        EnergyType.BATTERY_TO_HOME.value,
-        EnergyType.GRID_TO_HOME.value,
-        EnergyType.PV_TO_HOME.value
-    ]
-
-    grid_import_types = [
-        EnergyType.GRID_TO_BATTERY.value,
-        EnergyType.GRID_TO_HOME.value
-    ]
+    # start times are local so they repeat when the clocks go back, use the
+    # order of the data points instead
+    return list(data["data"].values())
 
-    types_array = home_consumption_types + grid_import_types
 
-    url = f"{BASE_URL}/inverter/{inverter_serial}/energy-flows"
+HOME_CONSUMPTION_TYPES = [
+    EnergyType.BATTERY_TO_HOME.value,
+    EnergyType.GRID_TO_HOME.value,
+    EnergyType.PV_TO_HOME.value
+]
 
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json",
-        "Accept": "application/json"
-    }
+GRID_IMPORT_TYPES = [
+    EnergyType.GRID_TO_BATTERY.value,
+    EnergyType.GRID_TO_HOME.value
+]
 
-    params = {
-        "start_time": start_date,
-        "end_time": end_date,
-        "grouping": GroupingType.HALF_HOUR.value,
-        "types": types_array
-    }
 
-    response = requests.request('POST', url, headers=headers, json=params)
+def get_energy_consumption_by_day(config: Config, start_date: str, end_date: str, max_workers: int = 1):
+    inverter_serial = config.givenergy.inverter_serial
 
-    if response.status_code != 200:
-        die(f"Unable to load {url}, error code: {response.status_code}")
+    types_array = HOME_CONSUMPTION_TYPES + GRID_IMPORT_TYPES
 
-    data = response.json()
-    check_response(data)
+    url = f"{BASE_URL}/inverter/{inverter_serial}/energy-flows"
 
+    # long ranges are requested in windows, within the chunks that can be
+    # cached, which are loaded concurrently
+    windows = [
+        (window_start, window_end, cacheable)
+        for chunk_start, chunk_end, cacheable in get_cache_chunks(
+            datetime.date.fromisoformat(start_date), datetime.date.fromisoformat(end_date)
+        )
+        for window_start, window_end in get_windows(chunk_start, chunk_end, ENERGY_FLOWS_WINDOW_DAYS)
+    ]
+    logging.debug("get_energy_consumption_by_day: loading %d windows", len(windows))
+
+    def load_window(window: Tuple[datetime.date, datetime.date, bool]) -> List[Dict[str, Any]]:
+        params = {
+            "start_time": window[0].isoformat(),
+            "end_time": window[1].isoformat(),
+            "grouping": GroupingType.HALF_HOUR.value,
+            "types": types_array
+        }
+        return load_energy_flows(config, url, params, window[2])
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # map returns the windows in order so the data points stay in time order
+        windows_data = list(executor.map(load_window, windows))
+
+    results = parse_energy_flows(itertools.chain.from_iterable(windows_data))
+    # cached chunks can include days outside of the range
+    return {date: result for date, result in results.items() if start_date <= date <= end_date}
+
+
+def parse_energy_flows(data_points: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Sum the grid import and home consumption of the given half hourly
+    energy flows data points for each day.
+    """
     results: Dict[str, Any] = {}
+    # start times and consumption of each day's periods
+    day_readings: Dict[str, Tuple[List[float], List[float]]] = {}
+    start_time: Optional[datetime.datetime] = None
 
-    if "message" in data and "Unauthenticated" in data["message"]:
-        raise RuntimeError("Unable to access GivEnergy API: Unauthenticated")
-
-    for data_point in data["data"].values():
+    for data_point in data_points:
         date = data_point["start_time"][0:10]
         # sum up energy usage
         home_consumption = 0
         grid_import = 0
 
         for key, value in data_point["data"].items():
-            if int(key) in grid_import_types:
+            if int(key) in GRID_IMPORT_TYPES:
                 grid_import += value
-            if int(key) in home_consumption_types:
+            if int(key) in HOME_CONSUMPTION_TYPES:
                 home_consumption += value
 
         if date not in results:
             results[date] = {
                 "total_grid_import": grid_import,
-                "total_home_consumption": home_consumption,
-                "consumption_periods": [ConsumptionPeriod(
-                    datetime.datetime.fromisoformat(data_point["start_time"]),
-                    datetime.datetime.fromisoformat(data_point["end_time"]),
-                    home_consumption
-                )]
+                "total_home_consumption": home_consumption
             }
+            day_readings[date] = ([], [])
         else:
             results[date]["total_grid_import"] += grid_import
             results[date]["total_home_consumption"] += home_consumption
-            results[date]["consumption_periods"].append(
-                ConsumptionPeriod(
-                    datetime.datetime.fromisoformat(data_point["start_time"]),
-                    datetime.datetime.fromisoformat(data_point["end_time"]),
-                    home_consumption
-                )
-            )
+
+        # start times are local, so use the previous one to tell the repeated
+        # hour apart when the clocks go back
+        start_time = parse_local_datetime(data_point["start_time"], start_time)
+        day_readings[date][0].append(start_time.timestamp())
+        day_readings[date][1].append(home_consumption)
 
         results[date]["total_grid_import"] = round(results[date]["total_grid_import"], 2)
         results[date]["total_home_consumption"] = round(results[date]["total_home_consumption"], 2)
 
+    for date, (starts, values) in day_readings.items():
+        results[date]["consumption_periods"] = HalfHourSeries(np.array(starts), np.array(values))
+
     return results
 
 
-def get_meter_total_consumption(date: str):
+def get_meter_total_consumption(config: Config, date: str) -> float:
     logging.debug("Getting total consumption for %s", date)
     iso_date = f"{date}T23:59:00Z"
-    api_key = get_api_key()
-    inverter_serial = get_inverter_serial()
+    inverter_serial = config.givenergy.inverter_serial
     logging.debug("Fecthing data for inveter: %s", inverter_serial)
 
     url = f"{BASE_URL}/inverter/{inverter_serial}/data-points/{iso_date}"
 
-    # load first page
-    first_page_data = load_page(url, 1, api_key)
-    # work out the last page of data
+    end_date = datetime.date.fromisoformat(date)
+
+    # the total for a settled day does not change, so it is cached on its
+    # own rather than caching the pages it came from
+    cache = get_cache()
+    cache_params = {"total": "consumption"}
+    if cache is not None:
+        total = cache.get("GET", url, cache_params)
+        if total is not None:
+            return total
+
+    # load first page, which is small, to work out the last page of data
+    first_page_data = load_page(config, url, 1, page_size=DATA_POINTS_PAGE_SIZE)
     last_page = int(first_page_data["meta"]["last_page"])
-    last_page_data = load_page(url, last_page, api_key)
+    if last_page == 1:
+        last_page_data = first_page_data
+    else:
+        last_page_data = load_page(config, url, last_page, page_size=DATA_POINTS_PAGE_SIZE)
     last_data_point = last_page_data["data"][-1]
     last_data_point_time = last_data_point["time"]
 
     if not last_data_point["time"].startswith(date):
         die(f"Unexpected data point for {last_data_point_time}")
 
-    return last_data_point["today"]["consumption"]
-
-
-def get_inverter_serial() -> str:
-    return get_config_opion(CONFIG_SECTION, "inverter_serial")
-
-
-def load_page(url: str, page: int, api_key: str) -> Dict:
+    total = last_data_point["today"]["consumption"]
+    if cache is not None:
+        cache.put("GET", url, cache_params, total, end_date)
+    return total
+
+
+def get_meter_total_consumptions(config: Config, dates: List[str], max_workers: int = 1) -> Dict[str, float]:
+    """
+    Return the total consumption for each of the given dates, loading up
+    to max_workers dates at the same time.
+    """
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        totals = executor.map(lambda date: get_meter_total_consumption(config, date), dates)
+        return dict(zip(dates, totals))
+
+
+def load_page(
+    config: Config,
+    url: str,
+    page: int,
+    end_date: Optional[datetime.date] = None,
+    page_size: Optional[int] = None
+) -> Dict:
+    """
+    Load the given page of results. If end_date is given then the page
+    only contains data up to that date and may be served from, or saved
+    to, the response cache.
+    """
     params = {
         "page": page
     }
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json",
-        "Accept": "application/json"
-    }
+    if page_size is not None:
+        params["pageSize"] = page_size
+
+    cache = get_cache() if end_date is not None else None
+    if cache is not None:
+        cached_data = cache.get("GET", url, params)
+        if cached_data is not None:
+            return cached_data
 
-    response = requests.request("GET", url, headers=headers, params=params)
+    response = get_api_client(BASE_URL, lambda: create_api_client(config)).request(
+        "GET", url, params=params
+    )
 
     if response.status_code != 200:
-        die(f"Unable to load {url}, error code: {response.status}")
+        die(f"Unable to load {url}, error code: {response.status_code}")
 
     data = response.json()
     check_response(data)
+
+    if cache is not None and end_date is not None:
+        cache.put("GET", url, params, data, end_date)
     return data
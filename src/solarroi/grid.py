@@ -0,0 +1,128 @@
+"""
+Half hour grid used to line up consumption, prices and energy flows.
+
+The grid has one slot for every half hour of every local day in a date
+range, so most days have 48 slots and the days when the clocks change
+have 46 or 50. Values are held in NumPy arrays indexed by slot so that
+daily totals can be calculated without Python loops.
+
+Half hourly readings are held in a HalfHourSeries, which keeps the epoch
+start time and value of each reading in two arrays rather than as Python
+objects.
+"""
+
+import datetime
+import zoneinfo
+
+from typing import Iterable, Iterator, Optional, Tuple
+
+import numpy as np
+
+from solarroi.common import TIMEZONE
+
+SLOT_SECONDS = 1800
+
+
+class HalfHourSeries:
+    """
+    Half hourly readings held as arrays of epoch start times (seconds) and
+    float64 values, in ascending order of start time.
+    """
+
+    __slots__ = ("starts", "values")
+
+    def __init__(self, starts: Optional[np.ndarray] = None, values: Optional[np.ndarray] = None):
+        self.starts = np.zeros(0, dtype=np.int64) if starts is None else starts.astype(np.int64)
+        self.values = np.zeros(0) if values is None else values.astype(np.float64)
+        if len(self.starts) != len(self.values):
+            raise ValueError(f"{len(self.starts)} start times for {len(self.values)} values")
+
+    def __repr__(self) -> str:
+        if len(self) == 0:
+            return "<readings: 0>"
+        return f"<start: {self.get_datetime(0).isoformat()}, end: {self.get_datetime(-1).isoformat()}, " + \
+            f"readings: {len(self)}, total: {self.total()}>"
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def __iter__(self) -> Iterator[Tuple[datetime.datetime, float]]:
+        for start, value in zip(self.starts.tolist(), self.values.tolist()):
+            yield (datetime.datetime.fromtimestamp(start, datetime.timezone.utc), value)
+
+    def get_datetime(self, index: int) -> datetime.datetime:
+        return datetime.datetime.fromtimestamp(int(self.starts[index]), datetime.timezone.utc)
+
+    def get_range(self, start: datetime.datetime, end: datetime.datetime) -> "HalfHourSeries":
+        """
+        Return the readings that start from start up to, but not including, end.
+        """
+        first, last = np.searchsorted(self.starts, [start.timestamp(), end.timestamp()])
+        return HalfHourSeries(self.starts[first:last], self.values[first:last])
+
+    def get_value(self, dt: datetime.datetime) -> Optional[float]:
+        """
+        Return the value of the reading that starts at the given time.
+        """
+        index = int(np.searchsorted(self.starts, dt.timestamp()))
+        if index < len(self.starts) and self.starts[index] == int(dt.timestamp()):
+            return float(self.values[index])
+        return None
+
+    def total(self) -> float:
+        return float(self.values.sum())
+
+
+class HalfHourGrid:
+
+    def __init__(self, start_date: datetime.date, end_date: datetime.date, timezone: str = TIMEZONE):
+        tz = zoneinfo.ZoneInfo(timezone)
+        days = (end_date - start_date).days + 1
+        self.dates = [start_date + datetime.timedelta(days=i) for i in range(days)]
+        midnights = np.array([
+            datetime.datetime.combine(d, datetime.time(), tzinfo=tz).timestamp()
+            for d in self.dates + [end_date + datetime.timedelta(days=1)]
+        ], dtype=np.int64)
+        self.start = int(midnights[0])
+        # index of the first slot of each day, plus the end of the grid
+        self.day_offsets = (midnights - self.start) // SLOT_SECONDS
+        self.size = int(self.day_offsets[-1])
+        self.slot_starts = self.start + np.arange(self.size, dtype=np.int64) * SLOT_SECONDS
+
+    def __repr__(self) -> str:
+        return f"<start: {self.dates[0]}, end: {self.dates[-1]}, slots: {self.size}>"
+
+    def get_slots(self, timestamps: np.ndarray) -> np.ndarray:
+        """
+        Return the slot index for each of the given epoch timestamps, or -1
+        for timestamps that are outside of the grid.
+        """
+        slots = (timestamps.astype(np.int64) - self.start) // SLOT_SECONDS
+        slots[(slots < 0) | (slots >= self.size)] = -1
+        return slots
+
+    def from_series(self, series: HalfHourSeries) -> np.ndarray:
+        """
+        Add each reading in the series to the slot that contains its start time.
+        """
+        grid = np.zeros(self.size)
+        slots = self.get_slots(series.starts)
+        valid = slots >= 0
+        np.add.at(grid, slots[valid], series.values[valid])
+        return grid
+
+    def sum_by_day(self, values: np.ndarray) -> np.ndarray:
+        return np.add.reduceat(values, self.day_offsets[:-1])
+
+
+def concatenate(series_list: Iterable[HalfHourSeries]) -> HalfHourSeries:
+    """
+    Join the given series, which must be in ascending order and not overlap.
+    """
+    series_list = list(series_list)
+    if len(series_list) == 0:
+        return HalfHourSeries()
+    return HalfHourSeries(
+        np.concatenate([series.starts for series in series_list]),
+        np.concatenate([series.values for series in series_list])
+    )
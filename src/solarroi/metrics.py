@@ -0,0 +1,327 @@
+"""
+Request, database and phase metrics for a run.
+
+The HTTP client, response cache and database layers record what they do
+against the endpoint (or table) it was for, and the ROI code times the
+fetch, compute and write phases. At the end of a run the metrics can be
+written as JSON and as a Prometheus textfile collector file.
+"""
+
+import contextlib
+import json
+import pathlib
+import re
+import threading
+import time
+import urllib.parse
+
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# upper bounds of the latency histogram buckets in seconds
+LATENCY_BUCKETS = [0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0]
+
+# endpoint templates for the API paths that Solar-ROI requests
+ENDPOINT_PATTERNS: List[Tuple[re.Pattern, str]] = [
+    (re.compile(r"/accounts/[^/]+/?$"), "octopus_energy.accounts"),
+    (re.compile(r"/standard-unit-rates/?$"), "octopus_energy.standard_unit_rates"),
+    (re.compile(r"/consumption/?$"), "octopus_energy.consumption"),
+    (re.compile(r"/inverter/[^/]+/energy-flows$"), "givenergy.energy_flows"),
+    (re.compile(r"/inverter/[^/]+/data-points/[^/]+$"), "givenergy.data_points"),
+    (re.compile(r"/rooftop_sites/[^/]+/forecasts$"), "solcast.forecasts")
+]
+
+
+class Histogram:
+
+    def __init__(self, buckets: List[float]):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def __repr__(self) -> str:
+        return f"<count: {self.count}, sum: {self.sum}>"
+
+    def observe(self, value: float):
+        self.count += 1
+        self.sum += value
+        for index, bucket in enumerate(self.buckets):
+            if value <= bucket:
+                self.counts[index] += 1
+                break
+
+    def get_cumulative_counts(self) -> List[int]:
+        """
+        Return the number of values less than or equal to each bucket.
+        """
+        cumulative = []
+        total = 0
+        for count in self.counts:
+            total += count
+            cumulative.append(total)
+        return cumulative
+
+    def to_dict(self) -> Dict:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "buckets": {str(bucket): count for bucket, count in zip(self.buckets, self.get_cumulative_counts())}
+        }
+
+
+class EndpointMetrics:
+
+    def __init__(self):
+        self.requests: Dict[str, int] = {}
+        self.retries = 0
+        self.bytes_received = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.latency = Histogram(LATENCY_BUCKETS)
+
+    def __repr__(self) -> str:
+        return f"<requests: {self.requests}, retries: {self.retries}, cache_hits: {self.cache_hits}>"
+
+    def to_dict(self) -> Dict:
+        return {
+            "requests": self.requests,
+            "retries": self.retries,
+            "bytes_received": self.bytes_received,
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses,
+            "latency": self.latency.to_dict()
+        }
+
+
+class TableMetrics:
+
+    def __init__(self):
+        self.statements = 0
+        self.rows = 0
+        self.seconds = 0.0
+
+    def __repr__(self) -> str:
+        return f"<statements: {self.statements}, rows: {self.rows}, seconds: {self.seconds}>"
+
+    def to_dict(self) -> Dict:
+        return {"statements": self.statements, "rows": self.rows, "seconds": self.seconds}
+
+
+class PhaseListener:
+    """
+    Base class for objects that are told when each phase starts and finishes.
+    """
+
+    def phase_started(self, name: str):
+        pass
+
+    def phase_finished(self, name: str):
+        pass
+
+
+class Metrics:
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.started = time.time()
+        self.endpoints: Dict[str, EndpointMetrics] = {}
+        self.tables: Dict[str, TableMetrics] = {}
+        # total seconds spent in each phase, summed over threads
+        self.phases: Dict[str, float] = {}
+        self.phase_listeners: List[PhaseListener] = []
+
+    def __repr__(self) -> str:
+        return f"<endpoints: {len(self.endpoints)}, tables: {len(self.tables)}, phases: {self.phases}>"
+
+    def __get_endpoint(self, endpoint: str) -> EndpointMetrics:
+        if endpoint not in self.endpoints:
+            self.endpoints[endpoint] = EndpointMetrics()
+        return self.endpoints[endpoint]
+
+    def record_request(self, url: str, status: str, seconds: float, bytes_received: int):
+        with self.__lock:
+            endpoint_metrics = self.__get_endpoint(get_endpoint(url))
+            endpoint_metrics.requests[status] = endpoint_metrics.requests.get(status, 0) + 1
+            endpoint_metrics.latency.observe(seconds)
+            endpoint_metrics.bytes_received += bytes_received
+
+    def record_retry(self, url: str):
+        with self.__lock:
+            self.__get_endpoint(get_endpoint(url)).retries += 1
+
+    def record_cache(self, url: str, hit: bool):
+        with self.__lock:
+            endpoint_metrics = self.__get_endpoint(get_endpoint(url))
+            if hit:
+                endpoint_metrics.cache_hits += 1
+            else:
+                endpoint_metrics.cache_misses += 1
+
+    def record_statement(self, table: str, rows: int, seconds: float):
+        with self.__lock:
+            if table not in self.tables:
+                self.tables[table] = TableMetrics()
+            self.tables[table].statements += 1
+            self.tables[table].rows += rows
+            self.tables[table].seconds += seconds
+
+    def add_phase_time(self, phase: str, seconds: float):
+        with self.__lock:
+            self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    @contextlib.contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """
+        Add the time spent in the with block to the given phase.
+        """
+        for listener in self.phase_listeners:
+            listener.phase_started(name)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_phase_time(name, time.perf_counter() - start)
+            for listener in self.phase_listeners:
+                listener.phase_finished(name)
+
+    def to_dict(self) -> Dict:
+        with self.__lock:
+            return {
+                "started": self.started,
+                "duration": time.time() - self.started,
+                "endpoints": {name: endpoint.to_dict() for name, endpoint in sorted(self.endpoints.items())},
+                "tables": {name: table.to_dict() for name, table in sorted(self.tables.items())},
+                "phases": dict(sorted(self.phases.items()))
+            }
+
+    def to_prometheus(self, command: str) -> str:
+        """
+        Return the metrics in the Prometheus text exposition format.
+        """
+        data = self.to_dict()
+        lines: List[str] = []
+
+        def add(name: str, metric_type: str, help_text: str, samples: List[Tuple[Dict[str, str], float]]):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            for labels, value in samples:
+                all_labels = {"command": command, **labels}
+                label_text = ",".join(f'{key}="{value}"' for key, value in all_labels.items())
+                lines.append(f"{name}{{{label_text}}} {value}")
+
+        endpoints = data["endpoints"].items()
+        add(
+            "solarroi_http_requests_total", "counter", "HTTP requests made by status.",
+            [
+                ({"endpoint": name, "status": status}, count)
+                for name, endpoint in endpoints
+                for status, count in sorted(endpoint["requests"].items())
+            ]
+        )
+
+        latency_samples: List[Tuple[Dict[str, str], float]] = []
+        for name, endpoint in endpoints:
+            latency = endpoint["latency"]
+            for bucket, count in latency["buckets"].items():
+                latency_samples.append(({"endpoint": name, "le": bucket}, count))
+            latency_samples.append(({"endpoint": name, "le": "+Inf"}, latency["count"]))
+        lines.append("# HELP solarroi_http_request_duration_seconds HTTP request latency.")
+        lines.append("# TYPE solarroi_http_request_duration_seconds histogram")
+        for labels, value in latency_samples:
+            label_text = ",".join(f'{key}="{value}"' for key, value in {"command": command, **labels}.items())
+            lines.append(f"solarroi_http_request_duration_seconds_bucket{{{label_text}}} {value}")
+        for name, endpoint in endpoints:
+            label_text = f'command="{command}",endpoint="{name}"'
+            lines.append(f"solarroi_http_request_duration_seconds_sum{{{label_text}}} {endpoint['latency']['sum']}")
+            lines.append(
+                f"solarroi_http_request_duration_seconds_count{{{label_text}}} {endpoint['latency']['count']}"
+            )
+
+        for field, metric_type, help_text in [
+            ("bytes_received", "counter", "Bytes received in HTTP responses."),
+            ("retries", "counter", "HTTP requests that were retried."),
+            ("cache_hits", "counter", "Responses served from the cache."),
+            ("cache_misses", "counter", "Responses not found in the cache.")
+        ]:
+            add(
+                f"solarroi_http_{field}_total", metric_type, help_text,
+                [({"endpoint": name}, endpoint[field]) for name, endpoint in endpoints]
+            )
+
+        tables = data["tables"].items()
+        add(
+            "solarroi_db_statements_total", "counter", "Database statements executed.",
+            [({"table": name}, table["statements"]) for name, table in tables]
+        )
+        add(
+            "solarroi_db_rows_total", "counter", "Rows written to the database.",
+            [({"table": name}, table["rows"]) for name, table in tables]
+        )
+        add(
+            "solarroi_db_duration_seconds_total", "counter", "Time spent executing database statements.",
+            [({"table": name}, table["seconds"]) for name, table in tables]
+        )
+        add(
+            "solarroi_phase_duration_seconds", "gauge", "Time spent in each phase of the run.",
+            [({"phase": name}, seconds) for name, seconds in data["phases"].items()]
+        )
+        add("solarroi_run_duration_seconds", "gauge", "Duration of the run.", [({}, data["duration"])])
+        add("solarroi_run_timestamp_seconds", "gauge", "Start time of the run.", [({}, data["started"])])
+
+        return "\n".join(lines) + "\n"
+
+
+def get_endpoint(url: str) -> str:
+    """
+    Return the endpoint template name for the given URL.
+    """
+    parts = urllib.parse.urlsplit(url)
+    for pattern, name in ENDPOINT_PATTERNS:
+        if pattern.search(parts.path):
+            return name
+    return parts.netloc + parts.path
+
+
+def write_file(path: pathlib.Path, text: str):
+    """
+    Write the file in one step, so that a collector never reads part of it.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    with open(tmp_path, "w") as f:
+        f.write(text)
+    tmp_path.replace(path)
+
+
+metrics = Metrics()
+
+
+def get_metrics() -> Metrics:
+    return metrics
+
+
+def reset_metrics() -> Metrics:
+    global metrics
+
+    metrics = Metrics()
+    return metrics
+
+
+def get_command_path(path: pathlib.Path, command: str) -> pathlib.Path:
+    """
+    Return the given path with the command added to the file name, e.g.
+    metrics-roi.json for metrics.json.
+    """
+    return path.with_name(f"{path.stem}-{command}{path.suffix}")
+
+
+def write_metrics(command: str, json_path: Optional[pathlib.Path], prometheus_path: Optional[pathlib.Path]):
+    """
+    Write the metrics of the current run to the given paths, with the
+    command added to the file names so that each command keeps its own.
+    """
+    if json_path is not None:
+        text = json.dumps({"command": command, **metrics.to_dict()}, indent=2)
+        write_file(get_command_path(json_path, command), text)
+    if prometheus_path is not None:
+        write_file(get_command_path(prometheus_path, command), metrics.to_prometheus(command))
@@ -1,16 +1,31 @@
+import bisect
+import concurrent.futures
 import datetime
 import logging
-import requests
+import threading
+import time
 
-from typing import Any, Dict, List, Optional
-from solarroi.common import get_config_opion, get_datetime_from_date
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+from solarroi.cache import get_cache, get_cache_chunks
+from solarroi.client import ApiClient, get_api_client
+from solarroi.common import die, get_datetime_from_date, get_local_datetime_from_date
+from solarroi.config import Config
+from solarroi.grid import HalfHourSeries
 
 BASE_URL = "https://api.octopus.energy/v1"
-CONFIG_SECTION = "OctopusEnergy"
+# maximum page size allowed by the consumption end point
+CONSUMPTION_PAGE_SIZE = 25000
+# maximum page size allowed by the standard-unit-rates end point
+UNIT_RATES_PAGE_SIZE = 1500
 
 
 class TarrifPeriod:
 
+    __slots__ = ("valid_from", "valid_to", "price")
+
     def __init__(self, valid_from: datetime.datetime, valid_to: datetime.datetime, price: float):
         self.valid_from = valid_from
         self.valid_to = valid_to
@@ -23,6 +38,133 @@ class TarrifPeriod:
         return dt >= self.valid_from and dt <= self.valid_to
 
 
+class TariffTimeline:
+    """
+    A meter's agreements and price periods sorted by start time so that
+    they can be looked up with a binary search.
+
+    Agreements are expected not to overlap. The valid_to of the last
+    agreement is ignored because the Octopus Energy API sometimes returns
+    the wrong value. Where price periods start at the same time the first
+    one added is used, so rates for other payment methods should be removed
+    first (see get_tariff_periods_by_day).
+    """
+
+    def __init__(self, agreements: List[Dict]):
+        self.__agreements = sorted(agreements, key=lambda agreement: parse_datetime(agreement["valid_from"]))
+        self.__agreement_starts = [parse_datetime(agreement["valid_from"]) for agreement in self.__agreements]
+        self.__agreement_ends: List[Optional[datetime.datetime]] = [
+            parse_datetime(agreement["valid_to"]) if agreement["valid_to"] else None
+            for agreement in self.__agreements
+        ]
+        if len(self.__agreement_ends) > 0:
+            # hack for Ocotpus Energy bug where valid_to is wrong
+            self.__agreement_ends[-1] = None
+
+        self.__periods: List[TarrifPeriod] = []
+        self.__period_starts: List[datetime.datetime] = []
+        self.__price_arrays: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]] = None
+
+    def __repr__(self) -> str:
+        return f"<agreements: {len(self.__agreements)}, periods: {len(self.__periods)}>"
+
+    def get_agreement(self, date: datetime.date) -> Optional[Dict]:
+        """
+        Return the agreement that is active at the start of the given day.
+        """
+        dt = get_datetime_from_date(date)
+        index = bisect.bisect_right(self.__agreement_starts, dt) - 1
+        if index < 0:
+            return None
+        valid_to = self.__agreement_ends[index]
+        if valid_to is not None and dt >= valid_to:
+            return None
+        return self.__agreements[index]
+
+    def get_agreements(
+        self, start_date: datetime.date, end_date: datetime.date
+    ) -> List[Tuple[Dict, datetime.date, datetime.date]]:
+        """
+        Return each agreement that is active during the given range along
+        with the first and last days of the range that it applies to.
+        """
+        start = get_datetime_from_date(start_date)
+        end = get_datetime_from_date(end_date)
+        first = max(bisect.bisect_right(self.__agreement_starts, start) - 1, 0)
+        last = bisect.bisect_right(self.__agreement_starts, end)
+
+        results = []
+        for index in range(first, last):
+            valid_from = self.__agreement_starts[index]
+            valid_to = self.__agreement_ends[index]
+            # first and last days that start within the agreement
+            first_date = valid_from.astimezone(datetime.timezone.utc).date()
+            if get_datetime_from_date(first_date) < valid_from:
+                first_date += datetime.timedelta(days=1)
+            if valid_to is None:
+                last_date = end_date
+            else:
+                last_date = valid_to.astimezone(datetime.timezone.utc).date()
+                if get_datetime_from_date(last_date) == valid_to:
+                    last_date -= datetime.timedelta(days=1)
+
+            first_date = max(first_date, start_date)
+            last_date = min(last_date, end_date)
+            if first_date <= last_date:
+                results.append((self.__agreements[index], first_date, last_date))
+        return results
+
+    def add_periods(self, periods: Iterable[TarrifPeriod]):
+        # the sort is stable so earlier periods win when the start times match
+        all_periods = sorted(self.__periods + list(periods), key=lambda period: period.valid_from)
+        self.__periods = []
+        for period in all_periods:
+            if len(self.__periods) == 0 or self.__periods[-1].valid_from != period.valid_from:
+                self.__periods.append(period)
+        self.__period_starts = [period.valid_from for period in self.__periods]
+        self.__price_arrays = None
+
+    def get_period(self, dt: datetime.datetime) -> Optional[TarrifPeriod]:
+        """
+        Return the price period that is active at the given time.
+        """
+        index = bisect.bisect_right(self.__period_starts, dt) - 1
+        if index < 0 or not self.__periods[index].is_active(dt):
+            return None
+        return self.__periods[index]
+
+    def get_periods(self, start: datetime.datetime, end: datetime.datetime) -> List[TarrifPeriod]:
+        """
+        Return the price periods that are active at any time from start to end.
+        """
+        first = max(bisect.bisect_right(self.__period_starts, start) - 1, 0)
+        last = bisect.bisect_right(self.__period_starts, end)
+        return [period for period in self.__periods[first:last] if period.valid_to >= start]
+
+    def get_prices(self, timestamps: np.ndarray) -> np.ndarray:
+        """
+        Return the price that is active at each of the given epoch
+        timestamps, or NaN where there is no price.
+        """
+        prices = np.full(len(timestamps), np.nan)
+        if len(self.__periods) == 0:
+            return prices
+
+        if self.__price_arrays is None:
+            self.__price_arrays = (
+                np.array([period.valid_from.timestamp() for period in self.__periods]),
+                np.array([period.valid_to.timestamp() for period in self.__periods]),
+                np.array([period.price for period in self.__periods])
+            )
+        starts, ends, values = self.__price_arrays
+
+        index = np.searchsorted(starts, timestamps, side="right") - 1
+        active = index >= 0
+        active[active] = timestamps[active] <= ends[index[active]]
+        prices[active] = values[index[active]]
+        return prices
+
+
 class Meter:
 
     def __init__(
@@ -37,17 +179,37 @@ class Meter:
         return f"<mpan: {self.mpan}, serial: {self.serial}, export: {self.is_export}, agreements: {self.agreements} >"
 
 
-def get_account() -> str:
-    return get_config_opion(CONFIG_SECTION, "account")
+# meters of each account URL and the time they were fetched
+tariff_histories: Dict[str, Tuple[float, Tuple[Optional[Meter], Optional[Meter]]]] = {}
+tariff_histories_lock = threading.Lock()
+
 
+def parse_datetime(value: str) -> datetime.datetime:
+    return datetime.datetime.fromisoformat(value)
 
-def get_api_key() -> str:
-    return get_config_opion(CONFIG_SECTION, "api_key")
+
+def create_api_client(config: Config) -> ApiClient:
+    return ApiClient(
+        config.http,
+        auth=(config.octopus_energy.api_key, ""),
+        rate_limit=config.octopus_energy.rate_limit
+    )
 
 
-def get_tariff_history() -> tuple[Optional[Meter], Optional[Meter]]:
-    url = f"{BASE_URL}/accounts/{get_account()}/"
-    response = load_url(url)
+def get_tariff_history(config: Config, max_age: float = 0) -> Tuple[Optional[Meter], Optional[Meter]]:
+    """
+    Return the import and export meters of the account. If max_age is
+    given, meters fetched less than max_age seconds ago are reused.
+    """
+    url = f"{BASE_URL}/accounts/{config.octopus_energy.account}/"
+    with tariff_histories_lock:
+        if url in tariff_histories:
+            fetched, meters = tariff_histories[url]
+            if time.time() - fetched < max_age:
+                logging.debug("get_tariff_history: reusing account fetched at %s", fetched)
+                return meters
+
+    response = load_url(config, url)
     import_meter = None
     export_meter = None
     for meter_point in response["properties"][0]["electricity_meter_points"]:
@@ -65,267 +227,286 @@ def get_tariff_history() -> tuple[Optional[Meter], Optional[Meter]]:
                 meter_point["meters"][0]["serial_number"],
                 meter_point["agreements"]
             )
+    with tariff_histories_lock:
+        tariff_histories[url] = (time.time(), (import_meter, export_meter))
     return (import_meter, export_meter)
 
 
-def load_url(url: str, params: Optional[Dict] = None) -> Any:
+def load_url(config: Config, url: str, params: Optional[Dict] = None, end_date: Optional[datetime.date] = None) -> Any:
+    """
+    Load the given URL. If end_date is given then the response only
+    contains data up to that date and may be served from, or saved to,
+    the response cache.
+    """
     logging.debug("load_url: %s", url)
-    response = requests.request(
-        "GET", url, auth=(get_api_key(), ""), params=params
+    cache = get_cache() if end_date is not None else None
+    if cache is not None:
+        data = cache.get("GET", url, params)
+        if data is not None:
+            return data
+
+    response = get_api_client(BASE_URL, lambda: create_api_client(config)).request(
+        "GET", url, params=params
     )
-    return response.json()
 
+    if response.status_code != 200:
+        die(f"Unable to load {url}, error code: {response.status_code}")
+
+    data = response.json()
+
+    if cache is not None and end_date is not None:
+        cache.put("GET", url, params, data, end_date)
+    return data
+
+
+def load_results(
+    config: Config, url: str, params: Optional[Dict] = None, end_date: Optional[datetime.date] = None
+) -> List[Any]:
+    """
+    Load the results from every page of the given URL by following the
+    "next" links returned by the API.
+    """
+    results: List[Any] = []
+    next_url: Optional[str] = url
+    while next_url is not None:
+        data = load_url(config, next_url, params, end_date)
+        results += data["results"]
+        next_url = data.get("next")
+        # the next link already contains the query string
+        params = None
+    logging.debug("load_results: %d results from %s", len(results), url)
+    return results
+
+
+def get_consumption(
+    config: Config, meter: Meter, start_date: datetime.date, end_date: datetime.date
+) -> List[Dict]:
+    """
+    Return the half hourly consumption readings for the given meter from
+    the start of start_date up to the end of end_date in local time. When
+    the cache is in use, readings for the rest of the settled months in
+    the range are included too.
+    """
+    results = []
+    for chunk_start, chunk_end, cacheable in get_cache_chunks(start_date, end_date):
+        results += load_results(
+            config,
+            f"{BASE_URL}/electricity-meter-points/{meter.mpan}/meters/{meter.serial}/consumption/",
+            {
+                "period_from": get_local_datetime_from_date(chunk_start).isoformat(),
+                "period_to": get_local_datetime_from_date(chunk_end + datetime.timedelta(days=1)).isoformat(),
+                "order_by": "period",
+                "page_size": CONSUMPTION_PAGE_SIZE
+            },
+            chunk_end if cacheable else None
+        )
+    return results
+
+
+def get_product_code(tariff_code: str) -> str:
+    parts = tariff_code.split("-")
+    return "-".join(parts[2:-1])
+
+
+def get_unit_rates(
+    config: Config, tariff_code: str, start_date: datetime.date, end_date: datetime.date
+) -> List[Dict]:
+    """
+    Return the unit rates for the given tariff from the start of start_date
+    up to the end of end_date. When the cache is in use, rates for the rest
+    of the settled months in the range are included too.
+    """
+    results = []
+    for chunk_start, chunk_end, cacheable in get_cache_chunks(start_date, end_date):
+        results += load_results(
+            config,
+            f"{BASE_URL}/products/{get_product_code(tariff_code)}/electricity-tariffs/{tariff_code}/" +
+            "standard-unit-rates/",
+            {
+                "period_from": get_datetime_from_date(chunk_start).isoformat(),
+                "period_to": get_datetime_from_date(chunk_end + datetime.timedelta(days=1)).isoformat(),
+                "page_size": UNIT_RATES_PAGE_SIZE
+            },
+            chunk_end if cacheable else None
+        )
+    return results
 
-def get_energy_cost_by_day(
-    meter: Meter, start_date_str: str, end_date_str: str
-) -> Dict:
-    start_date = datetime.date.fromisoformat(start_date_str)
-    end_date = datetime.date.fromisoformat(end_date_str)
-
-    logging.debug("get_energy_cost_by_day: %s to %s", start_date, end_date)
 
-    costs: Dict[str, float] = {}
-    consumption: Dict[str, float] = {}
+def get_direct_debit_rates(rates: List[Dict]) -> List[Dict]:
+    """
+    Fixed and variable tariffs have a DIRECT_DEBIT and a NON_DIRECT_DEBIT
+    rate for the same period. Return the given rates with only the
+    DIRECT_DEBIT rate where there is one for the same valid_from.
+    """
+    direct_debit_starts = {
+        rate["valid_from"] for rate in rates if rate.get("payment_method") == "DIRECT_DEBIT"
+    }
+    return [
+        rate for rate in rates
+        if rate.get("payment_method") == "DIRECT_DEBIT" or rate["valid_from"] not in direct_debit_starts
+    ]
+
+
+def get_tariff_periods_by_day(
+    rates: List[Dict], days: List[datetime.date]
+) -> Dict[str, List[TarrifPeriod]]:
+    """
+    Slice the given unit rates into a list of TarrifPeriod objects for each
+    of the given days (which must be in ascending order). Each period is
+    clipped to the day that it belongs to. The DIRECT_DEBIT rate is used
+    where there is one for each payment method.
+    """
+    parsed_rates = [
+        (
+            datetime.datetime.fromisoformat(rate["valid_from"]),
+            datetime.datetime.fromisoformat(rate["valid_to"]) if rate["valid_to"] else None,
+            rate["value_inc_vat"]
+        )
+        for rate in get_direct_debit_rates(rates)
+    ]
+    parsed_rates.sort(key=lambda rate: rate[0])
     prices: Dict[str, List[TarrifPeriod]] = {}
+    active: List[Any] = []
+    index = 0
+
+    for day in days:
+        day_start = get_datetime_from_date(day)
+        day_end = get_datetime_from_date(day, True)
+        next_day_start = get_datetime_from_date(day + datetime.timedelta(days=1))
+
+        # add the rates that start before the end of the day and drop the
+        # ones that have finished before it starts
+        while index < len(parsed_rates) and parsed_rates[index][0] < next_day_start:
+            active.append(parsed_rates[index])
+            index += 1
+        active = [rate for rate in active if rate[1] is None or rate[1] > day_start]
+
+        if len(active) == 0:
+            logging.error("No prices for: %s", day)
+
+        prices[day.isoformat()] = [
+            TarrifPeriod(
+                max(valid_from, day_start),
+                day_end if valid_to is None else min(valid_to - datetime.timedelta(seconds=1), day_end),
+                price
+            )
+            for valid_from, valid_to, price in active
+        ]
 
-    current_date = start_date
-    while current_date <= end_date:
-        logging.debug("get_energy_cost_by_day: day = %s", current_date)
-        next_date = current_date + datetime.timedelta(days=1)
-        prev_date = current_date - datetime.timedelta(days=1)
-        current_date_iso = current_date.isoformat()
-        next_date_iso = next_date.isoformat()
-        prev_date_iso = prev_date.isoformat()
-        current_date_time = get_datetime_from_date(current_date)
-        next_date_time = get_datetime_from_date(next_date)
-        tariff_code = None
-        cost = 0.0
-        agreements_total = len(meter.agreements)
-        # get tariff for this day
-        for index, agreement in enumerate(meter.agreements):
-            logging.debug("get_energy_cost_by_day: agreement = %s", agreement)
-            if (
-                (
-                    current_date_iso >= agreement["valid_from"] and (
-                        agreement["valid_to"] is None
-                        or current_date_iso < agreement["valid_to"]
-                    )
-                ) or (
-                    # hack for Ocotpus Energy bug where valid_to is wrong
-                    current_date_iso >= agreement["valid_from"] and
-                    index == agreements_total - 1
-                )
-            ):
-                tariff_code = agreement["tariff_code"]
-                parts = tariff_code.split("-")
-                product_code = "-".join(parts[2:-1])
-                logging.debug(
-                    "get_energy_cost_by_day: %s = %s, %s",
-                    current_date,
-                    product_code,
-                    tariff_code
-                )
-                break
+    return prices
 
-        if tariff_code is None:
-            logging.warning("Could not determine tariff code for %s for meter %s", current_date_iso, meter.mpan)
-            costs[current_date_iso] = 0.0
-            prices[current_date_iso] = [TarrifPeriod(current_date_time, next_date_time, 0.0)]
-        else:
-            prices[current_date_iso] = []
-
-            # get prices for the day
-            prices_for_day = load_url(
-                f"{BASE_URL}/products/{product_code}/electricity-tariffs/{tariff_code}/standard-unit-rates/",
-                {
-                    "period_from": current_date_iso,
-                    "period_to": next_date_iso
-                }
-            )
 
-            if prices_for_day["count"] < 1:
-                logging.error("No prices for: %s", current_date)
-            else:
-                for price_result in prices_for_day["results"]:
-                    url = f"{BASE_URL}/electricity-meter-points/{meter.mpan}/meters/{meter.serial}/consumption/"
-
-                    valid_from = ""
-                    valid_to = ""
-
-                    if (
-                        current_date_iso not in price_result["valid_from"] and
-                        prev_date_iso not in price_result["valid_from"]
-                    ):
-                        valid_from = get_datetime_from_date(current_date).isoformat()
-                    else:
-                        valid_from = price_result["valid_from"]
-
-                    if price_result["valid_to"] is None or current_date_iso not in price_result["valid_to"]:
-                        valid_to = get_datetime_from_date(current_date, True).isoformat()
-                    else:
-                        valid_to = (
-                            datetime.datetime.fromisoformat(price_result["valid_to"]) - datetime.timedelta(seconds=1)
-                        ).isoformat()
-
-                    prices[current_date_iso].append(
-                        TarrifPeriod(
-                            datetime.datetime.fromisoformat(valid_from),
-                            datetime.datetime.fromisoformat(valid_to),
-                            price_result["value_inc_vat"],
-                        )
-                    )
-
-                    params = {
-                        "period_from": valid_from,
-                        "period_to": valid_to,
-                        "group_by": "day",
-                        "order_by": "period"
-                    }
-
-                    consumption_data = load_url(
-                        url,
-                        params
-                    )
-
-                    if consumption_data["count"] > 0:
-                        for consumption_result in consumption_data["results"]:
-                            interval_start_dt = datetime.date.fromisoformat(consumption_result["interval_start"][0:10])
-                            if interval_start_dt == current_date:
-                                cost += consumption_result["consumption"] * price_result["value_inc_vat"]
-                                if current_date in consumption:
-                                    consumption[current_date_iso] += consumption_result["consumption"]
-                                else:
-                                    consumption[current_date_iso] = consumption_result["consumption"]
-
-        cost = round(cost / 100, 2)
-        costs[current_date_iso] = cost
+def get_consumption_by_day(
+    consumption_results: List[Dict], dates: Set[str]
+) -> Tuple[Dict[str, float], HalfHourSeries]:
+    """
+    Return the total consumption for each of the given ISO dates and the
+    half hourly readings of those days. Costs are worked out from the
+    readings and the timeline on the HalfHourGrid by calculate_roi.
+    """
+    consumption: Dict[str, float] = {}
+    reading_starts: List[float] = []
+    reading_values: List[float] = []
 
-        current_date += datetime.timedelta(days=1)
+    for consumption_result in consumption_results:
+        date = consumption_result["interval_start"][0:10]
+        if date not in dates:
+            continue
 
-    if meter.is_export:
-        result = {
-            "prices": prices,
-            "generation": consumption,
-            "income": costs
-        }
-    else:
-        result = {
-            "prices": prices,
-            "consumption": consumption,
-            "expenditure": costs
-        }
+        interval_start = datetime.datetime.fromisoformat(consumption_result["interval_start"])
+        reading_starts.append(interval_start.timestamp())
+        reading_values.append(consumption_result["consumption"])
 
-    logging.debug("get_energy_cost_by_day: returning %s", result)
+        if date in consumption:
+            consumption[date] += consumption_result["consumption"]
+        else:
+            consumption[date] = consumption_result["consumption"]
 
-    return result
+    return (consumption, HalfHourSeries(np.array(reading_starts), np.array(reading_values)))
 
 
-def get_energy_cost_by_day_orig(
-    meter: Meter, start_date_str: str, end_date_str: str
+def get_energy_cost_by_day(
+    config: Config, meter: Meter, start_date_str: str, end_date_str: str, max_workers: int = 1
 ) -> Dict:
+    """
+    Return the prices, consumption and half hourly readings for each day for
+    the given meter, and the price timeline to cost them with. Up to
+    max_workers requests to the API are made at the same time.
+    """
     start_date = datetime.date.fromisoformat(start_date_str)
     end_date = datetime.date.fromisoformat(end_date_str)
 
     logging.debug("get_energy_cost_by_day: %s to %s", start_date, end_date)
 
-    costs = {}
-    consumption = {}
-    prices = {}
-
-    logging.debug(
-        "get_energy_cost_by_day: meter (%s, %s, %s)",
-        meter.mpan,
-        meter.serial,
-        meter.is_export
-    )
-
-    url = f"{BASE_URL}/electricity-meter-points/{meter.mpan}/meters/{meter.serial}/consumption/"
-    params = {
-        "period_from": f"{start_date}T00:00:00Z",
-        "period_to": f"{end_date}T00:00:00Z",
-        "group_by": "day",
-        "order_by": "period"
-    }
-
-    while True:
-        consumption_data = load_url(
-            url,
-            params
-        )
-
-        for data_point in consumption_data["results"]:
-            date = data_point["interval_start"][0:10]
-            consumption[date] = data_point["consumption"]
+    dates: Set[str] = set()
+    prices: Dict[str, List[TarrifPeriod]] = {}
 
-        if "next" in consumption_data and consumption_data["next"] is not None:
-            url = consumption_data["next"]
-        else:
-            logging.debug("get_energy_cost_by_day: end of data points")
-            break
+    # prices are grouped by UTC day, so include the day before the range to
+    # cover the start of the first local day during British Summer Time
+    prices_start_date = start_date - datetime.timedelta(days=1)
+    timeline = TariffTimeline(meter.agreements)
+    agreement_days = timeline.get_agreements(prices_start_date, end_date)
 
-    current_date = start_date
+    # days without an agreement are given a price of zero
+    current_date = prices_start_date
     while current_date <= end_date:
-        logging.debug("get_energy_cost_by_day: day = %s", current_date)
-        next_date = current_date + datetime.timedelta(days=1)
         current_date_iso = current_date.isoformat()
-        next_date_iso = next_date.isoformat()
-        tariff_code = None
-        # get tariff for this day
-        for agreement in meter.agreements:
-            if current_date_iso >= agreement["valid_from"] and current_date_iso < agreement["valid_to"]:
-                tariff_code = agreement["tariff_code"]
-                parts = tariff_code.split("-")
-                product_code = "-".join(parts[2:-1])
-                logging.debug(
-                    "get_energy_cost_by_day: %s = %s, %s",
-                    current_date,
-                    product_code,
-                    tariff_code
+        if current_date >= start_date:
+            dates.add(current_date_iso)
+        if timeline.get_agreement(current_date) is None:
+            logging.warning("Could not determine tariff code for %s for meter %s", current_date_iso, meter.mpan)
+            prices[current_date_iso] = [
+                TarrifPeriod(
+                    get_datetime_from_date(current_date),
+                    get_datetime_from_date(current_date, True),
+                    0.0
                 )
-                break
+            ]
+        current_date += datetime.timedelta(days=1)
 
-        if tariff_code is None:
-            logging.warning("Could not determine tariff code for %s for meter %s", current_date_iso, meter.mpan)
-            costs[current_date_iso] = 0.0
-            prices[current_date_iso] = 0.0
-        else:
-            # get prices for the day
-            prices_for_day = load_url(
-                f"{BASE_URL}/products/{product_code}/electricity-tariffs/{tariff_code}/standard-unit-rates/",
-                {
-                    "period_from": current_date_iso,
-                    "period_to": next_date_iso
-                }
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        consumption_future = executor.submit(get_consumption, config, meter, start_date, end_date)
+
+        # get the prices for each agreement's overlap with the date range
+        rates_futures = []
+        for agreement, first_date, last_date in agreement_days:
+            tariff_code = agreement["tariff_code"]
+            logging.debug(
+                "get_energy_cost_by_day: %s to %s = %s",
+                first_date,
+                last_date,
+                tariff_code
             )
+            rates_futures.append(executor.submit(
+                get_unit_rates, config, tariff_code, first_date, last_date
+            ))
 
-            if prices_for_day["count"] == 1:
-                # convert from pence to pounds
-                prices[current_date_iso] = float(prices_for_day["results"][0]["value_inc_vat"]) / 100
-            elif prices_for_day["count"] > 1:
-                # find DD value
-                for result in prices_for_day["results"]:
-                    if result["payment_method"] == "DIRECT_DEBIT":
-                        # convert from pence to pounds
-                        prices[current_date_iso] = float(result["value_inc_vat"]) / 100
-            else:
-                raise Exception(f"Could not deterimine prices for {current_date_iso}")
+        for (agreement, first_date, last_date), rates_future in zip(agreement_days, rates_futures):
+            days = [
+                first_date + datetime.timedelta(days=i)
+                for i in range((last_date - first_date).days + 1)
+            ]
+            prices.update(get_tariff_periods_by_day(rates_future.result(), days))
 
-            if current_date_iso in consumption:
-                costs[current_date_iso] = round(prices[current_date_iso] * consumption[current_date_iso], 2)
+        consumption_results = consumption_future.result()
 
-        current_date += datetime.timedelta(days=1)
+    timeline.add_periods(period for periods in prices.values() for period in periods)
+
+    consumption, readings = get_consumption_by_day(consumption_results, dates)
 
     if meter.is_export:
         result = {
             "prices": prices,
             "generation": consumption,
-            "income": costs
+            "readings": readings,
+            "timeline": timeline
         }
     else:
         result = {
             "prices": prices,
             "consumption": consumption,
-            "expenditure": costs
+            "readings": readings,
+            "timeline": timeline
         }
 
     logging.debug("get_energy_cost_by_day: returning %s", result)
@@ -0,0 +1,204 @@
+"""
+Profiling of a whole run.
+
+A cProfile profile is collected from every thread (or, on Python 3.12+
+where only one profiler can be active, from the whole process) and saved so
+that it can be loaded with pstats (or a viewer such as snakeviz). tracemalloc records
+the peak memory and the lines that allocated the most memory during each
+phase of the run. Phases that run at the same time in different threads
+share the same peak, so run with one worker for exact figures.
+"""
+
+import contextlib
+import cProfile
+import io
+import logging
+import pathlib
+import pstats
+import sys
+import threading
+import tracemalloc
+
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from solarroi.metrics import get_metrics, PhaseListener
+
+# number of frames kept for each allocation
+TRACEMALLOC_FRAMES = 10
+# number of lines shown in the reports
+TOP_COUNT = 15
+
+
+class PhaseMemory:
+
+    def __init__(self, name: str):
+        self.name = name
+        self.runs = 0
+        self.peak = 0
+        self.top: List[tracemalloc.StatisticDiff] = []
+
+    def __repr__(self) -> str:
+        return f"<name: {self.name}, runs: {self.runs}, peak: {self.peak}>"
+
+
+class Profiler(PhaseListener):
+
+    def __init__(self, command: str, output_dir: pathlib.Path):
+        self.command = command
+        self.output_dir = output_dir
+        self.phases: Dict[str, PhaseMemory] = {}
+        self.__lock = threading.Lock()
+        # profile of each thread by thread id
+        self.__profiles: Dict[int, cProfile.Profile] = {}
+        self.__profile: Optional[cProfile.Profile] = None
+        # traced memory and snapshot at the start of each running phase by thread
+        self.__started: Dict[Tuple[str, int], Tuple[int, tracemalloc.Snapshot]] = {}
+
+    def __repr__(self) -> str:
+        return f"<command: {self.command}, output_dir: {self.output_dir}>"
+
+    def __start_thread_profile(self, *args: Any):
+        """
+        Installed with threading.setprofile so that each new thread starts
+        its own profile.
+        """
+        # only needed for the first call in the thread
+        sys.setprofile(None)
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Python 3.12+ allows one profiler at a time, and the main
+            # thread's profile already includes the calls of this thread
+            return
+        with self.__lock:
+            self.__profiles[threading.get_ident()] = profile
+
+    def start(self):
+        tracemalloc.start(TRACEMALLOC_FRAMES)
+        threading.setprofile(self.__start_thread_profile)
+        self.__profile = cProfile.Profile()
+        self.__profiles[threading.get_ident()] = self.__profile
+        self.__profile.enable()
+
+    def stop(self):
+        assert self.__profile is not None
+        self.__profile.disable()
+        threading.setprofile(None)  # type: ignore
+        tracemalloc.stop()
+
+    @contextlib.contextmanager
+    def __paused(self) -> Iterator[None]:
+        """
+        Stop profiling this thread in the with block, so that taking
+        snapshots is not included in the profile.
+        """
+        profile = self.__profiles.get(threading.get_ident())
+        if profile is not None:
+            profile.disable()
+        try:
+            yield
+        finally:
+            if profile is not None:
+                profile.enable()
+
+    def phase_started(self, name: str):
+        if not tracemalloc.is_tracing():
+            return
+        with self.__paused(), self.__lock:
+            tracemalloc.reset_peak()
+            self.__started[(name, threading.get_ident())] = (
+                tracemalloc.get_traced_memory()[0], tracemalloc.take_snapshot()
+            )
+
+    def phase_finished(self, name: str):
+        if not tracemalloc.is_tracing():
+            return
+        with self.__paused(), self.__lock:
+            started = self.__started.pop((name, threading.get_ident()), None)
+            if started is None:
+                return
+            start_memory, start_snapshot = started
+            # memory allocated by the phase on top of what was in use when it started
+            peak = tracemalloc.get_traced_memory()[1] - start_memory
+            if name not in self.phases:
+                self.phases[name] = PhaseMemory(name)
+            phase = self.phases[name]
+            phase.runs += 1
+            if peak >= phase.peak:
+                phase.peak = peak
+                phase.top = tracemalloc.take_snapshot().compare_to(start_snapshot, "lineno")[:TOP_COUNT]
+
+    def get_stats(self) -> pstats.Stats:
+        """
+        Return the profile of all of the threads.
+        """
+        assert self.__profile is not None
+        stats = pstats.Stats(self.__profile)
+        for profile in self.__profiles.values():
+            if profile is self.__profile:
+                continue
+            try:
+                stats.add(profile)
+            except TypeError:
+                # a thread that did not make any calls
+                pass
+        return stats
+
+    def get_memory_report(self) -> str:
+        lines = []
+        for phase in self.phases.values():
+            lines.append(f"{phase.name}: peak {phase.peak / 1024 / 1024:.1f} MB over {phase.runs} runs")
+            lines.append("  top allocations of the run with the highest peak:")
+            for stat in phase.top:
+                frame = stat.traceback[0]
+                lines.append(
+                    f"  {stat.size_diff / 1024:>10.1f} KB {stat.count_diff:>8} blocks  {frame.filename}:{frame.lineno}"
+                )
+        return "\n".join(lines) + "\n"
+
+    def write(self) -> str:
+        """
+        Save the profile and memory report and return a summary of them.
+        """
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        stats = self.get_stats()
+        profile_path = self.output_dir / f"{self.command}.prof"
+        stats.dump_stats(str(profile_path))
+        memory_path = self.output_dir / f"{self.command}-memory.txt"
+        memory_report = self.get_memory_report()
+        with open(memory_path, "w") as f:
+            f.write(memory_report)
+
+        summary = io.StringIO()
+        summary.write(f"Profile saved to {profile_path}, memory report saved to {memory_path}\n")
+        summary.write("\nHottest functions by own time:\n")
+        stats.stream = summary  # type: ignore
+        stats.sort_stats(pstats.SortKey.TIME).print_stats(TOP_COUNT)
+        summary.write("Memory by phase:\n")
+        for phase in self.phases.values():
+            summary.write(f"  {phase.name}: peak {phase.peak / 1024 / 1024:.1f} MB over {phase.runs} runs\n")
+        return summary.getvalue()
+
+
+@contextlib.contextmanager
+def profile_run(command: str, output_dir: Optional[str]) -> Iterator[None]:
+    """
+    Profile the with block if output_dir is given, then save the results to
+    output_dir and print a summary.
+    """
+    if output_dir is None:
+        yield
+        return
+
+    profiler = Profiler(command, pathlib.Path(output_dir))
+    metrics = get_metrics()
+    metrics.phase_listeners.append(profiler)
+    profiler.start()
+    try:
+        yield
+    finally:
+        profiler.stop()
+        metrics.phase_listeners.remove(profiler)
+        logging.info("Writing profile to %s", output_dir)
+        print(profiler.write(), file=sys.stderr)
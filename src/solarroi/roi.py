@@ -0,0 +1,239 @@
+"""
+Daily and half hourly ROI calculations.
+"""
+
+import concurrent.futures
+import datetime
+import logging
+
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+
+import solarroi.givenergy as givenergy
+import solarroi.octopusenergy as octopus_energy
+
+from solarroi.common import get_windows, DEFAULT_WINDOW_DAYS
+from solarroi.config import Config
+from solarroi.metrics import get_metrics
+from solarroi.grid import concatenate, HalfHourGrid, HalfHourSeries
+from solarroi.octopusenergy import Meter
+
+
+def get_consumption_readings(giv_energy_use: Dict[str, Any]) -> HalfHourSeries:
+    return concatenate(result["consumption_periods"] for result in giv_energy_use.values())
+
+
+class RoiResults:
+    """
+    The daily ROI records for a date range, keyed by ISO date, and the
+    half hourly rows for the days that have complete records.
+    """
+
+    def __init__(self, days: Dict[str, Dict[str, float]], half_hours: List[Dict[str, Any]]):
+        self.days = days
+        self.half_hours = half_hours
+
+    def __repr__(self) -> str:
+        return f"<days: {len(self.days)}, half_hours: {len(self.half_hours)}>"
+
+
+def calculate_roi(
+    start_date: datetime.date,
+    end_date: datetime.date,
+    octopus_energy_import_cost: Dict[str, Any],
+    octopus_energy_export_cost: Dict[str, Any],
+    giv_energy_use: Dict[str, Any]
+) -> RoiResults:
+    """
+    Work out the cost, income, cost without PV and ROI for each day by
+    lining up the half hourly consumption, prices and energy flows on a
+    HalfHourGrid.
+    """
+    grid = HalfHourGrid(start_date, end_date)
+
+    grid_import = grid.from_series(octopus_energy_import_cost["readings"])
+    grid_export = grid.from_series(octopus_energy_export_cost["readings"])
+    home_consumption = grid.from_series(get_consumption_readings(giv_energy_use))
+    known_import_price = octopus_energy_import_cost["timeline"].get_prices(grid.slot_starts)
+    known_export_price = octopus_energy_export_cost["timeline"].get_prices(grid.slot_starts)
+    # slots without a known price do not add to the costs
+    import_price = np.nan_to_num(known_import_price)
+    export_price = np.nan_to_num(known_export_price)
+    no_pv_cost = home_consumption * import_price
+
+    daily_cost = grid.sum_by_day(grid_import * import_price)
+    daily_income = grid.sum_by_day(grid_export * export_price)
+    daily_no_pv_cost = grid.sum_by_day(no_pv_cost)
+    daily_import = grid.sum_by_day(grid_import)
+    daily_export = grid.sum_by_day(grid_export)
+    daily_home_consumption = grid.sum_by_day(home_consumption)
+
+    results: Dict[str, Dict[str, float]] = {}
+    for index, date in enumerate(grid.dates):
+        date_iso = date.isoformat()
+        if date_iso not in giv_energy_use:
+            continue
+
+        if date_iso not in octopus_energy_import_cost["consumption"]:
+            results[date_iso] = {
+                "grid_export": 0,
+                "grid_import": 0
+            }
+            continue
+
+        record = {
+            "home_consumption": round(float(daily_home_consumption[index]), 2),
+            "no_pv_cost": round(float(daily_no_pv_cost[index]), 2),
+            "cost": round(float(daily_cost[index]), 2),
+            "grid_import": float(daily_import[index]),
+            "income": 0.0,
+            "grid_export": 0.0
+        }
+
+        if date_iso in octopus_energy_export_cost["generation"]:
+            record["income"] = round(float(daily_income[index]), 2)
+            record["grid_export"] = float(daily_export[index])
+
+        record["roi"] = (record["no_pv_cost"] - record["cost"]) + record["income"]
+        results[date_iso] = record
+
+    # only keep the half hours of the days with complete records
+    complete = np.repeat(
+        [date.isoformat() in results and "roi" in results[date.isoformat()] for date in grid.dates],
+        np.diff(grid.day_offsets)
+    )
+    slot_dates = np.repeat(grid.dates, np.diff(grid.day_offsets))
+    # slot start times as naive UTC datetimes, as stored in the database
+    timestamps = grid.slot_starts.astype("datetime64[s]").tolist()
+    has_export = np.repeat(
+        [date.isoformat() in octopus_energy_export_cost["generation"] for date in grid.dates],
+        np.diff(grid.day_offsets)
+    )
+
+    half_hours = [
+        {
+            "timestamp": timestamps[index],
+            "date": slot_dates[index],
+            "grid_import": float(grid_import[index]),
+            "grid_export": float(grid_export[index]) if has_export[index] else 0.0,
+            "home_consumption": float(home_consumption[index]),
+            "import_price": get_price(known_import_price[index]),
+            "export_price": get_price(known_export_price[index]),
+            "no_pv_cost": float(no_pv_cost[index])
+        }
+        for index in np.flatnonzero(complete)
+    ]
+
+    return RoiResults(results, half_hours)
+
+
+def get_price(price: float) -> Optional[float]:
+    return None if np.isnan(price) else float(price)
+
+
+def get_roi_rows(results: Dict[str, Dict[str, float]]) -> List[Dict[str, Any]]:
+    """
+    Convert the given daily ROI records to rows for the roi table, skipping
+    any that are incomplete.
+    """
+    rows = []
+    for date, record in results.items():
+        fields_missing = []
+        for field in ["cost", "grid_export", "grid_import",
+                      "home_consumption", "income", "no_pv_cost",
+                      "roi"]:
+            if field not in record:
+                fields_missing.append(field)
+
+        if len(fields_missing) > 0:
+            logging.warning("%s: Missing fields: %s", date, ",".join(
+                fields_missing
+            ))
+            continue
+
+        rows.append({
+            "date": datetime.date.fromisoformat(date),
+            "cost": record["cost"],
+            "grid_export": record["grid_export"],
+            "grid_import": record["grid_import"],
+            "home_consumption": record["home_consumption"],
+            "income": record["income"],
+            "no_pv_cost": record["no_pv_cost"],
+            "roi": record["roi"]
+        })
+    return rows
+
+
+def get_roi(
+    config: Config,
+    import_meter: Meter,
+    export_meter: Meter,
+    start_date: datetime.date,
+    end_date: datetime.date,
+    max_workers: int = 1
+) -> RoiResults:
+    """
+    Download the data for the given range and return the ROI for each day
+    and half hour.
+    """
+    # the meters and the inverter are independent so query them at the same time
+    with get_metrics().phase("fetch"), concurrent.futures.ThreadPoolExecutor(max_workers=3) as executor:
+        import_cost_future = executor.submit(
+            octopus_energy.get_energy_cost_by_day,
+            config,
+            import_meter,
+            start_date.isoformat(),
+            end_date.isoformat(),
+            max_workers
+        )
+
+        export_cost_future = executor.submit(
+            octopus_energy.get_energy_cost_by_day,
+            config,
+            export_meter,
+            start_date.isoformat(),
+            end_date.isoformat(),
+            max_workers
+        )
+
+        logging.debug("Querying GivEnergy API")
+
+        giv_energy_use_future = executor.submit(
+            givenergy.get_energy_consumption_by_day,
+            config,
+            start_date.isoformat(),
+            end_date.isoformat(),
+            max_workers
+        )
+
+        octopus_energy_import_cost = import_cost_future.result()
+        octopus_energy_export_cost = export_cost_future.result()
+        giv_energy_use = giv_energy_use_future.result()
+
+    with get_metrics().phase("compute"):
+        return calculate_roi(
+            start_date,
+            end_date,
+            octopus_energy_import_cost,
+            octopus_energy_export_cost,
+            giv_energy_use
+        )
+
+
+def iter_roi_by_window(
+    config: Config,
+    import_meter: Meter,
+    export_meter: Meter,
+    start_date: datetime.date,
+    end_date: datetime.date,
+    window_days: int = DEFAULT_WINDOW_DAYS,
+    max_workers: int = 1
+) -> Iterator[RoiResults]:
+    """
+    Yield the ROI results for the given range one window at a time. Only
+    one window of API data is held in memory at once.
+    """
+    for window_start, window_end in get_windows(start_date, end_date, window_days):
+        logging.debug("iter_roi_by_window: %s to %s", window_start, window_end)
+        yield get_roi(config, import_meter, export_meter, window_start, window_end, max_workers)
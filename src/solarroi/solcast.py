@@ -1,31 +1,26 @@
-import logging
-import requests
-
 from typing import Any, Dict
-from solarroi.common import get_config_opion
-
-CONFIG_SECTION = "Solcast"
-
-
-def get_api_key() -> str:
-    return get_config_opion(CONFIG_SECTION, "api_key")
+from solarroi.client import ApiClient, get_api_client
+from solarroi.common import die
+from solarroi.config import Config
 
+BASE_URL = "https://api.solcast.com.au"
 
-def get_resource_id() -> str:
-    return get_config_opion(CONFIG_SECTION, "resource_id")
 
+def create_api_client(config: Config) -> ApiClient:
+    return ApiClient(
+        config.http,
+        headers={"Authorization": f"Bearer {config.solcast.api_key}"},
+        rate_limit=config.solcast.rate_limit
+    )
 
-def get_forecasts() -> Dict[str, Any]:
-    api_key = get_api_key()
-    resource_id = get_resource_id()
 
-    headers = {"Authorization": f"Bearer {api_key}"}
-    url = f"https://api.solcast.com.au/rooftop_sites/{resource_id}/forecasts?format=json"
+def get_forecasts(config: Config) -> Dict[str, Any]:
+    url = f"{BASE_URL}/rooftop_sites/{config.solcast.resource_id}/forecasts?format=json"
 
-    result = requests.get(url, headers=headers)
+    result = get_api_client(BASE_URL, lambda: create_api_client(config)).request("GET", url)
 
     if result.status_code != 200:
-        logging.error("%s returned: %d", url, result.status_code)
+        die(f"Unable to load {url}, error code: {result.status_code}")
 
     result_json = result.json()
 
@@ -1,28 +1,174 @@
+import datetime
 import logging
+import threading
+import time
+
+from typing import Any, Dict, Iterable, List, Optional
 
 from sqlalchemy.ext.declarative import declarative_base  # type: ignore
-from sqlalchemy import create_engine, Column, Date, DateTime, Double  # type: ignore
-from sqlalchemy.orm import sessionmaker  # type: ignore
+from sqlalchemy import create_engine, func, Column, Date, DateTime, Double, Index, Integer  # type: ignore
+from sqlalchemy.dialects import mysql, postgresql, sqlite  # type: ignore
+from sqlalchemy.orm import Session, sessionmaker  # type: ignore
 
-from solarroi.common import get_config_opion
+from solarroi.common import DEFAULT_BATCH_SIZE
+from solarroi.config import Config
+from solarroi.metrics import get_metrics
 
-CONFIG_SECTION = "MySQL"
+# columns of the roi table that are summed by the rollup tables
+ROLLUP_COLUMNS = ["cost", "grid_export", "grid_import", "home_consumption", "income", "no_pv_cost", "roi"]
 
 Base = declarative_base()
 
+session_makers: Dict[str, sessionmaker] = {}
+session_makers_lock = threading.Lock()
+
 
-def connect_db() -> sessionmaker:
-    db = get_config_opion(CONFIG_SECTION, "database")
-    user = get_config_opion(CONFIG_SECTION, "user")
-    password = get_config_opion(CONFIG_SECTION, "password")
-    host = get_config_opion(CONFIG_SECTION, "host")
+def connect_db(config: Config) -> sessionmaker:
+    db = config.mysql.database
+    user = config.mysql.user
+    password = config.mysql.password
+    host = config.mysql.host
 
     conn_str = f"mysql+pymysql://{user}:{password}@{host}/{db}"
-    logging.debug("connect_db: connecting to: %s", conn_str)
-    engine = create_engine(conn_str)
-    Session = sessionmaker(bind=engine)
-    Base.metadata.create_all(engine)
-    return Session
+    with session_makers_lock:
+        # reuse the engine (and its connection pool) for later calls
+        if conn_str not in session_makers:
+            logging.debug("connect_db: connecting to: %s", conn_str)
+            engine = create_engine(conn_str)
+            Base.metadata.create_all(engine)
+            session_makers[conn_str] = sessionmaker(bind=engine)
+        return session_makers[conn_str]
+
+
+def close_db():
+    with session_makers_lock:
+        for session_maker in session_makers.values():
+            session_maker.kw["bind"].dispose()
+        session_makers.clear()
+
+
+def upsert(session: Session, model: Any, rows: List[Dict[str, Any]], batch_size: int = DEFAULT_BATCH_SIZE):
+    """
+    Insert the given rows into the table for model, updating any rows that
+    already exist with the same primary key. Rows are sent in multi-row
+    statements of up to batch_size rows. The caller is responsible for
+    committing the transaction.
+    """
+    table = model.__table__
+    key_columns = [column.name for column in table.primary_key.columns]
+    update_columns = [column.name for column in table.columns if column.name not in key_columns]
+    dialect = session.get_bind().dialect.name
+
+    for index in range(0, len(rows), batch_size):
+        batch = rows[index:index + batch_size]
+        logging.debug("upsert: %d rows into %s", len(batch), table.name)
+        start = time.perf_counter()
+
+        if dialect == "mysql":
+            statement = mysql.insert(table).values(batch)
+            statement = statement.on_duplicate_key_update(
+                {column: statement.inserted[column] for column in update_columns}
+            )
+        elif dialect in ("postgresql", "sqlite"):
+            insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+            statement = insert(table).values(batch)
+            statement = statement.on_conflict_do_update(
+                index_elements=key_columns,
+                set_={column: statement.excluded[column] for column in update_columns}
+            )
+        else:
+            for row in batch:
+                session.merge(model(**row))
+            session.flush()
+            get_metrics().record_statement(table.name, len(batch), time.perf_counter() - start)
+            continue
+
+        session.execute(statement)
+        get_metrics().record_statement(table.name, len(batch), time.perf_counter() - start)
+
+
+def get_totals(session: Session, model: Any, column: Any, start: Any, end: Any) -> Optional[Dict[str, Any]]:
+    """
+    Return the number of rows in model from start up to, but not including,
+    end along with the sum of each of the ROLLUP_COLUMNS, or None if there
+    are no rows.
+    """
+    count_column = func.count() if model is SolarROI else func.sum(model.days)
+    row = session.query(
+        count_column, *[func.sum(getattr(model, name)) for name in ROLLUP_COLUMNS]
+    ).filter(column >= start, column < end).one()
+    if not row[0]:
+        return None
+    totals = {name: value for name, value in zip(ROLLUP_COLUMNS, row[1:])}
+    totals["days"] = row[0]
+    return totals
+
+
+def update_rollups(session: Session, dates: Iterable[datetime.date], batch_size: int = DEFAULT_BATCH_SIZE):
+    """
+    Update the month, year and cumulative rollups of the roi table for the
+    periods that contain the given dates. Call this after the roi records
+    for the dates have been written, in the same transaction.
+    """
+    dates = sorted(set(dates))
+    if len(dates) == 0:
+        return
+
+    # months are summed from the roi table and years from the months
+    month_rows = []
+    for month in sorted({date.replace(day=1) for date in dates}):
+        next_month = (month + datetime.timedelta(days=32)).replace(day=1)
+        totals = get_totals(session, SolarROI, SolarROI.date, month, next_month)
+        if totals is not None:
+            month_rows.append({"month": month, **totals})
+    upsert(session, SolarROIMonth, month_rows, batch_size)
+
+    year_rows = []
+    for year in sorted({date.year for date in dates}):
+        totals = get_totals(
+            session, SolarROIMonth, SolarROIMonth.month, datetime.date(year, 1, 1), datetime.date(year + 1, 1, 1)
+        )
+        if totals is not None:
+            year_rows.append({"year": year, **totals})
+    upsert(session, SolarROIYear, year_rows, batch_size)
+
+    # running totals change for every day after the first updated date, so
+    # carry on from the last running total before it
+    previous = session.query(SolarROICumulative).filter(
+        SolarROICumulative.date < dates[0]
+    ).order_by(SolarROICumulative.date.desc()).first()
+    running = {name: (getattr(previous, name) or 0.0) if previous else 0.0 for name in ROLLUP_COLUMNS}
+    running_days = previous.days if previous else 0
+
+    cumulative_rows = []
+    for record in session.query(SolarROI).filter(SolarROI.date >= dates[0]).order_by(SolarROI.date):
+        for name in ROLLUP_COLUMNS:
+            running[name] += getattr(record, name) or 0.0
+        running_days += 1
+        cumulative_rows.append({"date": record.date, "days": running_days, **running})
+    upsert(session, SolarROICumulative, cumulative_rows, batch_size)
+
+    logging.debug(
+        "update_rollups: %d months, %d years, %d days", len(month_rows), len(year_rows), len(cumulative_rows)
+    )
+
+
+def get_latest_roi_date(session: Session) -> Optional[datetime.date]:
+    return session.query(func.max(SolarROI.date)).scalar()
+
+
+def get_solcast_estimates(
+    session: Session, start: datetime.datetime, end: datetime.datetime
+) -> Dict[datetime.datetime, float]:
+    """
+    Return the stored pv_estimate for each forecast from start to end.
+    """
+    return {
+        date: pv_estimate
+        for date, pv_estimate in session.query(Solcast.date, Solcast.pv_estimate).filter(
+            Solcast.date >= start, Solcast.date <= end
+        )
+    }
 
 
 class SolarROI(Base):  # type: ignore
@@ -39,6 +185,72 @@ class SolarROI(Base):  # type: ignore
     roi = Column(Double)
 
 
+class SolarROIMonth(Base):  # type: ignore
+
+    __tablename__ = "roi_month"
+
+    # first day of the month
+    month = Column(Date, primary_key=True)
+    days = Column(Integer)
+    cost = Column(Double)
+    grid_export = Column(Double)
+    grid_import = Column(Double)
+    home_consumption = Column(Double)
+    income = Column(Double)
+    no_pv_cost = Column(Double)
+    roi = Column(Double)
+
+
+class SolarROIYear(Base):  # type: ignore
+
+    __tablename__ = "roi_year"
+
+    year = Column(Integer, primary_key=True, autoincrement=False)
+    days = Column(Integer)
+    cost = Column(Double)
+    grid_export = Column(Double)
+    grid_import = Column(Double)
+    home_consumption = Column(Double)
+    income = Column(Double)
+    no_pv_cost = Column(Double)
+    roi = Column(Double)
+
+
+class SolarROICumulative(Base):  # type: ignore
+
+    __tablename__ = "roi_cumulative"
+
+    # totals of every day up to and including date
+    date = Column(Date, primary_key=True)
+    days = Column(Integer)
+    cost = Column(Double)
+    grid_export = Column(Double)
+    grid_import = Column(Double)
+    home_consumption = Column(Double)
+    income = Column(Double)
+    no_pv_cost = Column(Double)
+    roi = Column(Double)
+
+
+class SolarROIHalfHour(Base):  # type: ignore
+
+    __tablename__ = "roi_half_hour"
+    __table_args__ = (
+        Index("roi_half_hour_date", "date"),
+    )
+
+    # start of the half hour in UTC
+    timestamp = Column(DateTime, primary_key=True)
+    # local day that the half hour belongs to
+    date = Column(Date, nullable=False)
+    grid_import = Column(Double)
+    grid_export = Column(Double)
+    home_consumption = Column(Double)
+    import_price = Column(Double)
+    export_price = Column(Double)
+    no_pv_cost = Column(Double)
+
+
 class Solcast(Base):  # type: ignore
 
     __tablename__ = "solcast"
@@ -0,0 +1,64 @@
+import datetime
+import time
+import zoneinfo
+
+from typing import Dict, List
+
+import pytest
+
+from sqlalchemy import create_engine  # type: ignore
+from sqlalchemy.orm import sessionmaker  # type: ignore
+
+from solarroi.common import TIMEZONE
+from solarroi.givenergy import EnergyType
+from solarroi.sql import Base
+
+
+@pytest.fixture
+def utc_host(monkeypatch):
+    """
+    Run the test on a machine whose local time zone is UTC.
+    """
+    monkeypatch.setenv("TZ", "UTC")
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+@pytest.fixture
+def session_maker(tmp_path):
+    """
+    Return a session maker for a new SQLite database with the Solar-ROI tables.
+    """
+    engine = create_engine(f"sqlite:///{tmp_path / 'roi.sqlite'}")
+    Base.metadata.create_all(engine)
+    yield sessionmaker(bind=engine)
+    engine.dispose()
+
+
+def get_energy_flows(start_date: datetime.date, end_date: datetime.date, value: float = 0.1) -> List[Dict]:
+    """
+    Return half hourly energy flows data points, with local start times as
+    returned by the GivEnergy API, for the days from start_date to end_date.
+    """
+    tz = zoneinfo.ZoneInfo(TIMEZONE)
+    start = datetime.datetime.combine(start_date, datetime.time(), tzinfo=tz).astimezone(datetime.timezone.utc)
+    end = datetime.datetime.combine(
+        end_date + datetime.timedelta(days=1), datetime.time(), tzinfo=tz
+    ).astimezone(datetime.timezone.utc)
+
+    data_points = []
+    slot = start
+    while slot < end:
+        data_points.append({
+            "start_time": slot.astimezone(tz).strftime("%Y-%m-%d %H:%M"),
+            "end_time": (slot + datetime.timedelta(minutes=30)).astimezone(tz).strftime("%Y-%m-%d %H:%M"),
+            "data": {
+                str(EnergyType.PV_TO_HOME.value): value,
+                str(EnergyType.GRID_TO_HOME.value): value,
+                str(EnergyType.GRID_TO_BATTERY.value): value
+            }
+        })
+        slot += datetime.timedelta(minutes=30)
+    return data_points
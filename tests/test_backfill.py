@@ -0,0 +1,150 @@
+import datetime
+
+import pytest
+
+import solarroi.backfill as backfill_module
+
+from solarroi.backfill import backfill, get_checkpoint_path, Checkpoint
+from solarroi.common import get_windows
+from solarroi.roi import RoiResults
+from solarroi.sql import SolarROI, SolarROICumulative, SolarROIMonth, SolarROIYear
+
+
+def get_roi(config, import_meter, export_meter, start_date, end_date, max_workers):
+    days = {}
+    date = start_date
+    while date <= end_date:
+        days[date.isoformat()] = {
+            "cost": 1.0,
+            "grid_export": 2.0,
+            "grid_import": 3.0,
+            "home_consumption": 4.0,
+            "income": 0.5,
+            "no_pv_cost": 2.0,
+            "roi": 1.5
+        }
+        date += datetime.timedelta(days=1)
+    return RoiResults(days, [])
+
+
+def run_backfill(session_maker, checkpoint, windows):
+    return backfill(None, session_maker, None, None, windows, checkpoint, parallel=2, retries=0)
+
+
+def test_resumed_backfill_rolls_up_checkpointed_windows(monkeypatch, tmp_path, session_maker):
+    monkeypatch.setattr(backfill_module, "get_roi", get_roi)
+    windows = list(get_windows(datetime.date(2023, 1, 1), datetime.date(2023, 3, 31), 31))
+    checkpoint_path = tmp_path / "checkpoint.json"
+
+    # stop the first backfill after the windows are saved but before the rollups
+    def interrupt(session, dates, batch_size):
+        raise KeyboardInterrupt()
+
+    monkeypatch.setattr(backfill_module, "update_rollups", interrupt)
+    with pytest.raises(KeyboardInterrupt):
+        run_backfill(session_maker, Checkpoint(checkpoint_path), windows)
+    monkeypatch.undo()
+    monkeypatch.setattr(backfill_module, "get_roi", get_roi)
+
+    assert run_backfill(session_maker, Checkpoint(checkpoint_path), windows) == []
+
+    with session_maker() as session:
+        months = session.query(SolarROIMonth).order_by(SolarROIMonth.month).all()
+        assert [(month.month.month, month.days, month.roi) for month in months] == [
+            (1, 31, 31 * 1.5), (2, 28, 28 * 1.5), (3, 31, 31 * 1.5)
+        ]
+        year = session.query(SolarROIYear).one()
+        assert (year.days, year.roi) == (90, 90 * 1.5)
+        last = session.query(SolarROICumulative).order_by(SolarROICumulative.date.desc()).first()
+        assert (last.date, last.days, last.roi) == (datetime.date(2023, 3, 31), 90, 90 * 1.5)
+
+
+def test_checkpoint_removed_when_complete(monkeypatch, tmp_path, session_maker):
+    monkeypatch.setattr(backfill_module, "get_roi", get_roi)
+    windows = list(get_windows(datetime.date(2023, 1, 1), datetime.date(2023, 2, 28), 31))
+    checkpoint_path = tmp_path / "checkpoint.json"
+
+    assert run_backfill(session_maker, Checkpoint(checkpoint_path), windows) == []
+
+    assert not checkpoint_path.exists()
+
+
+def test_checkpoint_kept_when_a_window_fails(monkeypatch, tmp_path, session_maker):
+    def get_roi_or_fail(config, import_meter, export_meter, start_date, end_date, max_workers):
+        if start_date.month == 2:
+            raise RuntimeError("API error")
+        return get_roi(config, import_meter, export_meter, start_date, end_date, max_workers)
+
+    monkeypatch.setattr(backfill_module, "get_roi", get_roi_or_fail)
+    windows = list(get_windows(datetime.date(2023, 1, 1), datetime.date(2023, 2, 28), 31))
+    checkpoint_path = tmp_path / "checkpoint.json"
+
+    assert run_backfill(session_maker, Checkpoint(checkpoint_path), windows) == [windows[1]]
+
+    assert Checkpoint(checkpoint_path).get_completed() == [windows[0]]
+
+
+def test_unsettled_windows_are_not_checkpointed(monkeypatch, tmp_path, session_maker):
+    monkeypatch.setattr(backfill_module, "get_roi", get_roi)
+    today = datetime.date.today()
+    windows = list(get_windows(today - datetime.timedelta(days=13), today, 7))
+    checkpoint = Checkpoint(tmp_path / "checkpoint.json")
+    added = []
+    monkeypatch.setattr(checkpoint, "add", added.append)
+
+    assert run_backfill(session_maker, checkpoint, windows) == []
+
+    # the second window ends today, so only the first is settled
+    assert added == [windows[0]]
+    with session_maker() as session:
+        assert session.query(SolarROI).count() == 14
+        last = session.query(SolarROICumulative).order_by(SolarROICumulative.date.desc()).first()
+        assert (last.date, last.days) == (today, 14)
+
+
+def test_checkpoint_path_depends_on_config_and_range(tmp_path):
+    first = tmp_path / "first.conf"
+    second = tmp_path / "second.conf"
+    start_date = datetime.date(2023, 1, 1)
+    end_date = datetime.date(2023, 12, 31)
+
+    paths = {
+        get_checkpoint_path(first, start_date, end_date),
+        get_checkpoint_path(second, start_date, end_date),
+        get_checkpoint_path(first, start_date, datetime.date(2023, 6, 30))
+    }
+
+    assert len(paths) == 3
+    assert get_checkpoint_path(first, start_date, end_date) == get_checkpoint_path(
+        tmp_path / "." / "first.conf", start_date, end_date
+    )
+
+
+def test_rollups_only_cover_windows_not_rolled_up(monkeypatch, tmp_path, session_maker):
+    def get_roi_or_fail(config, import_meter, export_meter, start_date, end_date, max_workers):
+        if start_date.month == 2:
+            raise RuntimeError("API error")
+        return get_roi(config, import_meter, export_meter, start_date, end_date, max_workers)
+
+    windows = list(get_windows(datetime.date(2023, 1, 1), datetime.date(2023, 2, 28), 31))
+    checkpoint_path = tmp_path / "checkpoint.json"
+    monkeypatch.setattr(backfill_module, "get_roi", get_roi_or_fail)
+    run_backfill(session_maker, Checkpoint(checkpoint_path), windows)
+
+    rolled_up = []
+    update_rollups = backfill_module.update_rollups
+
+    def record_rollups(session, dates, batch_size):
+        rolled_up.extend(dates)
+        update_rollups(session, dates, batch_size)
+
+    monkeypatch.setattr(backfill_module, "get_roi", get_roi)
+    monkeypatch.setattr(backfill_module, "update_rollups", record_rollups)
+
+    assert run_backfill(session_maker, Checkpoint(checkpoint_path), windows) == []
+
+    # January was rolled up by the first run
+    assert (min(rolled_up), max(rolled_up)) == (datetime.date(2023, 2, 1), datetime.date(2023, 2, 28))
+    with session_maker() as session:
+        last = session.query(SolarROICumulative).order_by(SolarROICumulative.date.desc()).first()
+        assert (last.date, last.days) == (datetime.date(2023, 2, 28), 59)
@@ -0,0 +1,51 @@
+import datetime
+
+import pytest
+
+import solarroi.cache as cache_module
+
+from solarroi.cache import get_cache_chunks, ResponseCache
+
+
+@pytest.fixture
+def response_cache(monkeypatch, tmp_path):
+    response_cache = ResponseCache(tmp_path / "cache.sqlite", 3, 1024 * 1024)
+    monkeypatch.setattr(response_cache, "is_settled", lambda date: date < datetime.date(2023, 10, 14))
+    monkeypatch.setattr(cache_module, "response_cache", response_cache)
+    return response_cache
+
+
+def test_chunks_without_cache(monkeypatch):
+    monkeypatch.setattr(cache_module, "response_cache", None)
+    assert get_cache_chunks(datetime.date(2023, 9, 17), datetime.date(2023, 10, 17)) == [
+        (datetime.date(2023, 9, 17), datetime.date(2023, 10, 17), False)
+    ]
+
+
+def test_chunks_are_whole_settled_months(response_cache):
+    assert get_cache_chunks(datetime.date(2023, 8, 20), datetime.date(2023, 10, 17)) == [
+        (datetime.date(2023, 8, 1), datetime.date(2023, 8, 31), True),
+        (datetime.date(2023, 9, 1), datetime.date(2023, 9, 30), True),
+        (datetime.date(2023, 10, 1), datetime.date(2023, 10, 17), False)
+    ]
+
+
+def test_chunks_are_the_same_for_different_starts(response_cache):
+    first = get_cache_chunks(datetime.date(2023, 9, 17), datetime.date(2023, 10, 17))
+    second = get_cache_chunks(datetime.date(2023, 9, 18), datetime.date(2023, 10, 17))
+    assert [chunk for chunk in first if chunk[2]] == [chunk for chunk in second if chunk[2]]
+
+
+def test_chunks_of_a_past_range(response_cache):
+    assert get_cache_chunks(datetime.date(2023, 2, 10), datetime.date(2023, 2, 12)) == [
+        (datetime.date(2023, 2, 1), datetime.date(2023, 2, 28), True)
+    ]
+
+
+def test_put_only_stores_settled_data(tmp_path):
+    response_cache = ResponseCache(tmp_path / "cache.sqlite", 3, 1024 * 1024)
+    today = datetime.datetime.now(datetime.timezone.utc).date()
+    response_cache.put("GET", "https://example.com/old", None, {"a": 1}, today - datetime.timedelta(days=10))
+    response_cache.put("GET", "https://example.com/new", None, {"a": 2}, today)
+    assert response_cache.get("GET", "https://example.com/old") == {"a": 1}
+    assert response_cache.get("GET", "https://example.com/new") is None
@@ -0,0 +1,150 @@
+import argparse
+import datetime
+import os
+import pathlib
+import subprocess
+import sys
+
+import pytest
+
+import solarroi
+import solarroi.octopusenergy as octopus_energy
+import solarroi.roi as roi
+import solarroi.solcast as solcast
+import solarroi.sql as sql
+
+from solarroi.cli import run_forecast, run_roi
+from solarroi.roi import RoiResults
+from solarroi.sql import upsert, Solcast, SolarROI
+
+FORECASTS = [
+    {"period_end": "2023-06-01T10:00:00.0000000Z", "pv_estimate": 1.5},
+    {"period_end": "2023-06-01T10:30:00.0000000Z", "pv_estimate": 2.0},
+    {"period_end": "2023-06-01T11:00:00.0000000Z", "pv_estimate": 2.5}
+]
+
+
+def run(monkeypatch, session_maker, forecasts, skip_unchanged):
+    written = []
+    upsert = sql.upsert
+
+    def record_upsert(session, model, rows, batch_size):
+        written.extend(rows)
+        upsert(session, model, rows, batch_size)
+
+    monkeypatch.setattr(solcast, "get_forecasts", lambda config: forecasts)
+    monkeypatch.setattr(sql, "connect_db", lambda config: session_maker)
+    monkeypatch.setattr(sql, "upsert", record_upsert)
+    args = argparse.Namespace(use_database=True, batch_size=500, skip_unchanged=skip_unchanged)
+    run_forecast(args, None)
+    return written
+
+
+def get_estimates(session_maker):
+    with session_maker() as session:
+        return [(record.date, record.pv_estimate) for record in session.query(Solcast).order_by(Solcast.date)]
+
+
+def test_skip_unchanged(monkeypatch, session_maker):
+    assert len(run(monkeypatch, session_maker, FORECASTS, True)) == 3
+
+    changed = [dict(FORECASTS[0]), dict(FORECASTS[1], pv_estimate=3.0), dict(FORECASTS[2])]
+    written = run(monkeypatch, session_maker, changed, True)
+
+    assert [(row["date"], row["pv_estimate"]) for row in written] == [(datetime.datetime(2023, 6, 1, 10, 30), 3.0)]
+    assert get_estimates(session_maker) == [
+        (datetime.datetime(2023, 6, 1, 10, 0), 1.5),
+        (datetime.datetime(2023, 6, 1, 10, 30), 3.0),
+        (datetime.datetime(2023, 6, 1, 11, 0), 2.5)
+    ]
+
+
+def test_without_skip_unchanged_every_forecast_is_written(monkeypatch, session_maker):
+    run(monkeypatch, session_maker, FORECASTS, False)
+
+    assert len(run(monkeypatch, session_maker, FORECASTS, False)) == 3
+    assert len(get_estimates(session_maker)) == 3
+
+
+def get_roi_args(**kwargs):
+    args = {
+        "use_database": True,
+        "start_date": None,
+        "end_date": None,
+        "incremental": True,
+        "recheck_days": None,
+        "batch_size": 500,
+        "window_days": 31,
+        "workers": 1,
+        "no_cache": True,
+        "refresh": False,
+        "account_max_age": 0
+    }
+    args.update(kwargs)
+    return argparse.Namespace(**args)
+
+
+def run_incremental(monkeypatch, session_maker, latest_date, **kwargs):
+    """
+    Run an incremental ROI update after latest_date and return the range
+    that was processed, or None if nothing was.
+    """
+    with session_maker() as session, session.begin():
+        upsert(session, SolarROI, [{"date": latest_date, "roi": 1.0}])
+
+    ranges = []
+
+    def iter_roi_by_window(config, import_meter, export_meter, start_date, end_date, window_days, max_workers):
+        ranges.append((start_date, end_date))
+        yield RoiResults({start_date.isoformat(): {"roi": 1.0}}, [])
+
+    config = argparse.Namespace(cache=argparse.Namespace(settlement_days=3))
+    monkeypatch.setattr(sql, "connect_db", lambda config: session_maker)
+    monkeypatch.setattr(octopus_energy, "get_tariff_history", lambda config, max_age: (None, None))
+    monkeypatch.setattr(roi, "iter_roi_by_window", iter_roi_by_window)
+    run_roi(get_roi_args(**kwargs), config)
+    return ranges[0] if len(ranges) > 0 else None
+
+
+def test_incremental_rechecks_unsettled_days(monkeypatch, session_maker):
+    today = datetime.date.today()
+
+    # the settlement_days of the Cache section are processed again by default
+    assert run_incremental(monkeypatch, session_maker, today - datetime.timedelta(days=5)) == (
+        today - datetime.timedelta(days=7), today
+    )
+
+
+def test_incremental_recheck_days(monkeypatch, session_maker):
+    today = datetime.date.today()
+
+    assert run_incremental(monkeypatch, session_maker, today - datetime.timedelta(days=5), recheck_days=0) == (
+        today - datetime.timedelta(days=4), today
+    )
+    assert run_incremental(monkeypatch, session_maker, today - datetime.timedelta(days=5), recheck_days=1) == (
+        today - datetime.timedelta(days=5), today
+    )
+
+
+def test_incremental_up_to_date(monkeypatch, session_maker):
+    assert run_incremental(monkeypatch, session_maker, datetime.date.today(), recheck_days=0) is None
+
+
+def test_incremental_invalid_recheck_days(monkeypatch, session_maker):
+    with pytest.raises(SystemExit):
+        run_incremental(monkeypatch, session_maker, datetime.date.today(), recheck_days=-1)
+
+
+def test_import_does_not_load_heavy_modules():
+    # run in a new interpreter, as the other tests have already imported them
+    code = (
+        "import sys\n"
+        "import solarroi.cli\n"
+        "print(' '.join(sorted({'numpy', 'requests', 'sqlalchemy', 'cProfile'} & set(sys.modules))))\n"
+    )
+    env = dict(os.environ, PYTHONPATH=str(pathlib.Path(solarroi.__file__).parent.parent))
+    result = subprocess.run(
+        [sys.executable, "-c", code], env=env, stdout=subprocess.PIPE, check=True, universal_newlines=True
+    )
+
+    assert result.stdout.strip() == ""
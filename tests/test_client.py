@@ -0,0 +1,192 @@
+import datetime
+import email.utils
+
+import pytest
+import requests
+
+import solarroi.client as client_module
+
+from solarroi.client import get_retry_after, ApiClient, RateLimiter
+from solarroi.config import HTTPConfig
+
+URL = "https://api.example.com/v1/data/"
+
+
+class Clock:
+    """
+    Stand-in for the time module whose sleep moves the clock on instead of
+    waiting.
+    """
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def perf_counter(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(client_module, "time", clock)
+    # always wait for the longest backoff
+    monkeypatch.setattr(client_module.random, "uniform", lambda low, high: high)
+    return clock
+
+
+def get_response(retry_after=None, status_code=429):
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = b""
+    if retry_after is not None:
+        response.headers["Retry-After"] = retry_after
+    return response
+
+
+def get_client(responses, retries=3, backoff=1.0, max_backoff=60.0):
+    """
+    Return an ApiClient whose requests return, or raise, each of the given
+    responses in turn, and the list of requests that it makes.
+    """
+    api_client = ApiClient(HTTPConfig(retries=retries, backoff=backoff, max_backoff=max_backoff))
+    calls = []
+
+    def request(method, url, **kwargs):
+        calls.append((method, url))
+        response = responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    api_client.session.request = request
+    return api_client, calls
+
+
+def test_rate_limiter_without_limit(clock):
+    rate_limiter = RateLimiter(0)
+    for _ in range(100):
+        rate_limiter.acquire()
+
+    assert clock.sleeps == []
+
+
+def test_rate_limiter_spaces_requests(clock):
+    rate_limiter = RateLimiter(2)
+    for _ in range(6):
+        rate_limiter.acquire()
+
+    # a burst of two, then one request every half a second
+    assert clock.sleeps == [0.5, 0.5, 0.5, 0.5]
+
+
+def test_rate_limiter_refills(clock):
+    rate_limiter = RateLimiter(2, burst=4)
+    for _ in range(4):
+        rate_limiter.acquire()
+    clock.now += 1.0
+    for _ in range(2):
+        rate_limiter.acquire()
+
+    assert clock.sleeps == []
+
+
+def test_rate_limiter_pause(clock):
+    rate_limiter = RateLimiter(0)
+    rate_limiter.pause(5)
+    rate_limiter.acquire()
+    rate_limiter.acquire()
+
+    assert clock.sleeps == [5]
+
+
+def test_request_retries_with_backoff(clock):
+    api_client, calls = get_client([
+        get_response(status_code=503),
+        requests.ConnectionError("reset"),
+        get_response(status_code=500),
+        get_response(status_code=200)
+    ])
+
+    assert api_client.request("GET", URL).status_code == 200
+    assert len(calls) == 4
+    # the backoff doubles after each attempt
+    assert clock.sleeps == [1.0, 2.0, 4.0]
+
+
+def test_request_backoff_is_capped(clock):
+    api_client, calls = get_client([get_response(status_code=503)] * 3 + [get_response(status_code=200)], 3, 10, 15)
+
+    api_client.request("GET", URL)
+
+    assert clock.sleeps == [10, 15, 15]
+
+
+def test_request_waits_for_retry_after(clock):
+    api_client, calls = get_client([get_response("7"), get_response(status_code=200)])
+
+    assert api_client.request("GET", URL).status_code == 200
+    # the host is paused for the same time, so the retry does not wait again
+    assert clock.sleeps == [7.0]
+
+
+def test_request_gives_up_after_retries(clock):
+    api_client, calls = get_client([get_response(status_code=503)] * 3, retries=2)
+
+    assert api_client.request("GET", URL).status_code == 503
+    assert len(calls) == 3
+
+
+def test_request_raises_connection_error_after_retries(clock):
+    api_client, calls = get_client([requests.ConnectionError("reset")] * 2, retries=1)
+
+    with pytest.raises(requests.ConnectionError):
+        api_client.request("GET", URL)
+    assert len(calls) == 2
+
+
+def test_request_does_not_retry_client_errors(clock):
+    api_client, calls = get_client([get_response(status_code=404)])
+
+    assert api_client.request("GET", URL).status_code == 404
+    assert clock.sleeps == []
+
+
+@pytest.mark.parametrize("retry_after, seconds", [
+    (None, None),
+    ("0", 0.0),
+    ("120", 120.0),
+    ("1.5", 1.5),
+    ("-5", 0.0),
+    ("soon", None)
+])
+def test_get_retry_after_seconds(retry_after, seconds):
+    assert get_retry_after(get_response(retry_after)) == seconds
+
+
+def test_get_retry_after_date():
+    retry_date = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(seconds=60)
+
+    seconds = get_retry_after(get_response(email.utils.format_datetime(retry_date, usegmt=True)))
+
+    # the header only has whole seconds
+    assert 58 <= seconds <= 60
+
+
+def test_get_retry_after_past_date():
+    assert get_retry_after(get_response("Wed, 21 Oct 2015 07:28:00 GMT")) == 0.0
+
+
+def test_get_retry_after_date_without_zone():
+    retry_date = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(seconds=60)
+    # -0000 means that the zone is unknown, which is taken to be UTC
+    value = retry_date.strftime("%a, %d %b %Y %H:%M:%S -0000")
+
+    assert 58 <= get_retry_after(get_response(value)) <= 60
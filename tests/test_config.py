@@ -0,0 +1,91 @@
+import os
+
+import pytest
+
+import solarroi
+
+from solarroi.config import get_config, Config, DEFAULT_CACHE_SETTLEMENT_DAYS, DEFAULT_HTTP_POOL_SIZE
+
+CONFIG = """
+[GivEnergy]
+api_key = giv-key
+inverter_serial = SA0000001
+
+[OctopusEnergy]
+account = A-12345678
+api_key = octopus-key
+
+[HTTP]
+timeout = 30
+"""
+
+
+@pytest.fixture
+def config_path(tmp_path, monkeypatch):
+    path = tmp_path / "solar-roi.conf"
+    path.write_text(CONFIG)
+    monkeypatch.setattr(solarroi, "conf_file", path)
+    return path
+
+
+def test_config_sections(config_path):
+    config = Config(config_path)
+
+    assert config.givenergy.api_key == "giv-key"
+    assert config.octopus_energy.account == "A-12345678"
+    assert config.http.timeout == 30.0
+    # options that are not set use their defaults
+    assert config.http.pool_size == DEFAULT_HTTP_POOL_SIZE
+    assert config.cache.settlement_days == DEFAULT_CACHE_SETTLEMENT_DAYS
+    assert config.metrics.json_path is None
+
+
+def test_missing_section_only_fails_when_used(config_path):
+    config = Config(config_path)
+
+    with pytest.raises(SystemExit):
+        config.solcast
+
+
+def test_incomplete_section(config_path):
+    config_path.write_text(CONFIG + "\n[Solcast]\napi_key = solcast-key\n")
+
+    with pytest.raises(SystemExit):
+        Config(config_path)
+
+
+def test_invalid_value(config_path):
+    config_path.write_text(CONFIG + "\n[Cache]\nsettlement_days = three\n")
+
+    with pytest.raises(SystemExit):
+        Config(config_path)
+
+
+def test_missing_file(tmp_path):
+    with pytest.raises(SystemExit):
+        Config(tmp_path / "missing.conf")
+
+
+def test_get_config_reloads_when_modified(config_path):
+    config = get_config()
+
+    assert get_config() is config
+
+    config_path.write_text(CONFIG.replace("giv-key", "new-key"))
+    # make sure that the modification time changes
+    os.utime(config_path, (config.mtime + 10, config.mtime + 10))
+    reloaded = get_config()
+
+    assert reloaded is not config
+    assert reloaded.givenergy.api_key == "new-key"
+    assert get_config() is reloaded
+
+
+def test_rate_limit_per_api(config_path):
+    config_path.write_text(CONFIG.replace("[HTTP]", "rate_limit = 2\n\n[HTTP]\nrate_limit = 5"))
+    config = Config(config_path)
+
+    # the OctopusEnergy section sets its own rate_limit
+    assert config.octopus_energy.rate_limit == 2.0
+    assert config.givenergy.rate_limit == 5.0
+    assert config.http.rate_limit == 5.0
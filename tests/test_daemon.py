@@ -0,0 +1,115 @@
+import threading
+import types
+
+import pytest
+
+import solarroi.daemon as daemon_module
+
+from solarroi.common import die
+from solarroi.daemon import run_daemon, run_schedule, Schedule
+
+
+@pytest.fixture
+def jitter(monkeypatch):
+    # always use the full jitter
+    monkeypatch.setattr(daemon_module, "random", types.SimpleNamespace(uniform=lambda low, high: high))
+
+
+def get_schedule(run=lambda: None, interval: float = 600, jitter: float = 0) -> Schedule:
+    schedule = Schedule("roi", interval, jitter, run)
+    schedule.due = 1000.0
+    schedule.next_run = 1000.0
+    return schedule
+
+
+def test_schedule_next(jitter):
+    schedule = get_schedule(jitter=30)
+
+    schedule.schedule_next(1010.0)
+    assert (schedule.due, schedule.next_run) == (1600.0, 1630.0)
+
+    # the jitter is added to the due time, not to the previous run time
+    schedule.schedule_next(1640.0)
+    assert (schedule.due, schedule.next_run) == (2200.0, 2230.0)
+
+
+def test_schedule_next_overrun(jitter):
+    schedule = get_schedule()
+
+    # a run that took longer than the interval is followed straight away
+    schedule.schedule_next(1700.0)
+
+    assert schedule.next_run == 1600.0
+
+
+def test_schedule_next_skips_overdue_runs(jitter, caplog):
+    schedule = get_schedule()
+
+    schedule.schedule_next(3100.0)
+
+    # the runs due at 1600, 2200 and 2800 are replaced by one at 2800
+    assert schedule.next_run == 2800.0
+    assert "skipping 2 runs" in caplog.text
+
+
+def test_run_schedule():
+    calls = []
+    schedule = get_schedule(lambda: calls.append(1))
+
+    run_schedule(schedule)
+
+    assert (calls, schedule.runs, schedule.failures) == ([1], 1, 0)
+
+
+def test_run_schedule_exception(caplog):
+    def run():
+        raise RuntimeError("API error")
+
+    schedule = get_schedule(run)
+
+    run_schedule(schedule)
+
+    assert (schedule.runs, schedule.failures) == (1, 1)
+    assert "roi: run failed" in caplog.text
+
+
+def test_run_schedule_die():
+    schedule = get_schedule(lambda: die("Unable to load the tariff"))
+
+    run_schedule(schedule)
+
+    assert (schedule.runs, schedule.failures) == (1, 1)
+
+
+def test_run_schedule_exit_without_error():
+    def run():
+        raise SystemExit(0)
+
+    schedule = get_schedule(run)
+
+    run_schedule(schedule)
+
+    assert (schedule.runs, schedule.failures) == (1, 0)
+
+
+def test_run_daemon_runs_the_next_due_schedule(monkeypatch, jitter):
+    monkeypatch.setattr(daemon_module, "time", types.SimpleNamespace(time=lambda: 5000.0, perf_counter=lambda: 0.0))
+    runs = []
+    roi = get_schedule(lambda: runs.append("roi"), interval=600)
+    forecast = Schedule("forecast", 3600, 0, lambda: runs.append("forecast"))
+    forecast.due = forecast.next_run = 900.0
+
+    run_daemon([roi, forecast], threading.Event(), max_runs=2)
+
+    # both schedules are overdue, so the one that was due first runs first
+    assert runs == ["forecast", "roi"]
+    assert (forecast.next_run, roi.next_run) == (4500.0, 4600.0)
+
+
+def test_run_daemon_stops():
+    stop = threading.Event()
+    schedule = get_schedule(stop.set)
+
+    run_daemon([schedule], stop)
+
+    assert schedule.runs == 1
@@ -0,0 +1,135 @@
+import argparse
+import datetime
+import threading
+
+import numpy as np
+import pytest
+
+import solarroi.givenergy as givenergy
+
+from solarroi.cache import ResponseCache
+from solarroi.common import get_local_datetime_from_date, parse_local_datetime
+from solarroi.givenergy import get_meter_total_consumption, get_meter_total_consumptions, parse_energy_flows
+
+from conftest import get_energy_flows
+
+
+@pytest.mark.parametrize("date, readings", [
+    (datetime.date(2023, 7, 1), 48),
+    (datetime.date(2023, 3, 26), 46),
+    (datetime.date(2023, 10, 29), 50)
+])
+def test_parse_energy_flows_uses_local_time(utc_host, date, readings):
+    results = parse_energy_flows(get_energy_flows(date, date))
+
+    periods = results[date.isoformat()]["consumption_periods"]
+    assert len(periods) == readings
+    assert periods.get_datetime(0) == get_local_datetime_from_date(date)
+    # every reading has its own start time, including the repeated hour
+    assert np.all(np.diff(periods.starts) == 1800)
+    assert results[date.isoformat()]["total_home_consumption"] == round(readings * 0.2, 2)
+    assert results[date.isoformat()]["total_grid_import"] == round(readings * 0.2, 2)
+
+
+def test_parse_energy_flows_days(utc_host):
+    results = parse_energy_flows(get_energy_flows(datetime.date(2023, 6, 30), datetime.date(2023, 7, 2)))
+
+    assert list(results.keys()) == ["2023-06-30", "2023-07-01", "2023-07-02"]
+    for date, result in results.items():
+        periods = result["consumption_periods"]
+        assert periods.get_datetime(0) == get_local_datetime_from_date(datetime.date.fromisoformat(date))
+        assert periods.total() == pytest.approx(48 * 0.2)
+
+
+def test_parse_local_datetime_repeated_hour(utc_host):
+    # 01:00 to 02:00 happens twice, first in BST and then in GMT
+    times = []
+    after = None
+    for value in ["2023-10-29 00:30", "2023-10-29 01:00", "2023-10-29 01:30", "2023-10-29 01:00",
+                  "2023-10-29 01:30", "2023-10-29 02:00"]:
+        after = parse_local_datetime(value, after)
+        times.append(after.astimezone(datetime.timezone.utc).strftime("%H:%M"))
+    assert times == ["23:30", "00:00", "00:30", "01:00", "01:30", "02:00"]
+
+
+def test_parse_local_datetime_with_offset():
+    dt = parse_local_datetime("2023-07-01T12:00:00Z", parse_local_datetime("2023-07-01 14:00"))
+    assert dt == datetime.datetime(2023, 7, 1, 12, 0, tzinfo=datetime.timezone.utc)
+
+
+CONFIG = argparse.Namespace(givenergy=argparse.Namespace(inverter_serial="SA0000001"))
+
+
+class DataPoints:
+    """
+    Stand-in for load_page that serves pages of data points with the given
+    number of points for each day, one point per page.
+    """
+
+    def __init__(self, points: int = 288):
+        self.points = points
+        self.requests = []
+        self.__lock = threading.Lock()
+
+    def load_page(self, config, url, page, end_date=None, page_size=None):
+        with self.__lock:
+            self.requests.append((url.split("/")[-1], page, page_size))
+        date = datetime.date.fromisoformat(url.split("/")[-1][0:10])
+        time = datetime.datetime.combine(date, datetime.time()) + datetime.timedelta(minutes=5 * (page - 1))
+        return {
+            "data": [{
+                "time": time.strftime("%Y-%m-%dT%H:%M:%SZ"),
+                "today": {"consumption": round(page * 0.1, 1)}
+            }],
+            "meta": {"current_page": page, "last_page": self.points, "per_page": 1, "total": self.points}
+        }
+
+
+@pytest.fixture
+def data_points(monkeypatch):
+    data_points = DataPoints()
+    monkeypatch.setattr(givenergy, "load_page", data_points.load_page)
+    monkeypatch.setattr(givenergy, "get_cache", lambda: None)
+    return data_points
+
+
+def test_meter_total_reads_first_and_last_page(data_points):
+    assert get_meter_total_consumption(CONFIG, "2023-06-01") == 28.8
+
+    # the first single point page gives the number of pages
+    assert data_points.requests == [("2023-06-01T23:59:00Z", 1, 1), ("2023-06-01T23:59:00Z", 288, 1)]
+
+
+def test_meter_total_with_one_page(data_points):
+    data_points.points = 1
+
+    assert get_meter_total_consumption(CONFIG, "2023-06-01") == 0.1
+    assert len(data_points.requests) == 1
+
+
+def test_meter_total_for_wrong_day(data_points):
+    data_points.points = 289
+
+    with pytest.raises(SystemExit):
+        get_meter_total_consumption(CONFIG, "2023-06-01")
+
+
+def test_meter_total_is_cached_once_settled(monkeypatch, tmp_path, data_points):
+    response_cache = ResponseCache(tmp_path / "cache.sqlite", 3, 1024 * 1024)
+    monkeypatch.setattr(givenergy, "get_cache", lambda: response_cache)
+    today = datetime.date.today().isoformat()
+
+    totals = [get_meter_total_consumption(CONFIG, date) for date in ["2023-06-01", "2023-06-01", today, today]]
+
+    assert totals == [28.8] * 4
+    # the total for today may still change, so it is loaded every time
+    assert [request[0][0:10] for request in data_points.requests] == ["2023-06-01"] * 2 + [today] * 4
+
+
+def test_meter_totals(data_points):
+    dates = [f"2023-06-{day:02d}" for day in range(1, 11)]
+
+    totals = get_meter_total_consumptions(CONFIG, dates, max_workers=4)
+
+    assert list(totals.items()) == [(date, 28.8) for date in dates]
+    assert len(data_points.requests) == 20
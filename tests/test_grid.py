@@ -0,0 +1,66 @@
+import datetime
+import zoneinfo
+
+import numpy as np
+import pytest
+
+from solarroi.common import TIMEZONE
+from solarroi.grid import concatenate, HalfHourGrid, HalfHourSeries
+
+UTC = datetime.timezone.utc
+
+
+@pytest.mark.parametrize("date, slots", [
+    (datetime.date(2023, 3, 25), 48),
+    # the clocks go forward
+    (datetime.date(2023, 3, 26), 46),
+    # the clocks go back
+    (datetime.date(2023, 10, 29), 50)
+])
+def test_slots_per_day(date, slots):
+    grid = HalfHourGrid(date, date)
+
+    assert grid.size == slots
+    assert grid.slot_starts[0] == datetime.datetime.combine(
+        date, datetime.time(), tzinfo=zoneinfo.ZoneInfo(TIMEZONE)
+    ).timestamp()
+
+
+def test_day_offsets_across_clock_changes():
+    grid = HalfHourGrid(datetime.date(2023, 3, 25), datetime.date(2023, 3, 27))
+
+    assert grid.dates == [datetime.date(2023, 3, 25), datetime.date(2023, 3, 26), datetime.date(2023, 3, 27)]
+    assert grid.day_offsets.tolist() == [0, 48, 94, 142]
+    np.testing.assert_array_equal(grid.sum_by_day(np.ones(grid.size)), [48, 46, 48])
+
+
+def test_from_series_on_repeated_hour():
+    date = datetime.date(2023, 10, 29)
+    grid = HalfHourGrid(date, date)
+    # readings from 23:00 UTC the day before to 00:00 UTC the day after
+    start = datetime.datetime(2023, 10, 28, 22, 30, tzinfo=UTC).timestamp()
+    starts = start + np.arange(52) * 1800
+    series = HalfHourSeries(starts, np.arange(52, dtype=np.float64))
+
+    values = grid.from_series(series)
+
+    # the first and last readings are outside of the local day
+    np.testing.assert_array_equal(values, np.arange(1, 51))
+    # 01:00 to 02:00 local time happens twice, 01:00 BST and 01:00 GMT
+    assert (values[2], values[4]) == (3.0, 5.0)
+    assert grid.sum_by_day(values).tolist() == [sum(range(1, 51))]
+
+
+def test_from_series_adds_readings_in_the_same_slot():
+    date = datetime.date(2023, 1, 1)
+    grid = HalfHourGrid(date, date)
+    start = datetime.datetime(2023, 1, 1, tzinfo=UTC).timestamp()
+    series = concatenate([
+        HalfHourSeries(np.array([start]), np.array([1.5])),
+        HalfHourSeries(np.array([start + 600]), np.array([2.0]))
+    ])
+
+    values = grid.from_series(series)
+
+    assert values[0] == 3.5
+    assert values[1:].sum() == 0.0
@@ -0,0 +1,93 @@
+import re
+
+from solarroi.metrics import get_command_path, Metrics, write_metrics
+
+import solarroi.metrics as metrics_module
+
+ACCOUNTS_URL = "https://api.octopus.energy/v1/accounts/A-1234/"
+RATES_URL = "https://api.octopus.energy/v1/products/AGILE/electricity-tariffs/E-1R-AGILE/standard-unit-rates/"
+
+
+def get_metrics() -> Metrics:
+    metrics = Metrics()
+    metrics.record_request(ACCOUNTS_URL, "200", 0.2, 100)
+    metrics.record_request(RATES_URL, "200", 0.07, 1000)
+    metrics.record_request(RATES_URL, "429", 3.0, 10)
+    metrics.record_retry(RATES_URL)
+    metrics.record_cache(RATES_URL, True)
+    metrics.record_cache(RATES_URL, False)
+    metrics.record_statement("solar_roi", 31, 0.5)
+    metrics.add_phase_time("fetch", 1.5)
+    return metrics
+
+
+def test_prometheus_requests_by_endpoint_and_status():
+    lines = get_metrics().to_prometheus("roi").splitlines()
+
+    assert "# TYPE solarroi_http_requests_total counter" in lines
+    assert [line for line in lines if line.startswith("solarroi_http_requests_total{")] == [
+        'solarroi_http_requests_total{command="roi",endpoint="octopus_energy.accounts",status="200"} 1',
+        'solarroi_http_requests_total{command="roi",endpoint="octopus_energy.standard_unit_rates",status="200"} 1',
+        'solarroi_http_requests_total{command="roi",endpoint="octopus_energy.standard_unit_rates",status="429"} 1'
+    ]
+
+
+def test_prometheus_latency_histogram():
+    lines = get_metrics().to_prometheus("roi").splitlines()
+    labels = 'command="roi",endpoint="octopus_energy.standard_unit_rates"'
+
+    assert "# TYPE solarroi_http_request_duration_seconds histogram" in lines
+    # buckets are cumulative
+    assert f'solarroi_http_request_duration_seconds_bucket{{{labels},le="0.05"}} 0' in lines
+    assert f'solarroi_http_request_duration_seconds_bucket{{{labels},le="0.1"}} 1' in lines
+    assert f'solarroi_http_request_duration_seconds_bucket{{{labels},le="2.5"}} 1' in lines
+    assert f'solarroi_http_request_duration_seconds_bucket{{{labels},le="5.0"}} 2' in lines
+    assert f'solarroi_http_request_duration_seconds_bucket{{{labels},le="+Inf"}} 2' in lines
+    assert f"solarroi_http_request_duration_seconds_sum{{{labels}}} 3.07" in lines
+    assert f"solarroi_http_request_duration_seconds_count{{{labels}}} 2" in lines
+
+
+def test_prometheus_counters_tables_and_phases():
+    lines = get_metrics().to_prometheus("backfill").splitlines()
+    endpoint = 'command="backfill",endpoint="octopus_energy.standard_unit_rates"'
+
+    assert f"solarroi_http_retries_total{{{endpoint}}} 1" in lines
+    assert f"solarroi_http_bytes_received_total{{{endpoint}}} 1010" in lines
+    assert f"solarroi_http_cache_hits_total{{{endpoint}}} 1" in lines
+    assert f"solarroi_http_cache_misses_total{{{endpoint}}} 1" in lines
+    assert 'solarroi_db_statements_total{command="backfill",table="solar_roi"} 1' in lines
+    assert 'solarroi_db_rows_total{command="backfill",table="solar_roi"} 31' in lines
+    assert 'solarroi_db_duration_seconds_total{command="backfill",table="solar_roi"} 0.5' in lines
+    assert 'solarroi_phase_duration_seconds{command="backfill",phase="fetch"} 1.5' in lines
+    assert any(line.startswith('solarroi_run_duration_seconds{command="backfill"} ') for line in lines)
+
+
+def test_prometheus_every_metric_has_help_and_type():
+    lines = get_metrics().to_prometheus("roi").splitlines()
+    names = {line.split("{")[0] for line in lines if not line.startswith("#")}
+    types = {line.split()[2] for line in lines if line.startswith("# TYPE ")}
+    helps = {line.split()[2] for line in lines if line.startswith("# HELP ")}
+
+    assert types == helps
+    histogram = re.compile(r"^(solarroi_http_request_duration_seconds)_(bucket|sum|count)$")
+    assert {histogram.sub(r"\1", name) for name in names} == types
+
+
+def test_empty_metrics():
+    lines = Metrics().to_prometheus("roi").splitlines()
+
+    assert "# TYPE solarroi_http_requests_total counter" in lines
+    assert not any(line.startswith("solarroi_http_requests_total{") for line in lines)
+
+
+def test_write_metrics_per_command(monkeypatch, tmp_path):
+    monkeypatch.setattr(metrics_module, "metrics", get_metrics())
+    json_path = tmp_path / "metrics.json"
+    prometheus_path = tmp_path / "solarroi.prom"
+
+    write_metrics("roi", json_path, prometheus_path)
+
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["metrics-roi.json", "solarroi-roi.prom"]
+    lines = get_command_path(prometheus_path, "roi").read_text().splitlines()
+    assert 'solarroi_db_rows_total{command="roi",table="solar_roi"} 31' in lines
+    assert '"command": "roi"' in get_command_path(json_path, "roi").read_text()
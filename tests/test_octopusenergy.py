@@ -0,0 +1,150 @@
+import datetime
+
+import numpy as np
+
+from solarroi.octopusenergy import get_tariff_periods_by_day, TariffTimeline, TarrifPeriod
+
+UTC = datetime.timezone.utc
+
+AGREEMENTS = [
+    {
+        "tariff_code": "E-1R-VAR-22-11-01-C",
+        "valid_from": "2023-01-01T00:00:00Z",
+        # an agreement that starts during British Summer Time
+        "valid_to": "2023-04-01T00:00:00+01:00"
+    },
+    {
+        "tariff_code": "E-1R-AGILE-FLEX-22-11-25-C",
+        "valid_from": "2023-04-01T00:00:00+01:00",
+        # the last valid_to is ignored as the API sometimes gets it wrong
+        "valid_to": "2023-05-01T00:00:00+01:00"
+    }
+]
+
+
+def get_codes(timeline, start_date, end_date):
+    return [
+        (agreement["tariff_code"], first_date.isoformat(), last_date.isoformat())
+        for agreement, first_date, last_date in timeline.get_agreements(start_date, end_date)
+    ]
+
+
+def test_get_agreement_at_boundaries():
+    # agreements are given out of order
+    timeline = TariffTimeline(list(reversed(AGREEMENTS)))
+
+    assert timeline.get_agreement(datetime.date(2022, 12, 31)) is None
+    assert timeline.get_agreement(datetime.date(2023, 1, 1))["tariff_code"] == "E-1R-VAR-22-11-01-C"
+    # the second agreement starts at 23:00 UTC, before the start of the UTC day
+    assert timeline.get_agreement(datetime.date(2023, 3, 31))["tariff_code"] == "E-1R-VAR-22-11-01-C"
+    assert timeline.get_agreement(datetime.date(2023, 4, 1))["tariff_code"] == "E-1R-AGILE-FLEX-22-11-25-C"
+
+
+def test_last_agreement_has_no_end():
+    timeline = TariffTimeline(AGREEMENTS)
+
+    assert timeline.get_agreement(datetime.date(2024, 6, 1))["tariff_code"] == "E-1R-AGILE-FLEX-22-11-25-C"
+    assert get_codes(timeline, datetime.date(2023, 4, 20), datetime.date(2023, 6, 30)) == [
+        ("E-1R-AGILE-FLEX-22-11-25-C", "2023-04-20", "2023-06-30")
+    ]
+
+
+def test_get_agreements_splits_range():
+    timeline = TariffTimeline(AGREEMENTS)
+
+    assert get_codes(timeline, datetime.date(2022, 12, 30), datetime.date(2023, 4, 2)) == [
+        ("E-1R-VAR-22-11-01-C", "2023-01-01", "2023-03-31"),
+        ("E-1R-AGILE-FLEX-22-11-25-C", "2023-04-01", "2023-04-02")
+    ]
+    assert get_codes(timeline, datetime.date(2023, 2, 1), datetime.date(2023, 2, 28)) == [
+        ("E-1R-VAR-22-11-01-C", "2023-02-01", "2023-02-28")
+    ]
+
+
+def test_get_agreements_with_gap():
+    timeline = TariffTimeline([
+        {"tariff_code": "A", "valid_from": "2023-01-01T00:00:00Z", "valid_to": "2023-01-10T00:00:00Z"},
+        {"tariff_code": "B", "valid_from": "2023-01-15T00:00:00Z", "valid_to": None}
+    ])
+
+    assert timeline.get_agreement(datetime.date(2023, 1, 10)) is None
+    assert get_codes(timeline, datetime.date(2023, 1, 5), datetime.date(2023, 1, 20)) == [
+        ("A", "2023-01-05", "2023-01-09"),
+        ("B", "2023-01-15", "2023-01-20")
+    ]
+
+
+def get_timestamps(*values):
+    return np.array([datetime.datetime.fromisoformat(value).timestamp() for value in values])
+
+
+def test_get_prices():
+    timeline = TariffTimeline([])
+    start = datetime.datetime(2023, 1, 1, tzinfo=UTC)
+    half_hour = datetime.timedelta(minutes=30)
+    timeline.add_periods([
+        TarrifPeriod(start, start + half_hour, 10.0),
+        # a gap from 00:30 to 01:00
+        TarrifPeriod(start + 2 * half_hour, start + 3 * half_hour, 20.0)
+    ])
+    # a period with the same start as one already added is ignored
+    timeline.add_periods([TarrifPeriod(start, start + half_hour, 99.0)])
+
+    prices = timeline.get_prices(get_timestamps(
+        "2022-12-31T23:30:00+00:00",
+        "2023-01-01T00:00:00+00:00",
+        "2023-01-01T00:15:00+00:00",
+        "2023-01-01T00:45:00+00:00",
+        "2023-01-01T01:00:00+00:00",
+        "2023-01-01T02:00:00+00:00"
+    ))
+
+    np.testing.assert_array_equal(prices, [np.nan, 0.1, 0.1, np.nan, 0.2, np.nan])
+    assert timeline.get_period(start + half_hour / 2).price == 0.1
+    assert timeline.get_period(start + 3 * half_hour / 2) is None
+
+
+def test_get_prices_without_periods():
+    prices = TariffTimeline(AGREEMENTS).get_prices(get_timestamps("2023-01-01T00:00:00+00:00"))
+
+    assert np.isnan(prices).all()
+
+
+def get_rate(valid_from, valid_to, value, payment_method):
+    return {
+        "value_exc_vat": value / 1.05,
+        "value_inc_vat": value,
+        "valid_from": valid_from,
+        "valid_to": valid_to,
+        "payment_method": payment_method
+    }
+
+
+def test_direct_debit_rate_is_used():
+    days = [datetime.date(2023, 1, 1), datetime.date(2023, 1, 2)]
+    # the NON_DIRECT_DEBIT rate comes first in the response
+    rates = [
+        get_rate("2023-01-02T00:00:00Z", None, 30.0, "NON_DIRECT_DEBIT"),
+        get_rate("2023-01-02T00:00:00Z", None, 28.0, "DIRECT_DEBIT"),
+        get_rate("2022-10-01T00:00:00Z", "2023-01-02T00:00:00Z", 35.0, "NON_DIRECT_DEBIT"),
+        get_rate("2022-10-01T00:00:00Z", "2023-01-02T00:00:00Z", 33.0, "DIRECT_DEBIT")
+    ]
+
+    prices = get_tariff_periods_by_day(rates, days)
+    timeline = TariffTimeline([])
+    timeline.add_periods(period for periods in prices.values() for period in periods)
+
+    assert {date: [period.price for period in periods] for date, periods in prices.items()} == {
+        "2023-01-01": [0.33], "2023-01-02": [0.28]
+    }
+    np.testing.assert_array_equal(
+        timeline.get_prices(get_timestamps("2023-01-01T12:00:00+00:00", "2023-01-02T12:00:00+00:00")), [0.33, 0.28]
+    )
+
+
+def test_rates_without_payment_method_are_kept():
+    rates = [get_rate("2023-01-01T00:00:00Z", None, 15.0, None)]
+
+    prices = get_tariff_periods_by_day(rates, [datetime.date(2023, 1, 1)])
+
+    assert [period.price for period in prices["2023-01-01"]] == [0.15]
@@ -0,0 +1,61 @@
+import concurrent.futures
+import cProfile
+import types
+
+import solarroi.profiling as profiling_module
+
+from solarroi.metrics import get_metrics
+from solarroi.profiling import profile_run
+
+
+class SingleProfile(cProfile.Profile):
+    """
+    A profile that, like cProfile on Python 3.12+, cannot be enabled while
+    another one is active.
+    """
+
+    active = None
+
+    def enable(self, *args, **kwargs):
+        if SingleProfile.active not in (None, self):
+            raise ValueError("Another profiling tool is already active")
+        SingleProfile.active = self
+        super().enable(*args, **kwargs)
+
+    def disable(self):
+        super().disable()
+        SingleProfile.active = None
+
+
+def get_total(count: int) -> int:
+    with get_metrics().phase("compute"):
+        return sum(range(count))
+
+
+def run_job(tmp_path) -> int:
+    with profile_run("roi", str(tmp_path)):
+        with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
+            return sum(executor.map(get_total, [1000, 2000, 3000]))
+
+
+def get_function_names(tmp_path):
+    stats = profiling_module.pstats.Stats(str(tmp_path / "roi.prof"))
+    return {function for _, _, function in stats.stats}  # type: ignore
+
+
+def test_profile_threads(tmp_path, capsys):
+    assert run_job(tmp_path) == sum(range(1000)) + sum(range(2000)) + sum(range(3000))
+
+    assert "get_total" in get_function_names(tmp_path)
+    assert "compute: peak" in (tmp_path / "roi-memory.txt").read_text()
+    assert "Hottest functions by own time" in capsys.readouterr().err
+
+
+def test_profile_threads_with_single_profiler(monkeypatch, tmp_path, capsys):
+    monkeypatch.setattr(profiling_module, "cProfile", types.SimpleNamespace(Profile=SingleProfile))
+
+    assert run_job(tmp_path) == sum(range(1000)) + sum(range(2000)) + sum(range(3000))
+
+    assert (tmp_path / "roi.prof").exists()
+    assert SingleProfile.active is None
+    assert "Hottest functions by own time" in capsys.readouterr().err
@@ -0,0 +1,39 @@
+import argparse
+
+import pytest
+import requests
+
+import solarroi.solcast as solcast
+
+from solarroi.config import HTTPConfig
+
+CONFIG = argparse.Namespace(
+    http=HTTPConfig(),
+    solcast=argparse.Namespace(api_key="solcast-key", resource_id="0000", rate_limit=0)
+)
+
+
+class Client:
+
+    def __init__(self, status_code, body):
+        self.response = requests.Response()
+        self.response.status_code = status_code
+        self.response._content = body
+
+    def request(self, method, url):
+        return self.response
+
+
+def test_get_forecasts(monkeypatch):
+    client = Client(200, b'{"forecasts": [{"period_end": "2023-06-01T10:00:00Z", "pv_estimate": 1.5}]}')
+    monkeypatch.setattr(solcast, "get_api_client", lambda base_url, create: client)
+
+    assert solcast.get_forecasts(CONFIG) == [{"period_end": "2023-06-01T10:00:00Z", "pv_estimate": 1.5}]
+
+
+def test_get_forecasts_error(monkeypatch):
+    client = Client(429, b'{"response_status": {"error_code": "TooManyRequests"}}')
+    monkeypatch.setattr(solcast, "get_api_client", lambda base_url, create: client)
+
+    with pytest.raises(SystemExit):
+        solcast.get_forecasts(CONFIG)
@@ -0,0 +1,79 @@
+import datetime
+
+from solarroi.sql import update_rollups, upsert, SolarROI, SolarROICumulative, SolarROIMonth, SolarROIYear
+
+
+def get_rows(start_date, days, roi=1.0):
+    return [
+        {
+            "date": start_date + datetime.timedelta(days=i),
+            "cost": 1.0,
+            "grid_export": 2.0,
+            "grid_import": 3.0,
+            "home_consumption": 4.0,
+            "income": 0.5,
+            "no_pv_cost": 2.0,
+            "roi": roi
+        }
+        for i in range(days)
+    ]
+
+
+def save(session_maker, rows):
+    with session_maker() as session:
+        upsert(session, SolarROI, rows, batch_size=7)
+        update_rollups(session, [row["date"] for row in rows], batch_size=7)
+        session.commit()
+
+
+def test_upsert_inserts_and_updates(session_maker):
+    with session_maker() as session:
+        upsert(session, SolarROI, get_rows(datetime.date(2023, 1, 1), 20), batch_size=7)
+        session.commit()
+        # the second half is written again with a different roi
+        upsert(session, SolarROI, get_rows(datetime.date(2023, 1, 11), 20, roi=2.0), batch_size=7)
+        session.commit()
+
+        records = session.query(SolarROI).order_by(SolarROI.date).all()
+
+    assert len(records) == 30
+    assert [record.roi for record in records] == [1.0] * 10 + [2.0] * 20
+    assert records[0].home_consumption == 4.0
+
+
+def test_rollups(session_maker):
+    # December and January, so two months and two years
+    save(session_maker, get_rows(datetime.date(2022, 12, 1), 62))
+
+    with session_maker() as session:
+        months = session.query(SolarROIMonth).order_by(SolarROIMonth.month).all()
+        years = session.query(SolarROIYear).order_by(SolarROIYear.year).all()
+        cumulative = session.query(SolarROICumulative).order_by(SolarROICumulative.date).all()
+
+    assert [(month.month, month.days, month.roi, month.cost) for month in months] == [
+        (datetime.date(2022, 12, 1), 31, 31.0, 31.0),
+        (datetime.date(2023, 1, 1), 31, 31.0, 31.0)
+    ]
+    assert [(year.year, year.days, year.income) for year in years] == [(2022, 31, 15.5), (2023, 31, 15.5)]
+    assert len(cumulative) == 62
+    assert (cumulative[0].days, cumulative[0].roi) == (1, 1.0)
+    assert (cumulative[-1].date, cumulative[-1].days, cumulative[-1].roi) == (datetime.date(2023, 1, 31), 62, 62.0)
+
+
+def test_rollups_only_change_from_updated_dates(session_maker):
+    save(session_maker, get_rows(datetime.date(2023, 1, 1), 59))
+    # a later run changes the middle of January
+    save(session_maker, get_rows(datetime.date(2023, 1, 11), 5, roi=3.0))
+
+    with session_maker() as session:
+        months = session.query(SolarROIMonth).order_by(SolarROIMonth.month).all()
+        year = session.query(SolarROIYear).one()
+        cumulative = {
+            record.date: record.roi for record in session.query(SolarROICumulative)
+        }
+
+    assert [(month.days, month.roi) for month in months] == [(31, 31.0 + 5 * 2.0), (28, 28.0)]
+    assert (year.days, year.roi) == (59, 59.0 + 5 * 2.0)
+    assert cumulative[datetime.date(2023, 1, 10)] == 10.0
+    assert cumulative[datetime.date(2023, 1, 15)] == 10.0 + 5 * 3.0
+    assert cumulative[datetime.date(2023, 2, 28)] == 59.0 + 5 * 2.0